@@ -1,7 +1,6 @@
 __all__ = ['get_direct_raw_stmt_jsons_from_agents',
            'get_raw_stmt_jsons_from_papers']
 
-import json
 from collections import defaultdict
 
 from sqlalchemy import intersect_all
@@ -9,7 +8,10 @@ from sqlalchemy import intersect_all
 from indra.util import clockit
 
 from indra_db import get_db
-from indra_db.util import regularize_agent_id
+from indra_db.util import regularize_agent_id, get_paper_id_resolver, \
+    get_json_codec
+from indra_db.util.json_codec import load_json
+from indra_db.util.paper_ids import PAPER_ID_TYPES
 
 # ====
 # API
@@ -40,14 +42,18 @@ def get_raw_stmt_jsons_from_papers(id_list, id_type='pmid', db=None):
     """
     if db is None:
         db = get_db('primary')
-
-    # Get the attribute for this id type.
-    if id_type == 'pmid':
-        id_constraint = db.TextRef.pmid_in(id_list, filter_ids=True)
-    elif id_type == 'pmcid':
-        id_constraint = db.TextRef.pmcid_in(id_list, filter_ids=True)
-    elif id_type == 'doi':
-        id_constraint = db.TextRef.doi_in(id_list, filter_ids=True)
+    get_json_codec().load_dictionaries(db)
+
+    # Resolve the paper ids to text ref ids, using the shared resolver.
+    if id_type in PAPER_ID_TYPES:
+        trid_dict = get_paper_id_resolver().get_trids(
+            db, [(id_type, id_val) for id_val in id_list]
+        )
+        trids = {trid for trid_list in trid_dict.values()
+                 for trid in trid_list}
+        if not trids:
+            return {}
+        id_constraint = db.TextRef.id.in_(trids)
     else:
         id_constraint = _get_id_col(db.TextRef, id_type).in_(id_list)
 
@@ -62,7 +68,7 @@ def get_raw_stmt_jsons_from_papers(id_list, id_type='pmid', db=None):
         id_val = _get_id_col(tr, id_type)
 
         # Decode and unpack the json
-        rjson = json.loads(rjson_bytes.decode('utf-8'))
+        rjson = load_json(rjson_bytes)
 
         # Fix the pmids in this json.
         rjson['evidence'][0]['pmid'] = tr.pmid
@@ -86,6 +92,7 @@ def get_direct_raw_stmt_jsons_from_agents(agents=None, stmt_type=None, db=None,
     """Get Raw statement jsons from a list of agent refs and Statement type."""
     if db is None:
         db = get_db('primary')
+    get_json_codec().load_dictionaries(db)
 
     # Turn the agents parameters into an intersection of queries for stmt ids.
     entity_queries = []
@@ -142,7 +149,7 @@ def get_direct_raw_stmt_jsons_from_agents(agents=None, stmt_type=None, db=None,
     # Process the jsons, filling text ref info.
     raw_stmt_jsons = {}
     for json_bytes, rid, sid, tcid, tr in ref_q.all():
-        raw_j = json.loads(json_bytes)
+        raw_j = load_json(json_bytes)
         ev = raw_j['evidence'][0]
         ev['text_refs'] = tr.get_ref_dict()
         ev['text_refs']['TCID'] = tcid
@@ -1,5 +1,8 @@
 from .util import *
 from .query import *
+from .cache import *
+from .bitmap import *
+from .grounding import *
 
 
 def get_ro_source_info():
@@ -0,0 +1,201 @@
+__all__ = ['HashBitmapIndex']
+
+import logging
+from array import array
+from bisect import bisect_left
+from heapq import nlargest
+
+from indra_db.util import get_ro
+from indra_db.exceptions import IndraDbException
+
+from .query import Query, MergeQuery, Intersection, Union, HasHash, \
+    QueryResult, StatementQueryResult, _get_next_page_token, \
+    _read_page_token
+
+try:
+    from pyroaring import BitMap
+    WITH_ROARING = True
+except ImportError:
+    WITH_ROARING = False
+
+logger = logging.getLogger(__name__)
+
+
+class HashBitmapIndex(object):
+    """Evaluate the set algebra of queries in memory using roaring bitmaps.
+
+    Every mk_hash in the readonly database is given a dense ordinal, and the
+    hashes of each leaf query (e.g. a HasAgent or HasType query) are loaded
+    from the database the first time they are needed and kept as a compressed
+    bitmap of ordinals. Intersections, Unions, and inversions are then
+    evaluated with bitmap operations, and only the final page of hashes is
+    sent to the database to get content. The bitmaps are reloaded when the
+    build version of the readonly database changes.
+
+    This requires the optional `pyroaring` package.
+
+    Parameters
+    ----------
+    ro : Optional[DatabaseManager]
+        A database manager handle that has valid Readonly tables built. By
+        default, the primary readonly database is used.
+    max_postings : int
+        The maximum number of leaf query bitmaps to keep. When exceeded, the
+        least recently used bitmap is dropped. Default is 10000.
+    """
+    def __init__(self, ro=None, max_postings=10000):
+        if not WITH_ROARING:
+            raise IndraDbException("The bitmap index requires pyroaring to "
+                                   "be installed.")
+        if ro is None:
+            ro = get_ro('primary')
+        self.ro = ro
+        self.max_postings = max_postings
+        self.build_version = None
+        self._hashes = None
+        self._ev_counts = None
+        self._beliefs = None
+        self._universe = None
+        self._postings = {}
+        self.load()
+
+    def load(self):
+        """Load the hashes, evidence counts, and beliefs of all statements."""
+        logger.info("Loading the statement hashes for the bitmap index.")
+        self.build_version = self.ro.get_build_version(max_age=0)
+        rows = (self.ro.session.query(self.ro.SourceMeta.mk_hash,
+                                      self.ro.SourceMeta.ev_count,
+                                      self.ro.SourceMeta.belief)
+                .order_by(self.ro.SourceMeta.mk_hash)
+                .yield_per(100000))
+        self._hashes = array('q')
+        self._ev_counts = array('l')
+        self._beliefs = array('d')
+        for mk_hash, ev_count, belief in rows:
+            self._hashes.append(mk_hash)
+            self._ev_counts.append(ev_count)
+            self._beliefs.append(0 if belief is None else belief)
+        self._universe = BitMap(range(len(self._hashes)))
+        self._postings = {}
+        logger.info(f"Loaded {len(self._hashes)} hashes.")
+
+    def _check_version(self):
+        if self.ro.get_build_version() != self.build_version:
+            logger.info("The readonly build has changed, reloading.")
+            self.load()
+
+    def _to_ordinals(self, hashes) -> 'BitMap':
+        ordinals = BitMap()
+        n = len(self._hashes)
+        for h in hashes:
+            i = bisect_left(self._hashes, h)
+            if i < n and self._hashes[i] == h:
+                ordinals.add(i)
+        return ordinals
+
+    def _get_posting(self, query) -> 'BitMap':
+        """Get the bitmap of the hashes of a leaf query."""
+        key = str(query.to_json())
+        if key in self._postings:
+            # Move the posting to the end, as the most recently used.
+            posting = self._postings.pop(key)
+            self._postings[key] = posting
+            return posting
+
+        logger.debug(f"Loading the posting for {query}.")
+        hash_q = query.build_hash_query(self.ro)
+        posting = self._to_ordinals(row.mk_hash
+                                    for row in hash_q.yield_per(100000))
+        posting.run_optimize()
+        self._postings[key] = posting
+        while len(self._postings) > self.max_postings:
+            self._postings.pop(next(iter(self._postings)))
+        return posting
+
+    def evaluate(self, query: Query) -> 'BitMap':
+        """Get the bitmap of the ordinals of the hashes matching a query."""
+        if query.empty:
+            return BitMap()
+        if query.full:
+            return self._universe.copy()
+        if isinstance(query, HasHash) and not query._inverted:
+            return self._to_ordinals(query.stmt_hashes)
+        if isinstance(query, MergeQuery):
+            bitmaps = [self.evaluate(q) for q in query.queries]
+            if isinstance(query, Intersection):
+                return BitMap.intersection(*bitmaps)
+            elif isinstance(query, Union):
+                return BitMap.union(*bitmaps)
+            raise ValueError(f"Unhandled merge query: {query}")
+
+        # Inverted leaves are loaded as they are, because the inverse of a
+        # query is not always the complement of its hashes (e.g. ~HasAgent
+        # only covers statements with agents).
+        return self._get_posting(query)
+
+    def _get_page(self, query, limit, offset, sort_by, page_token=None):
+        if sort_by == 'ev_count':
+            sort_values = self._ev_counts
+        elif sort_by == 'belief':
+            sort_values = self._beliefs
+        else:
+            raise ValueError(f"Invalid sort option: {sort_by}.")
+
+        self._check_version()
+        ordinals = self.evaluate(query)
+        offset = 0 if offset is None else offset
+        key = (lambda i: (sort_values[i], self._hashes[i]))
+        if page_token is not None:
+            position = tuple(_read_page_token(page_token, sort_by))
+            ordinals = [i for i in ordinals if key(i) < position]
+        if limit is None:
+            page = sorted(ordinals, key=key, reverse=True)[offset:]
+        else:
+            page = nlargest(offset + limit, ordinals, key=key)[offset:]
+        return page
+
+    def _get_next_page_token(self, page, limit, sort_by):
+        sort_values = self._ev_counts if sort_by == 'ev_count' \
+            else self._beliefs
+        return _get_next_page_token(
+            limit, sort_by, {self._hashes[i]: sort_values[i] for i in page}
+        )
+
+    def get_hashes(self, query, limit=None, offset=None, sort_by='ev_count',
+                   page_token=None) -> QueryResult:
+        """Get the hashes of statements that satisfy a query.
+
+        The arguments are as for `Query.get_hashes`.
+        """
+        page = self._get_page(query, limit, offset, sort_by, page_token)
+        hashes = {self._hashes[i] for i in page}
+        ev_counts = {self._hashes[i]: self._ev_counts[i] for i in page}
+        beliefs = {self._hashes[i]: self._beliefs[i] for i in page}
+        next_page_token = self._get_next_page_token(page, limit, sort_by)
+        return QueryResult(hashes, limit, offset, len(page), ev_counts,
+                           beliefs, query.to_json(), 'hashes', next_page_token)
+
+    def get_statements(self, query, limit=None, offset=None,
+                       sort_by='ev_count', ev_limit=None,
+                       evidence_filter=None, page_token=None) \
+            -> StatementQueryResult:
+        """Get the statements that satisfy a query.
+
+        The page of hashes is found in memory, and only the content for that
+        page is retrieved from the database. The arguments are as for
+        `Query.get_statements`.
+        """
+        page = self._get_page(query, limit, offset, sort_by, page_token)
+        content_query = HasHash([self._hashes[i] for i in page])
+        res = content_query.get_statements(self.ro, sort_by=sort_by,
+                                           ev_limit=ev_limit,
+                                           evidence_filter=evidence_filter)
+        res.limit = limit
+        res.offset = offset
+        res.query_json = query.to_json()
+        if limit is None or len(page) < limit:
+            res.next_offset = None
+        else:
+            res.next_offset = (0 if offset is None else offset) + len(page)
+        res.next_page_token = self._get_next_page_token(page, limit, sort_by)
+        return res
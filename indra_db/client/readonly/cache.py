@@ -0,0 +1,348 @@
+__all__ = ['QueryCache', 'MemoryQueryCache', 'DiskQueryCache',
+           'set_query_cache', 'get_query_cache', 'CompiledSqlCache',
+           'set_compiled_cache', 'get_compiled_cache']
+
+import os
+import json
+import pickle
+import logging
+import hashlib
+from threading import Lock, RLock
+from typing import Optional
+
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache(object):
+    """The base class for caches of query results.
+
+    Results are stored pickled, keyed by a string made by `make_query_key`.
+    Because the key includes the build version of the readonly database,
+    results from an old build are never returned once a new build is in
+    place; they are simply evicted in time like any other unused entry.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The maximum total size of the pickled results held in the cache. When
+        this is exceeded, the least recently used results are evicted.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+
+    def get(self, key):
+        """Get the result for a key, or None if it is not in the cache."""
+        result_bts = self._get(key)
+        if result_bts is None:
+            return None
+        return pickle.loads(result_bts)
+
+    def put(self, key, result):
+        """Put a result in the cache."""
+        result_bts = pickle.dumps(result)
+        if len(result_bts) > self.max_bytes:
+            logger.debug(f"Result of {len(result_bts)} bytes is too large to "
+                         f"cache.")
+            return
+        self._put(key, result_bts)
+
+    def clear(self):
+        """Remove all results from the cache."""
+        raise NotImplementedError()
+
+    def _get(self, key) -> Optional[bytes]:
+        raise NotImplementedError()
+
+    def _put(self, key, result_bts):
+        raise NotImplementedError()
+
+
+class MemoryQueryCache(QueryCache):
+    """An in-process LRU cache of query results.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The maximum total size of the pickled results held in memory. Default
+        is 256 MiB.
+    """
+    def __init__(self, max_bytes=2**28):
+        super(MemoryQueryCache, self).__init__(max_bytes)
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=len)
+        self._lock = Lock()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _get(self, key):
+        with self._lock:
+            return self._cache.get(key)
+
+    def _put(self, key, result_bts):
+        with self._lock:
+            self._cache[key] = result_bts
+
+
+class DiskQueryCache(QueryCache):
+    """An on-disk cache of query results, shared by processes on a machine.
+
+    Each result is a file in the cache directory. Files are touched when they
+    are read, so the modification times give the order of use for eviction.
+
+    Parameters
+    ----------
+    path : str
+        The directory in which results are stored. It is created if it does
+        not exist.
+    max_bytes : int
+        The maximum total size of the result files. Default is 1 GiB.
+    """
+    _suffix = '.pkl'
+
+    def __init__(self, path, max_bytes=2**30):
+        super(DiskQueryCache, self).__init__(max_bytes)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _get_file_path(self, key):
+        return os.path.join(self.path, key + self._suffix)
+
+    def _iter_files(self):
+        for fname in os.listdir(self.path):
+            if fname.endswith(self._suffix):
+                yield os.path.join(self.path, fname)
+
+    def clear(self):
+        for file_path in self._iter_files():
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def _get(self, key):
+        file_path = self._get_file_path(key)
+        try:
+            with open(file_path, 'rb') as f:
+                result_bts = f.read()
+            os.utime(file_path)
+        except FileNotFoundError:
+            return None
+        return result_bts
+
+    def _put(self, key, result_bts):
+        # Write to a temporary file first so readers never see partial files.
+        file_path = self._get_file_path(key)
+        tmp_path = f'{file_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(result_bts)
+        os.replace(tmp_path, file_path)
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used files until the cache fits."""
+        entries = []
+        total_bytes = 0
+        for file_path in self._iter_files():
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+            total_bytes += stat.st_size
+
+        for _, size, file_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+
+_active_cache = None
+
+
+def set_query_cache(cache: Optional[QueryCache]):
+    """Set the cache used for query results, or None to disable caching."""
+    global _active_cache
+    if cache is not None and not isinstance(cache, QueryCache):
+        raise TypeError(f"Expected a QueryCache, but got {type(cache)}.")
+    _active_cache = cache
+
+
+def get_query_cache() -> Optional[QueryCache]:
+    """Get the cache currently used for query results, if any."""
+    return _active_cache
+
+
+def _canonicalize_query_json(query_json):
+    """Put the query JSON in a form independent of the order of merges."""
+    constraint = query_json['constraint']
+    if query_json['class'] in ['Intersection', 'Union']:
+        sub_jsons = [_canonicalize_query_json(qj)
+                     for qj in constraint['query_list']]
+        sub_jsons.sort(key=lambda qj: json.dumps(qj, sort_keys=True))
+        constraint = dict(constraint, query_list=sub_jsons)
+    return dict(query_json, constraint=constraint)
+
+
+def make_query_key(ro, query, result_type, params) -> Optional[str]:
+    """Make the cache key for a query result.
+
+    Parameters
+    ----------
+    ro : DatabaseManager
+        The readonly database handle the query would be run against.
+    query : Query
+        The query whose result is to be cached.
+    result_type : str
+        The type of result, e.g. 'statements' or 'hashes'.
+    params : dict
+        The parameters of the call, such as limit, offset, and sort_by.
+
+    Returns
+    -------
+    key : Optional[str]
+        The key, or None if the result should not be cached, for example
+        because the build version of the database cannot be determined.
+    """
+    get_build_version = getattr(ro, 'get_build_version', None)
+    if get_build_version is None:
+        return None
+    build_version = get_build_version()
+    if build_version is None:
+        return None
+
+    key_params = {}
+    for param, value in params.items():
+        if param == 'evidence_filter' and value is not None:
+            # Evidence filters are made of functions, so use the SQL they
+            # produce.
+            try:
+                value = str(value.get_clause(ro).compile(
+                    compile_kwargs={'literal_binds': True}
+                ))
+            except Exception as e:
+                logger.debug(f"Evidence filter could not be rendered for the "
+                             f"cache key: {e}")
+                return None
+        elif isinstance(value, (set, frozenset)):
+            value = sorted(value)
+        key_params[param] = value
+
+    key_json = {'build_version': build_version, 'result_type': result_type,
+                'query': _canonicalize_query_json(query.to_json()),
+                'params': key_params}
+    key_str = json.dumps(key_json, sort_keys=True, default=str)
+    return hashlib.sha256(key_str.encode('utf-8')).hexdigest()
+
+
+class _LockedLRUCache(LRUCache):
+    """An LRU cache that may be shared by the threads running queries."""
+    def __init__(self, maxsize):
+        super(_LockedLRUCache, self).__init__(maxsize=maxsize)
+        self._lock = RLock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            return super(_LockedLRUCache, self).__getitem__(key)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super(_LockedLRUCache, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super(_LockedLRUCache, self).__delitem__(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return super(_LockedLRUCache, self).__contains__(key)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return super(_LockedLRUCache, self).get(key, default)
+
+    def clear(self):
+        with self._lock:
+            super(_LockedLRUCache, self).clear()
+
+
+class CompiledSqlCache(object):
+    """An in-process cache of compiled SQL statements.
+
+    The cache is given to SQLAlchemy as the `compiled_cache` execution option,
+    so statements are keyed by SQLAlchemy's own cache keys, which describe
+    everything that affects the compiled SQL apart from the bound values. Two
+    statements that compile differently therefore never share an entry.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of compiled statements to keep. Default is 1000.
+    """
+    def __init__(self, max_size=1000):
+        self._cache = _LockedLRUCache(max_size)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        """Remove all compiled statements from the cache."""
+        self._cache.clear()
+
+    def get_compiled_sql(self):
+        """Get the SQL strings of the compiled statements in the cache."""
+        with self._cache._lock:
+            return [str(compiled) for compiled in self._cache.values()]
+
+    def execute(self, conn, selection):
+        """Execute a selection or ORM query on a connection.
+
+        The counts of hits and misses are found from the size of the cache,
+        so they are approximate when the cache is shared between threads.
+
+        Parameters
+        ----------
+        conn : sqlalchemy.engine.Connection
+            The connection on which to execute the selection.
+        selection : sqlalchemy.sql.Selectable or sqlalchemy.orm.Query
+            The SQL to execute.
+
+        Returns
+        -------
+        result : sqlalchemy.engine.ResultProxy
+            The result of the execution.
+        """
+        selection = getattr(selection, 'statement', selection)
+        num_compiled = len(self._cache)
+        res = conn.execution_options(compiled_cache=self._cache)\
+            .execute(selection)
+        if len(self._cache) > num_compiled:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return res
+
+
+_active_compiled_cache = None
+
+
+def set_compiled_cache(cache: Optional[CompiledSqlCache]):
+    """Set the cache of compiled SQL, or None to compile every statement."""
+    global _active_compiled_cache
+    if cache is not None and not isinstance(cache, CompiledSqlCache):
+        raise TypeError(f"Expected a CompiledSqlCache, but got "
+                        f"{type(cache)}.")
+    _active_compiled_cache = cache
+
+
+def get_compiled_cache() -> Optional[CompiledSqlCache]:
+    """Get the cache of compiled SQL currently in use, if any."""
+    return _active_compiled_cache
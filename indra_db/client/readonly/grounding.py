@@ -0,0 +1,159 @@
+__all__ = ['Grounder', 'get_grounder', 'set_grounder', 'gilda_ground',
+           'gilda_ground_batch']
+
+import os
+import json
+import logging
+from threading import Lock
+
+import requests
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+GILDA_URL = 'http://grounding.indra.bio'
+
+
+def _normalize_text(text):
+    """Normalize text for the cache without changing how gilda grounds it."""
+    return ' '.join(text.split())
+
+
+class Grounder(object):
+    """Ground text with gilda, remembering the groundings of recent texts.
+
+    Gilda is used locally if it is installed, and otherwise through the
+    grounding web service, in which case a batch of texts is grounded with a
+    single request.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of texts whose groundings are kept. Default is
+        10000.
+    warm_start_path : Optional[str]
+        The path of a JSON file written by `save`. If it exists, the
+        groundings in it are loaded into the cache.
+    """
+    def __init__(self, max_size=10000, warm_start_path=None):
+        self._cache = LRUCache(maxsize=max_size)
+        self._lock = Lock()
+        if warm_start_path is not None and os.path.exists(warm_start_path):
+            self.load(warm_start_path)
+
+    def ground(self, text):
+        """Get the gilda groundings of a text, as JSON."""
+        return self.ground_batch([text])[text]
+
+    def ground_batch(self, texts):
+        """Get the gilda groundings of many texts.
+
+        Parameters
+        ----------
+        texts : list[str]
+            The texts to ground.
+
+        Returns
+        -------
+        groundings : dict
+            A dictionary keyed by the texts given, with the list of gilda
+            grounding JSONs for each text as its value.
+        """
+        groundings = {}
+        missing = {}
+        with self._lock:
+            for text in texts:
+                norm_text = _normalize_text(text)
+                cached = self._cache.get(norm_text)
+                if cached is None:
+                    missing.setdefault(norm_text, []).append(text)
+                else:
+                    groundings[text] = cached
+
+        if missing:
+            logger.debug(f"Grounding {len(missing)} new texts.")
+            new_groundings = self._ground_texts(list(missing))
+            with self._lock:
+                for norm_text, gilda_list in new_groundings.items():
+                    self._cache[norm_text] = gilda_list
+                    for text in missing[norm_text]:
+                        groundings[text] = gilda_list
+        return groundings
+
+    @staticmethod
+    def _ground_texts(texts):
+        try:
+            from gilda.api import ground
+            return {text: [r.to_json() for r in ground(text)]
+                    for text in texts}
+        except ImportError:
+            res = requests.post(f'{GILDA_URL}/ground_multi',
+                                json=[{'text': text} for text in texts])
+            res.raise_for_status()
+
+            # Make sure an error is never cached as a grounding.
+            gilda_lists = res.json()
+            if not isinstance(gilda_lists, list) \
+                    or len(gilda_lists) != len(texts):
+                raise ValueError(f"Expected a list of {len(texts)} groundings "
+                                 f"from the grounding service, but got: "
+                                 f"{str(gilda_lists)[:200]}")
+            return dict(zip(texts, gilda_lists))
+
+    def clear(self):
+        """Remove all groundings from the cache."""
+        with self._lock:
+            self._cache.clear()
+
+    def save(self, path):
+        """Save the cached groundings to a JSON file, to warm start later."""
+        with self._lock:
+            cache_json = dict(self._cache.items())
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(cache_json, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Load groundings from a JSON file written by `save`."""
+        with open(path, 'r') as f:
+            cache_json = json.load(f)
+        with self._lock:
+            for norm_text, gilda_list in cache_json.items():
+                self._cache[norm_text] = gilda_list
+        logger.info(f"Loaded {len(cache_json)} groundings from {path}.")
+
+
+_active_grounder = None
+
+
+def get_grounder() -> Grounder:
+    """Get the grounder shared by queries and the REST API.
+
+    If the environment variable INDRA_DB_GROUNDING_CACHE is set, groundings
+    are loaded from the file at that path when the grounder is first made.
+    """
+    global _active_grounder
+    if _active_grounder is None:
+        warm_start_path = os.environ.get('INDRA_DB_GROUNDING_CACHE')
+        _active_grounder = Grounder(warm_start_path=warm_start_path)
+    return _active_grounder
+
+
+def set_grounder(grounder: Grounder):
+    """Set the grounder shared by queries and the REST API."""
+    global _active_grounder
+    if not isinstance(grounder, Grounder):
+        raise TypeError(f"Expected a Grounder, but got {type(grounder)}.")
+    _active_grounder = grounder
+
+
+def gilda_ground(agent_text):
+    """Get the gilda groundings of a text, using the shared grounder."""
+    return get_grounder().ground(agent_text)
+
+
+def gilda_ground_batch(agent_texts):
+    """Get the gilda groundings of many texts, using the shared grounder."""
+    return get_grounder().ground_batch(agent_texts)
@@ -1,9 +1,10 @@
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 from indra_db import get_ro
 
 
-def get_mesh_ref_counts(mesh_terms, require_all=False, ro=None):
+def get_mesh_ref_counts(mesh_terms, require_all=False, ro=None,
+                        include_descendants=False):
     """Get the number of distinct pmids by mesh term for each hash.
 
     This function directly queries a table in the readonly database that counts
@@ -24,6 +25,12 @@ def get_mesh_ref_counts(mesh_terms, require_all=False, ro=None):
     ro : Optional[DatabaseManager]
         A database manager handle. The default is the primary readonly, as
         indicated by environment variables or the config file.
+    include_descendants : Optional[bool]
+        If True, the count for each MeSH term ("D" ID) includes the PMIDs of
+        the terms below it in the MeSH hierarchy. A paper annotated with more
+        than one of those terms is counted once for each, so these counts
+        are capped at the total number of PMIDs for the hash. Default is
+        False.
     """
     # Get the default readonly database, if needed..
     if ro is None:
@@ -42,6 +49,22 @@ def get_mesh_ref_counts(mesh_terms, require_all=False, ro=None):
         if not mesh_num_map:
             continue
 
+        # With descendants, roll the counts of each term up to the given
+        # terms through the closure of the MeSH hierarchy.
+        if include_descendants and prefix == 'D':
+            closure = ro.MeshTermClosure
+            ref_count = func.least(func.sum(table.ref_count),
+                                   table.pmid_count)
+            table = (
+                select([table.mk_hash, closure.ancestor_num.label('mesh_num'),
+                        ref_count.label('ref_count'), table.pmid_count])
+                .where(closure.descendant_num == table.mesh_num)
+                .where(closure.ancestor_num.in_(mesh_num_map.keys()))
+                .group_by(table.mk_hash, closure.ancestor_num,
+                          table.pmid_count)
+                .alias('mesh_desc_ref_counts')
+            ).c
+
         # Build the query.
         nums = func.array_agg(table.mesh_num)
         counts = func.array_agg(table.ref_count)
@@ -3,28 +3,50 @@ __all__ = ['StatementQueryResult', 'Query', 'Intersection', 'Union',
            'HasSources', 'HasOnlySource', 'HasReadings', 'HasDatabases',
            'SourceQuery', 'SourceIntersection', 'HasType', 'IntrusiveQuery',
            'HasNumAgents', 'HasNumEvidence', 'FromPapers', 'EvidenceFilter',
-           'AgentJsonExpander', 'FromAgentJson', 'EmptyQuery']
+           'AgentJsonExpander', 'FromAgentJson', 'EmptyQuery', 'run_batch']
 
 import json
+import base64
+import asyncio
+import inspect
 import logging
-import requests
+from functools import wraps, partial, lru_cache
 from itertools import combinations
 from typing import Union as TypeUnion, Optional, Iterable as TypeIterable
 from collections import OrderedDict, Iterable, defaultdict
+from collections.abc import Mapping, MutableMapping
 from sqlalchemy import desc, true, select, or_, except_, func, null, and_, \
-    String, union, intersect
+    String, union, intersect, tuple_, union_all, literal, literal_column, \
+    exists, bindparam, BigInteger, false
+from sqlalchemy.dialects.postgresql import ARRAY
 
-from indra import get_config
 from indra.statements import stmts_from_json, get_statement_by_name, \
-    get_all_descendants
+    get_all_descendants, Statement
 
 from indra_db.schemas.readonly_schema import ro_role_map, ro_type_map, \
     SOURCE_GROUPS
-from indra_db.util import regularize_agent_id, get_ro
+from indra_db.util import regularize_agent_id, get_ro, \
+    get_paper_id_resolver, get_json_codec
+from indra_db.util.json_codec import load_json
+
+from .cache import get_query_cache, make_query_key, get_compiled_cache
+from .grounding import gilda_ground
+from .rest_client import get_rest_client
 
 logger = logging.getLogger(__name__)
 
 
+# MessagePack is only needed for the binary form of query results.
+try:
+    import msgpack
+    WITH_MSGPACK = True
+except ImportError:
+    WITH_MSGPACK = False
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+WIRE_VERSION = 1
+
+
 class QueryResult(object):
     """The generic result of a query.
 
@@ -45,6 +67,9 @@ class QueryResult(object):
         The belief score of each element.
     query_json : dict
         A description of the query that was used.
+    next_page_token : Optional[str]
+        An opaque token marking the end of this page of results, which may be
+        passed back to the query to get the next page.
 
     Attributes
     ----------
@@ -55,16 +80,25 @@ class QueryResult(object):
         The limit that was applied to this query.
     next_offset : int
         The next offset that would be appropriate if this is a paging query.
+    next_page_token : Optional[str]
+        The token to pass as `page_token` to get the next page of results, or
+        None if this is the last page.
     evidence_counts : dict
         The count of evidence for each element.
     belief_scores : dict
         The belief score of each element.
     query_json : dict
         A description of the query that was used.
+    total_count : Optional[int]
+        The number of results of the query over all pages, if it was
+        requested.
+    total_count_exact : Optional[bool]
+        Whether `total_count` is exact, rather than the database's estimate.
     """
     def __init__(self, results: TypeIterable, limit: int, offset: int,
                  offset_comp: int, evidence_counts: dict, belief_scores: dict,
-                 query_json: dict, result_type: str):
+                 query_json: dict, result_type: str,
+                 next_page_token: Optional[str] = None):
         if not isinstance(results, Iterable) or isinstance(results, str):
             raise ValueError("Input `results` is expected to be an iterable, "
                              "and not a string.")
@@ -84,7 +118,15 @@ class QueryResult(object):
             self.next_offset = None
         else:
             self.next_offset = (0 if offset is None else offset) + offset_comp
+        self.next_page_token = next_page_token
         self.query_json = query_json
+        self.total_count = None
+        self.total_count_exact = None
+
+    def set_total_count(self, count: int, exact: bool):
+        """Set the number of results of the query over all pages."""
+        self.total_count = count
+        self.total_count_exact = exact
 
     @classmethod
     def empty(cls, empty_res, limit, offset, query_json, result_type):
@@ -106,9 +148,12 @@ class QueryResult(object):
         # Filter out some calculated values.
         next_offset = json_dict.pop('next_offset', None)
         total_evidence = json_dict.pop('total_evidence', None)
+        total_count = json_dict.pop('total_count', None)
+        total_count_exact = json_dict.pop('total_count_exact', None)
 
         # Build the class
         nc = cls(**json_dict)
+        nc.set_total_count(total_count, total_count_exact)
 
         # Convert result keys into integers, if appropriate
         if isinstance(nc.results, dict):
@@ -130,10 +175,10 @@ class QueryResult(object):
 
     def json(self) -> dict:
         """Return the JSON representation of the results."""
-        if not isinstance(self.results, dict) \
+        if not isinstance(self.results, Mapping) \
                 and not isinstance(self.results, list):
             json_results = list(self.results)
-        elif isinstance(self.results, dict):
+        elif isinstance(self.results, Mapping):
             json_results = {str(k): v for k, v in self.results.items()}
         else:
             json_results = self.results
@@ -144,7 +189,70 @@ class QueryResult(object):
                 'belief_scores': self.belief_scores,
                 'total_evidence': self.total_evidence,
                 'result_type': self.result_type,
-                'offset_comp': self.offset_comp}
+                'offset_comp': self.offset_comp,
+                'next_page_token': self.next_page_token,
+                'total_count': self.total_count,
+                'total_count_exact': self.total_count_exact}
+
+    def to_msgpack(self) -> bytes:
+        """Return a compact binary (MessagePack) form of the results.
+
+        Unlike the JSON, hashes are kept as integers, and evidence counts,
+        belief scores, and source counts are given as columns aligned with
+        the keys of the results, rather than as maps repeating every key. Use
+        `QueryResult.from_msgpack` to load the results.
+        """
+        if not WITH_MSGPACK:
+            raise ApiError("The msgpack package is needed to use the binary "
+                           "format.")
+        return msgpack.packb(self._wire_dict(), use_bin_type=True)
+
+    def _wire_dict(self) -> dict:
+        if isinstance(self.results, Mapping):
+            keys = list(self.results.keys())
+            values = list(self.results.values())
+        else:
+            keys = list(self.results)
+            values = None
+        return {'wire_version': WIRE_VERSION, 'keys': keys, 'values': values,
+                'limit': self.limit, 'offset': self.offset,
+                'next_offset': self.next_offset,
+                'query_json': self.query_json,
+                'evidence_counts': _pack_column(self.evidence_counts, keys),
+                'belief_scores': _pack_column(self.belief_scores, keys),
+                'total_evidence': self.total_evidence,
+                'result_type': self.result_type,
+                'offset_comp': self.offset_comp,
+                'next_page_token': self.next_page_token,
+                'total_count': self.total_count,
+                'total_count_exact': self.total_count_exact}
+
+    @classmethod
+    def from_msgpack(cls, data: bytes) \
+            -> TypeUnion['QueryResult', 'StatementQueryResult',
+                         'AgentQueryResult']:
+        """Load results from the binary form made by `to_msgpack`."""
+        if not WITH_MSGPACK:
+            raise ApiError("The msgpack package is needed to use the binary "
+                           "format.")
+        wire = msgpack.unpackb(data, raw=False, strict_map_key=False)
+        if wire.pop('wire_version') != WIRE_VERSION:
+            raise ApiError("Unsupported version of the binary format.")
+
+        # Rebuild the JSON form, but with the keys in their native types.
+        keys = wire.pop('keys')
+        values = wire.pop('values')
+        json_dict = wire
+        if values is None:
+            json_dict['results'] = keys
+        else:
+            json_dict['results'] = dict(zip(keys, values))
+        for col_name in ['evidence_counts', 'belief_scores']:
+            json_dict[col_name] = _unpack_column(json_dict[col_name], keys)
+        if 'source_counts' in json_dict:
+            json_dict['source_counts'] = \
+                _unpack_source_counts(json_dict['source_counts'], keys)
+        return QueryResult.from_json(json_dict)
 
 
 class StatementQueryResult(QueryResult):
@@ -171,27 +279,35 @@ class StatementQueryResult(QueryResult):
         The counts of evidence from each source for each element.
     query_json : dict
         The JSON representation of the query that was used.
+    next_page_token : Optional[str]
+        An opaque token marking the end of this page of results.
 
     Attributes
     ----------
-    results : dict
+    results : Mapping
         The results of the query keyed by unique IDs (mk_hash for PA Statements,
-        IDs for Raw Statements, etc.)
+        IDs for Raw Statements, etc.) When read from the database, this is a
+        `LazyStatementJsons`, which only parses each statement JSON when it is
+        first accessed.
     limit : int
         The limit that was applied to this query.
     query_json : dict
         A description of the query that was used.
     """
-    def __init__(self, results: dict, limit: int, offset: int,
+    def __init__(self, results: Mapping, limit: int, offset: int,
                  evidence_counts: dict, belief_scores: dict,
-                 returned_evidence: int, source_counts: dict, query_json: dict):
+                 returned_evidence: int, source_counts: dict, query_json: dict,
+                 next_page_token: Optional[str] = None):
         super(StatementQueryResult, self).__init__(results, limit,
                                                    offset, len(results),
                                                    evidence_counts,
                                                    belief_scores, query_json,
-                                                   'statements')
+                                                   'statements',
+                                                   next_page_token)
         self.returned_evidence = returned_evidence
         self.source_counts = source_counts
+        self._stmts = {}
+        self._stmt_list = None
 
     @classmethod
     def empty(cls, limit: int, offset: int, query_json: dict):
@@ -204,6 +320,15 @@ class StatementQueryResult(QueryResult):
                           'source_counts': self.source_counts})
         return json_dict
 
+    def _wire_dict(self) -> dict:
+        wire_dict = super(StatementQueryResult, self)._wire_dict()
+        wire_dict.update({
+            'returned_evidence': self.returned_evidence,
+            'source_counts': _pack_source_counts(self.source_counts,
+                                                 wire_dict['keys'])
+        })
+        return wire_dict
+
     @classmethod
     def from_json(cls, json_dict):
         json_dict = json_dict.copy()
@@ -217,19 +342,117 @@ class StatementQueryResult(QueryResult):
         return nc
 
     def statements(self) -> list:
-        """Get a list of Statements from the results."""
-        assert isinstance(self.results, dict), "Results must be a dictionary."
-        return stmts_from_json(list(self.results.values()))
+        """Get a list of Statements from the results.
+
+        The Statements are made the first time this is called, and the same
+        list is returned after that.
+        """
+        assert isinstance(self.results, Mapping), "Results must be a mapping."
+        if self._stmt_list is None:
+            self._stmt_list = stmts_from_json(list(self.results.values()))
+        return self._stmt_list
+
+    def get_statement(self, mk_hash) -> Optional[Statement]:
+        """Get the Statement with a given hash, making only that Statement.
+
+        Returns None if the hash is not in the results.
+        """
+        if mk_hash not in self._stmts:
+            if mk_hash not in self.results:
+                return None
+            self._stmts[mk_hash] = stmts_from_json([self.results[mk_hash]])[0]
+        return self._stmts[mk_hash]
+
+    def get_ev_count(self, mk_hash) -> int:
+        """Get the number of evidence of a statement, without parsing it."""
+        return self.evidence_counts[mk_hash]
+
+    def get_belief(self, mk_hash) -> float:
+        """Get the belief of a statement, without parsing it."""
+        return self.belief_scores[mk_hash]
+
+    def get_source_counts(self, mk_hash) -> dict:
+        """Get the evidence counts by source of a statement."""
+        return self.source_counts[mk_hash]
+
+
+class LazyStatementJsons(MutableMapping):
+    """A dict of statement JSONs keyed by hash, parsed on first access.
+
+    A statement is added either as the JSON text of the whole statement, or
+    as its pa_json with the raw JSON and text refs of each evidence. Only
+    those bytes are kept until the statement is accessed, when its JSON is
+    parsed (and its evidence assembled) and kept in place of them. Iterating
+    over the keys, taking the length, and checking membership do not parse
+    anything.
+    """
+    def __init__(self):
+        self._entries = OrderedDict()
+
+    def add_json_text(self, mk_hash, stmt_json_text):
+        """Add a statement as the text of its complete JSON."""
+        self._entries[mk_hash] = stmt_json_text
+
+    def add_pa_json(self, mk_hash, pa_json_bts):
+        """Add a statement as its pa_json, without evidence."""
+        self._entries[mk_hash] = (pa_json_bts, [])
+
+    def add_evidence(self, mk_hash, raw_json_bts, ref_dict):
+        """Add evidence to a statement added with `add_pa_json`."""
+        self._entries[mk_hash][1].append((raw_json_bts, ref_dict))
+
+    def is_parsed(self, mk_hash) -> bool:
+        """Check whether the JSON of a statement has been parsed."""
+        return isinstance(self._entries[mk_hash], dict)
+
+    def __getitem__(self, mk_hash):
+        entry = self._entries[mk_hash]
+        if isinstance(entry, dict):
+            return entry
+
+        if isinstance(entry, tuple):
+            pa_json_bts, ev_list = entry
+            stmt_json = load_json(pa_json_bts)
+            stmt_json['evidence'] = [_make_ev_json(raw_json_bts, ref_dict)
+                                     for raw_json_bts, ref_dict in ev_list]
+        else:
+            stmt_json = json.loads(entry)
+        self._entries[mk_hash] = stmt_json
+        return stmt_json
+
+    def __setitem__(self, mk_hash, stmt_json):
+        self._entries[mk_hash] = stmt_json
+
+    def __delitem__(self, mk_hash):
+        del self._entries[mk_hash]
+
+    def __contains__(self, mk_hash):
+        return mk_hash in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({len(self)} statements)'
+
+    def copy(self) -> dict:
+        """Get a dict of the (parsed) statement JSONs."""
+        return dict(self.items())
 
 
 class AgentQueryResult(QueryResult):
     """The result of a query for agent JSONs."""
     def __init__(self, results: dict, limit: int, offset: int, num_rows: int,
                  complexes_covered: set, evidence_counts: dict,
-                 belief_scores: dict, query_json: dict):
+                 belief_scores: dict, query_json: dict,
+                 next_page_token: Optional[str] = None):
         super(AgentQueryResult, self).__init__(results, limit, offset, num_rows,
                                                evidence_counts, belief_scores,
-                                               query_json, 'agents')
+                                               query_json, 'agents',
+                                               next_page_token)
         self.complexes_covered = complexes_covered
 
     @classmethod
@@ -241,6 +464,11 @@ class AgentQueryResult(QueryResult):
         json_dict['complexes_covered'] = [str(h) for h in self.complexes_covered]
         return json_dict
 
+    def _wire_dict(self) -> dict:
+        wire_dict = super(AgentQueryResult, self)._wire_dict()
+        wire_dict['complexes_covered'] = list(self.complexes_covered)
+        return wire_dict
+
     @classmethod
     def from_json(cls, json_dict):
         json_dict = json_dict.copy()
@@ -248,8 +476,60 @@ class AgentQueryResult(QueryResult):
         if result_type != 'agents':
             raise ValueError(f'Invalid result type {result_type} for this '
                              f'result class {cls}')
+        json_dict['num_rows'] = json_dict.pop('offset_comp')
         nc = super(AgentQueryResult, cls)._parse_json(json_dict)
         nc.complexes_covered = {int(h) for h in nc.complexes_covered}
+        return nc
+
+
+def _pack_column(mapping, keys):
+    """Pack a dict as a column of values aligned with the result keys.
+
+    The keys of the dict are only included if they differ from the result
+    keys, e.g. if results were removed after the query was run.
+    """
+    col_keys = _get_column_keys(mapping, keys)
+    if col_keys is None:
+        return {'keys': None, 'values': [mapping[k] for k in keys]}
+    return {'keys': col_keys, 'values': [mapping[k] for k in col_keys]}
+
+
+def _get_column_keys(mapping, keys):
+    """Get the keys of a dict, or None if they are the result keys."""
+    if len(mapping) == len(keys) and all(k in mapping for k in keys):
+        return None
+    return list(mapping.keys())
+
+
+def _unpack_column(column, keys):
+    """Unpack a dict packed by `_pack_column`."""
+    col_keys = keys if column['keys'] is None else column['keys']
+    return dict(zip(col_keys, column['values']))
+
+
+def _pack_source_counts(source_counts, keys):
+    """Pack source counts as a list of sources and a column for each.
+
+    A None in a column marks a source that is missing for that statement.
+    """
+    sources = sorted({src for counts in source_counts.values()
+                      for src in counts})
+    packed_keys = _get_column_keys(source_counts, keys)
+    col_keys = keys if packed_keys is None else packed_keys
+    columns = [[source_counts[k].get(src) for k in col_keys]
+               for src in sources]
+    return {'keys': packed_keys, 'sources': sources, 'columns': columns}
+
+
+def _unpack_source_counts(packed, keys):
+    """Unpack source counts packed by `_pack_source_counts`."""
+    col_keys = keys if packed['keys'] is None else packed['keys']
+    source_counts = {k: {} for k in col_keys}
+    for src, column in zip(packed['sources'], packed['columns']):
+        for k, count in zip(col_keys, column):
+            if count is not None:
+                source_counts[k][src] = count
+    return source_counts
 
 
 def _make_agent_dict(ag_dict):
@@ -258,14 +538,120 @@ def _make_agent_dict(ag_dict):
             if str(n) in ag_dict}
 
 
+def _execute(ro, selection):
+    """Execute a selection or ORM query on the session connection of `ro`.
+
+    If a compiled SQL cache is set, statements are compiled through it, so
+    the compiled form of statements that differ only in their values is
+    reused.
+    """
+    conn = ro.session.connection()
+    cache = get_compiled_cache()
+    if cache is not None:
+        return cache.execute(conn, selection)
+    return conn.execute(getattr(selection, 'statement', selection))
+
+
+def _make_page_token(sort_by, sort_value, key):
+    """Encode the position of the last entry of a page as an opaque token."""
+    token_json = {'sort_by': sort_by, 'value': sort_value, 'key': key}
+    token_bts = json.dumps(token_json).encode('utf-8')
+    return base64.urlsafe_b64encode(token_bts).decode('utf-8')
+
+
+def _read_page_token(page_token, sort_by):
+    """Get the sort value and key of the position marked by a page token."""
+    try:
+        token_json = json.loads(base64.urlsafe_b64decode(page_token))
+        token_sort_by = token_json['sort_by']
+        sort_value = token_json['value']
+        key = token_json['key']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"Invalid page token: {page_token}")
+    if token_sort_by != sort_by:
+        raise ValueError(f"Page token was made for results sorted by "
+                         f"{token_sort_by}, not {sort_by}.")
+    return sort_value, key
+
+
+def _get_next_page_token(limit, sort_by, sort_values):
+    """Get the token for the page after the given page, if there may be one.
+
+    The position of the page is that of its last entry, meaning the entry with
+    the least (sort value, key) pair, matching the order of the hash query.
+    The `sort_values` must cover every key returned by the hash query for the
+    page, including any whose content is dropped afterwards, so that a page
+    is only taken to be the last when the hash query ran out of rows.
+    """
+    if limit is None or len(sort_values) < limit:
+        return None
+    last_key = min(sort_values, key=lambda k: (sort_values[k], k))
+    return _make_page_token(sort_by, sort_values[last_key], last_key)
+
+
+def _get_page_sort_values(rows, sort_by):
+    """Get the sort values of the hashes in rows of statement content.
+
+    The rows start with the mk_hash, source counts, ev_count, and belief of
+    a statement, as made by `Query._get_content_selection`.
+    """
+    sort_idx = 2 if sort_by == 'ev_count' else 3
+    return {row[0]: row[sort_idx] for row in rows}
+
+
 class ApiError(Exception):
     pass
 
 
+def _use_query_cache(result_type):
+    """Serve the results of a Query method from the active cache, if any."""
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = get_query_cache()
+            if cache is None or self._print_only or self.empty:
+                return method(self, *args, **kwargs)
+
+            # Resolve the database here, so it is only done once.
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            if bound.arguments['ro'] is None:
+                bound.arguments['ro'] = get_ro('primary')
+            ro = bound.arguments['ro']
+            if ro is None:
+                return method(*bound.args, **bound.kwargs)
+
+            params = {k: v for k, v in bound.arguments.items()
+                      if k not in ['self', 'ro']}
+            key = make_query_key(ro, self, result_type, params)
+            if key is None:
+                return method(*bound.args, **bound.kwargs)
+
+            # Cached statements may hold JSONs that have yet to be decoded.
+            if result_type == 'statements':
+                get_json_codec().load_dictionaries(ro)
+
+            result = cache.get(key)
+            if result is not None:
+                logger.debug(f"Found {result_type} for {self} in the cache.")
+                result.query_json = self.to_json()
+                return result
+
+            result = method(*bound.args, **bound.kwargs)
+            if result is not None:
+                cache.put(key, result)
+            return result
+        return wrapper
+    return decorator
+
+
 class AgentJsonSQL:
     meta_type = NotImplemented
 
     def __init__(self, ro, with_complex_dups=False):
+        self._ro = ro
         self.q = ro.session.query(ro.AgentInteractions.mk_hash,
                                   ro.AgentInteractions.agent_json,
                                   ro.AgentInteractions.type_num,
@@ -302,6 +688,9 @@ class AgentJsonSQL:
     def agg(self, ro, with_hashes=True, sort_by='ev_count'):
         raise NotImplementedError
 
+    def seek(self, sort_value, key):
+        raise NotImplementedError
+
     def run(self):
         raise NotImplementedError
 
@@ -325,7 +714,7 @@ class InteractionSQL(AgentJsonSQL):
 
     def run(self):
         logger.debug(f"Executing query (interaction):\n{self.q}")
-        names = self.agg_q.all()
+        names = _execute(self._ro, self.agg_q).fetchall()
         results = {}
         ev_totals = {}
         bel_maxes = {}
@@ -382,7 +771,7 @@ class RelationSQL(AgentJsonSQL):
 
     def run(self):
         logger.debug(f"Executing query (get_relations):\n{self.q}")
-        names = self.agg_q.all()
+        names = _execute(self._ro, self.agg_q).fetchall()
         results = {}
         ev_totals = {}
         bel_maxes = {}
@@ -446,6 +835,12 @@ class AgentSQL(AgentJsonSQL):
         self._limit = None
         self._offset = None
         self._return_hashes = False
+        self._sort_by = None
+        self._sort_col = None
+        self._json_col = None
+        self._count_col = None
+        self._after = None
+        self.last_position = None
 
     def limit(self, limit):
         self._limit = limit
@@ -456,37 +851,99 @@ class AgentSQL(AgentJsonSQL):
         return self
 
     def agg(self, ro, with_hashes=True, sort_by='ev_count'):
-        names_sq = self.q.subquery('names')
+        names_cte = self.q.cte('names')
+        if sort_by == 'ev_count':
+            sort_agg = func.sum(names_cte.c.ev_count)
+        else:
+            sort_agg = func.max(names_cte.c.belief)
+        complex_num = ro_type_map.get_int("Complex")
         agent_q = ro.session.query(
-            names_sq.c.agent_json,
-            names_sq.c.agent_count,
-            func.sum(names_sq.c.ev_count).label('ev_count'),
-            func.max(names_sq.c.belief).label('belief'),
-            func.array_agg(names_sq.c.src_json).label('src_jsons'),
+            names_cte.c.agent_json,
+            names_cte.c.agent_count,
+            func.sum(names_cte.c.ev_count).label('ev_count'),
+            func.max(names_cte.c.belief).label('belief'),
+            func.array_agg(names_cte.c.src_json).label('src_jsons'),
             func.jsonb_object(
-                func.array_agg(names_sq.c.mk_hash.cast(String)),
-                func.array_agg(names_sq.c.type_num.cast(String))
-            ).label('hashes')
+                func.array_agg(names_cte.c.mk_hash.cast(String)),
+                func.array_agg(names_cte.c.type_num.cast(String))
+            ).label('hashes'),
+            func.bool_or(names_cte.c.type_num != complex_num)
+                .label('has_other_types'),
+            func.row_number().over(
+                order_by=[desc(sort_agg), names_cte.c.agent_json,
+                          names_cte.c.agent_count]
+            ).label('pos')
         ).group_by(
-            names_sq.c.agent_json,
-            names_sq.c.agent_count
+            names_cte.c.agent_json,
+            names_cte.c.agent_count
         )
-        sq = agent_q.subquery('agents')
-        self.agg_q = ro.session.query(sq.c.agent_json, sq.c.agent_count,
-                                      sq.c.ev_count, sq.c.belief,
-                                      sq.c.src_jsons, sq.c.hashes)
+        agents_cte = agent_q.cte('agents')
+
+        # A group made only of complexes is a duplicate if each of its
+        # complexes was already covered by a group earlier in the order, or
+        # by the hashes given in complexes_covered. Find the position of the
+        # first group of each complex, so this is decided in a single query.
+        link_q = ro.session.query(
+            names_cte.c.mk_hash,
+            agents_cte.c.pos,
+            func.min(agents_cte.c.pos).over(
+                partition_by=names_cte.c.mk_hash
+            ).label('first_pos')
+        ).filter(names_cte.c.agent_json == agents_cte.c.agent_json,
+                 names_cte.c.agent_count == agents_cte.c.agent_count,
+                 names_cte.c.type_num == complex_num)
+        links_sq = link_q.subquery('complex_links')
+        new_complex = and_(links_sq.c.pos == agents_cte.c.pos,
+                           links_sq.c.first_pos == links_sq.c.pos)
+        if self.complexes_covered:
+            new_complex = and_(
+                new_complex,
+                links_sq.c.mk_hash.notin_(self.complexes_covered)
+            )
+
+        self.agg_q = ro.session.query(
+            agents_cte.c.agent_json, agents_cte.c.agent_count,
+            agents_cte.c.ev_count, agents_cte.c.belief,
+            agents_cte.c.src_jsons, agents_cte.c.hashes
+        ).filter(or_(agents_cte.c.has_other_types,
+                     exists().where(new_complex)))
         self._return_hashes = with_hashes
+        self._sort_by = sort_by
         if sort_by == 'ev_count':
-            return [desc(sq.c.ev_count), sq.c.agent_json]
+            self._sort_col = agents_cte.c.ev_count
         else:
-            return [desc(sq.c.belief), sq.c.agent_json]
+            self._sort_col = agents_cte.c.belief
+        self._json_col = agents_cte.c.agent_json
+        self._count_col = agents_cte.c.agent_count
+        return [desc(self._sort_col), self._json_col, self._count_col]
+
+    def seek(self, sort_value, key):
+        """Only get the agent groups ordered after the given position.
+
+        The `key` is the (agent JSON, agent count) pair of the group at that
+        position, which together with the sort value fixes its place in the
+        order.
+        """
+        if not isinstance(key, (list, tuple)) or len(key) != 2:
+            raise ValueError(f"Invalid agent group position: {key}")
+        self._after = (sort_value, *key)
+        return self
 
-    def __get_next_query(self, more_offset=0):
+    def __get_next_query(self):
         q = self.agg_q
-        if self._offset or more_offset:
-            net_offset = 0 if self._offset is None else self._offset
-            net_offset += more_offset
-            q = q.offset(net_offset)
+        if self._after is not None:
+            # The sort value descends while the agent JSON and count ascend,
+            # so a row comparison cannot be used here.
+            sort_value, agent_json, agent_count = self._after
+            q = q.filter(or_(
+                self._sort_col < sort_value,
+                and_(self._sort_col == sort_value,
+                     or_(self._json_col > agent_json,
+                         and_(self._json_col == agent_json,
+                              self._count_col > agent_count)))
+            ))
+        if self._offset:
+            q = q.offset(self._offset)
 
         if self._limit is not None:
             q = q.limit(self._limit)
@@ -495,64 +952,70 @@ class AgentSQL(AgentJsonSQL):
 
     def run(self):
         logger.debug(f"Executing query (get_agents):\n{self.agg_q}")
-        names = self.__get_next_query().all()
-
-        results = {}
-        ev_totals = {}
-        bel_maxes = {}
+        self._start_results()
+        self._add_rows(_execute(self._ro, self.__get_next_query()).fetchall())
+        return self._results, self._ev_totals, self._bel_maxes, self._num_rows
+
+    async def run_async(self, ro):
+        """Run the query like `run`, using the async methods of `ro`."""
+        logger.debug(f"Executing query (get_agents_async):\n{self.agg_q}")
+        self._start_results()
+        self._add_rows(await ro.async_execute(self.__get_next_query()))
+        return self._results, self._ev_totals, self._bel_maxes, self._num_rows
+
+    def _start_results(self):
+        self._results = {}
+        self._ev_totals = {}
+        self._bel_maxes = {}
         if self.complexes_covered is None:
             self.complexes_covered = set()
-        num_entries = 0
-        num_rows = 0
-        while True:
-            for ag_json, n_ag, n_ev, bel, src_jsons, hashes in names:
-                num_rows += 1
-
-                # See if this row has anything new to offer.
-                my_hashes = _AgentHashes(hashes)
-                if not my_hashes.has_other_types \
-                        and my_hashes.complex_hashes <= self.complexes_covered:
-                    continue
-                self.complexes_covered |= my_hashes.complex_hashes
-
-                # Generate the key for this pair of agents.
-                ordered_agents = [ag_json.get(str(n))
-                                  for n in range(max(n_ag, int(max(ag_json))+1))]
-                key = 'Agents(' + ', '.join(str(ag) for ag in ordered_agents) + ')'
-                if key in results:
-                    logger.warning("Something went weird processing results "
-                                   "for agents.")
-
-                # Aggregate the source counts.
-                source_counts = defaultdict(lambda: 0)
-                for src_json in src_jsons:
-                    for src, cnt in src_json.items():
-                        source_counts[src] += cnt
-
-                # Add this entry to the results.
-                results[key] = {'id': key, 'source_counts': dict(source_counts),
-                                'agents': _make_agent_dict(ag_json)}
-                if self._return_hashes:
-                    results[key]['hashes'] = my_hashes.hashes
-                else:
-                    results[key]['hashes'] = None
-                ev_totals[key] = sum(source_counts.values())
-                bel_maxes[key] = max([bel, bel_maxes.get(key, 0)])
-
-                # Sanity check. Only a coding error could cause this to fail.
-                assert n_ev == ev_totals[key], "Evidence counts don't add up."
-                num_entries += 1
-                if self._limit is not None and num_entries >= self._limit:
-                    break
+        self._num_rows = 0
 
-            if self._limit is None or num_entries >= self._limit:
-                break
+    def _add_rows(self, names):
+        """Add rows to the results.
 
-            names = self.__get_next_query(num_rows).all()
-            if not names:
-                break
+        Groups with nothing but complexes already covered are removed by the
+        query itself, so every row makes an entry.
+        """
+        for ag_json, n_ag, n_ev, bel, src_jsons, hashes in names:
+            self._num_rows += 1
+            if self._sort_by == 'ev_count':
+                self.last_position = (n_ev, [ag_json, n_ag])
+            else:
+                self.last_position = (bel, [ag_json, n_ag])
+
+            # Record the complexes this row covers.
+            my_hashes = _AgentHashes(hashes)
+            self.complexes_covered |= my_hashes.complex_hashes
 
-        return results, ev_totals, bel_maxes, num_rows
+            # Generate the key for this pair of agents.
+            ordered_agents = [ag_json.get(str(n))
+                              for n in range(max(n_ag, int(max(ag_json))+1))]
+            key = 'Agents(' + ', '.join(str(ag) for ag in ordered_agents) + ')'
+            if key in self._results:
+                logger.warning("Something went weird processing results "
+                               "for agents.")
+
+            # Aggregate the source counts.
+            source_counts = defaultdict(lambda: 0)
+            for src_json in src_jsons:
+                for src, cnt in src_json.items():
+                    source_counts[src] += cnt
+
+            # Add this entry to the results.
+            self._results[key] = {'id': key,
+                                  'source_counts': dict(source_counts),
+                                  'agents': _make_agent_dict(ag_json)}
+            if self._return_hashes:
+                self._results[key]['hashes'] = my_hashes.hashes
+            else:
+                self._results[key]['hashes'] = None
+            self._ev_totals[key] = sum(source_counts.values())
+            self._bel_maxes[key] = max([bel, self._bel_maxes.get(key, 0)])
+
+            # Sanity check. Only a coding error could cause this to fail.
+            assert n_ev == self._ev_totals[key], \
+                "Evidence counts don't add up."
 
     def print(self):
         print(self.__get_next_query())
@@ -561,6 +1024,10 @@ class AgentSQL(AgentJsonSQL):
 class Query(object):
     """The core class for all queries; not functional on its own."""
 
+    # Queries estimated to have more statements than this are not counted
+    # exactly by `get_count` unless asked.
+    count_exact_threshold = 100000
+
     def __init__(self, empty=False, full=False):
         if empty and full:
             raise ValueError("Cannot be both empty and full.")
@@ -633,20 +1100,15 @@ class Query(object):
                   sort_by='ev_count', **other_params):
         """Retrieve results from the remote API."""
         logger.info("Using remote API to resolve query.")
-        url = get_config('INDRA_DB_REST_URL', failure_ok=False)
-        params = {'json': json.dumps(self.to_json()), 'limit': limit,
-                  'offset': offset, 'sort_by': sort_by}
-        params.update(other_params)
-        resp = requests.get(f'{url}/query/{result_type}',
-                            params=params)
-        if resp.status_code != 200:
-            raise ApiError(f"REST API failed with ({resp.status_code}): "
-                           f"{resp.json()}")
-
-        return QueryResult.from_json(resp.json())
+        return get_rest_client().get_result(self.to_json(), result_type,
+                                            limit, offset, sort_by,
+                                            **other_params)
 
+    @_use_query_cache('statements')
     def get_statements(self, ro=None, limit=None, offset=None,
-                       sort_by='ev_count', ev_limit=None, evidence_filter=None) \
+                       sort_by='ev_count', ev_limit=None, evidence_filter=None,
+                       page_token=None, json_in_sql=False,
+                       prefilter_evidence=False, with_count=False) \
             -> Optional[StatementQueryResult]:
         """Get the statements that satisfy this query.
 
@@ -669,6 +1131,29 @@ class Query(object):
         evidence_filter : None or EvidenceFilter
             If None, no filtering will be applied. Otherwise, an EvidenceFilter
             class must be provided.
+        page_token : Optional[str]
+            The `next_page_token` of a previous result for this query. If given,
+            results will start after the last statement of that result, which
+            unlike `offset` does not require the database to scan the earlier
+            pages.
+        json_in_sql : bool
+            If True, the statement JSONs, complete with evidence, are built by
+            the database using jsonb functions, rather than being assembled in
+            Python from the JSON of each evidence. This is much faster when a
+            lot of evidence is retrieved. The database cannot decode JSONs
+            compressed with a dictionary, so if the readonly database has
+            any dictionaries, the JSONs are assembled in Python regardless.
+            Default is False.
+        prefilter_evidence : bool
+            If True, and an `evidence_filter` is given, only statements with
+            at least one evidence that passes the filter are selected for the
+            page, so the page is not left short by statements whose evidence
+            is all filtered out. Default is False, in which case the page is
+            selected first and such statements are dropped.
+        with_count : bool
+            If True, the number of statements that satisfy this query over all
+            pages is set as the `total_count` of the result, as from
+            `get_count`. Default is False.
 
         Returns
         -------
@@ -690,25 +1175,264 @@ class Query(object):
                                "of evidence filter through API not yet "
                                "implemented.")
             return self._rest_get('statements', limit, offset, sort_by,
-                                  ev_limit=ev_limit)
+                                  ev_limit=ev_limit, page_token=page_token,
+                                  with_count=with_count or None)
+
+        # Make sure the JSONs can be decoded.
+        if get_json_codec().load_dictionaries(ro) and json_in_sql:
+            logger.warning("Statement JSONs may be compressed, which the "
+                           "database cannot decode, so they will be "
+                           "assembled in Python.")
+            json_in_sql = False
+
+        # Build the SQL selection for the statement content.
+        selection, ref_link_keys = \
+            self._get_statements_selection(
+                ro, limit, offset, sort_by, ev_limit, evidence_filter,
+                page_token=page_token, prefilter_evidence=prefilter_evidence
+            )
+        if json_in_sql:
+            selection = _get_stmt_json_selection(selection, ref_link_keys)
+        if self._print_only:
+            print(selection)
+            return
 
-        # Get the query for mk_hashes and ev_counts, and apply the generic
-        # limits to it.
-        mk_hashes_q = self.build_hash_query(ro)
-        mk_hashes_q = mk_hashes_q.distinct()
-        mk_hash_obj, ev_count_obj, belief_obj = self._get_core_cols(ro)
-        if sort_by == 'ev_count':
-            sort_term = [desc(ev_count_obj)]
-        elif sort_by == 'belief':
-            sort_term = [desc(belief_obj)]
+        logger.debug(f"Executing query (get_statements):\n{selection}")
+
+        # Execute the query.
+        proxy = _execute(ro, selection)
+        res = proxy.fetchall()
+        if res:
+            logger.debug("res is %d row by %d cols." % (len(res), len(res[0])))
         else:
-            raise ValueError(f"Invalid sort option: {sort_by}.")
-        mk_hashes_q = self._apply_limits(mk_hashes_q, sort_term, limit, offset)
+            logger.debug("res is empty.")
+
+        # Unpack the statements.
+        if json_in_sql:
+            result = self._make_stmt_json_result(res, ro.get_source_names(),
+                                                 limit, offset, sort_by)
+        else:
+            result = self._make_statement_result(res, ro.get_source_names(),
+                                                 ref_link_keys, limit, offset,
+                                                 sort_by, ev_limit)
+        if with_count:
+            result.set_total_count(*self._get_count(ro))
+        return result
+
+    def _make_stmt_json_result(self, rows, src_set, limit, offset, sort_by) \
+            -> StatementQueryResult:
+        """Package rows of complete statement JSONs into a result."""
+        stmts_dict = LazyStatementJsons()
+        ev_counts = OrderedDict()
+        beliefs = OrderedDict()
+        source_counts = OrderedDict()
+        returned_evidence = 0
+        for mk_hash, src_json, ev_count, belief, stmt_json, n_ev in rows:
+            if stmt_json is None:
+                logger.warning("Row returned without pa_json. This likely "
+                               "indicates that an over-zealous evidence "
+                               "filter was used, which filtered out all "
+                               "evidence. The statement will be dropped. "
+                               "Use prefilter_evidence to avoid this.")
+                continue
+            source_counts[mk_hash] = dict.fromkeys(src_set, 0)
+            source_counts[mk_hash].update(src_json)
+            ev_counts[mk_hash] = ev_count
+            beliefs[mk_hash] = belief
+            stmts_dict.add_json_text(mk_hash, stmt_json)
+            returned_evidence += n_ev
+
+        next_page_token = _get_next_page_token(
+            limit, sort_by, _get_page_sort_values(rows, sort_by)
+        )
+        return StatementQueryResult(stmts_dict, limit, offset, ev_counts,
+                                    beliefs, returned_evidence, source_counts,
+                                    self.to_json(), next_page_token)
+
+    def _make_statement_result(self, rows, src_set, ref_link_keys, limit,
+                               offset, sort_by, ev_limit) \
+            -> StatementQueryResult:
+        """Package rows of the statement content selection into a result.
+
+        The statement JSONs are only assembled when they are accessed.
+        """
+        stmts_dict = LazyStatementJsons()
+        ev_counts = OrderedDict()
+        beliefs = OrderedDict()
+        source_counts = OrderedDict()
+        returned_evidence = 0
+        for row in rows:
+            row_data = _unpack_statement_row(row, ref_link_keys, src_set,
+                                             ev_limit)
+            if row_data is None:
+                continue
+            mk_hash, src_dict, ev_count, belief, pa_json_bts, ev_raw = row_data
+
+            # Add a new statement if the hash is new.
+            if mk_hash not in stmts_dict:
+                source_counts[mk_hash] = src_dict
+                ev_counts[mk_hash] = ev_count
+                beliefs[mk_hash] = belief
+                stmts_dict.add_pa_json(mk_hash, pa_json_bts)
+
+            # Add the evidence to the statement.
+            if ev_raw is not None:
+                returned_evidence += 1
+                stmts_dict.add_evidence(mk_hash, *ev_raw)
 
+        next_page_token = _get_next_page_token(
+            limit, sort_by, _get_page_sort_values(rows, sort_by)
+        )
+        return StatementQueryResult(stmts_dict, limit, offset, ev_counts,
+                                    beliefs, returned_evidence, source_counts,
+                                    self.to_json(), next_page_token)
+
+    def iter_statements(self, ro=None, limit=None, offset=None,
+                        sort_by='ev_count', ev_limit=None,
+                        evidence_filter=None, chunk_size=1000,
+                        prefilter_evidence=False):
+        """Iterate over the statements that satisfy this query.
+
+        Unlike `get_statements`, the results are read from the database in
+        chunks using a server-side cursor, and each statement JSON is yielded
+        as soon as all of its evidence has been received, so memory use is
+        bounded by `chunk_size` rather than by the size of the result.
+
+        Parameters
+        ----------
+        ro : DatabaseManager
+            A database manager handle that has valid Readonly tables built.
+        limit : int
+            Control the maximum number of statements returned.
+        offset : int
+            Get results starting from the value of offset.
+        sort_by : str
+            Options are currently 'ev_count' or 'belief'. Results will return in
+            order of the given parameter.
+        ev_limit : int
+            Limit the number of evidence returned for each statement.
+        evidence_filter : None or EvidenceFilter
+            If None, no filtering will be applied. Otherwise, an EvidenceFilter
+            class must be provided.
+        chunk_size : int
+            The number of rows to fetch from the database at a time. Default is
+            1000.
+        prefilter_evidence : bool
+            If True, only statements with at least one evidence that passes
+            the `evidence_filter` are selected. Default is False.
+
+        Yields
+        ------
+        stmt_json : dict
+            The JSON of a single statement, with its evidence.
+        """
+        if ro is None:
+            ro = get_ro('primary')
+
+        # If the result is by definition empty, there is nothing to yield.
+        if self.empty:
+            return
+
+        # If the database isn't available, route through the web service.
+        if ro is None:
+            logger.info("Using remote API to page through statements.")
+            pages = get_rest_client().iter_pages(self.to_json(), 'statements',
+                                                 chunk_size, limit, offset,
+                                                 sort_by, ev_limit=ev_limit)
+            for page in pages:
+                yield from page.results.values()
+            return
+        get_json_codec().load_dictionaries(ro)
+
+        # Build the SQL selection, making sure that all the rows for any given
+        # statement arrive together.
+        selection, ref_link_keys = \
+            self._get_statements_selection(
+                ro, limit, offset, sort_by, ev_limit, evidence_filter,
+                group_rows=True, prefilter_evidence=prefilter_evidence
+            )
+        if self._print_only:
+            print(selection)
+            return
+
+        logger.debug(f"Streaming query (iter_statements):\n{selection}")
+
+        # Execute the query using a server-side cursor.
+        proxy = (ro.session.connection()
+                 .execution_options(stream_results=True)
+                 .execute(selection))
+        src_set = ro.get_source_names()
+        stmt_hash = None
+        stmt_json = None
+        try:
+            while True:
+                rows = proxy.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                for row in rows:
+                    row_data = _unpack_statement_row(row, ref_link_keys,
+                                                     src_set, ev_limit)
+                    if row_data is None:
+                        continue
+                    mk_hash, _, _, _, pa_json_bts, ev_raw = row_data
+
+                    # When a new hash turns up, the previous statement is
+                    # complete.
+                    if mk_hash != stmt_hash:
+                        if stmt_json is not None:
+                            yield stmt_json
+                        stmt_hash = mk_hash
+                        stmt_json = load_json(pa_json_bts)
+                        stmt_json['evidence'] = []
+
+                    if ev_raw is not None:
+                        stmt_json['evidence'].append(_make_ev_json(*ev_raw))
+        finally:
+            proxy.close()
+
+        if stmt_json is not None:
+            yield stmt_json
+
+    def _get_statements_selection(self, ro, limit, offset, sort_by, ev_limit,
+                                  evidence_filter, group_rows=False,
+                                  page_token=None, prefilter_evidence=False):
+        """Build the selection of statement content rows for this query.
+
+        If `group_rows` is True, the rows will be ordered such that all the
+        rows for a given statement are contiguous. If `prefilter_evidence` is
+        True, the evidence filter is also applied to the hashes of the page.
+        """
+        # Get the query for mk_hashes and ev_counts for this page.
+        hash_ev_filter = evidence_filter if prefilter_evidence else None
+        mk_hashes_q = self._get_hash_page_query(ro, limit, offset, sort_by,
+                                                page_token, hash_ev_filter)
+        mk_hashes_al = mk_hashes_q.subquery('mk_hashes')
+
+        # A limited page needs a row for each of its hashes, to tell whether
+        # there may be another page.
+        return self._get_content_selection(ro, mk_hashes_al, sort_by,
+                                           ev_limit, evidence_filter,
+                                           group_rows,
+                                           row_per_hash=limit is not None)
+
+    @classmethod
+    def _get_content_selection(cls, ro, mk_hashes_al, sort_by, ev_limit,
+                               evidence_filter, group_rows=False,
+                               tag_name=None, row_per_hash=False):
+        """Build the selection of statement content rows for hashes.
+
+        If `tag_name` is given, that column of `mk_hashes_al` is carried
+        through, and is the last column of the selection. If `row_per_hash`
+        is True, every hash has at least one row, with no content if all of
+        its evidence is filtered out. This is always the case if `ev_limit`
+        is more than 0.
+        """
         # Do the difficult work of turning a query for hashes and ev_counts
         # into a query for statement JSONs. Return the results.
-        mk_hashes_al = mk_hashes_q.subquery('mk_hashes')
-        cont_q = self._get_content_query(ro, mk_hashes_al, ev_limit)
+        lateral = row_per_hash or (ev_limit is not None and ev_limit != 0)
+        cont_q = cls._get_content_query(ro, mk_hashes_al, ev_limit, tag_name,
+                                        lateral)
         if evidence_filter is not None:
             cont_q = evidence_filter.join_table(ro, cont_q,
                                                 {'fast_raw_pa_link'})
@@ -719,11 +1443,12 @@ class Query(object):
         if ev_limit == 0:
             cont_q = cont_q.distinct()
 
-        # If we have a limit on the evidence, we need to do a lateral join.
-        # If we are just getting all the evidence, or none of it, just put an
-        # alias on the subquery.
-        if ev_limit is not None and ev_limit != 0:
-            cont_q = cont_q.limit(ev_limit)
+        # If we have a limit on the evidence, or need a row for each hash, we
+        # need to do a lateral join. If we are just getting all the evidence,
+        # or none of it, just put an alias on the subquery.
+        if lateral:
+            if ev_limit is not None and ev_limit != 0:
+                cont_q = cont_q.limit(ev_limit)
             json_content_al = cont_q.subquery().lateral('json_content')
             stmts_q = (mk_hashes_al
                        .outerjoin(json_content_al, true())
@@ -750,102 +1475,134 @@ class Query(object):
                          if not k.startswith('_')]
 
         cols += [getattr(ro.ReadingRefLink, k) for k in ref_link_keys]
+        if tag_name is not None:
+            if lateral:
+                cols.append(mk_hashes_al.c[tag_name])
+            else:
+                cols.append(json_content_al.c[tag_name])
 
         # Put it all together.
         selection = select(cols).select_from(stmts_q)
-        if self._print_only:
-            print(selection)
-            return
 
-        logger.debug(f"Executing query (get_statements):\n{selection}")
+        # Keep the rows of each statement together, in the order of the page.
+        if group_rows:
+            sort_col = cols[2] if sort_by == 'ev_count' else cols[3]
+            selection = selection.order_by(desc(sort_col), desc(cols[0]))
+        return selection, ref_link_keys
+
+    def _get_hash_page_query(self, ro, limit, offset, sort_by,
+                             page_token=None, evidence_filter=None):
+        """Get the query for the mk_hashes, ev_counts, and beliefs of a page.
+
+        Results are ordered by the sort value and then by hash, so the end of
+        a page can be marked by a (sort value, hash) pair. If a `page_token`
+        is given, the query seeks past the pair it marks. If an
+        `evidence_filter` is given, only hashes with at least one evidence
+        passing the filter are included, before the limit is applied.
+        """
+        if sort_by not in ['ev_count', 'belief']:
+            raise ValueError(f"Invalid sort option: {sort_by}.")
 
-        # Execute the query.
-        proxy = ro.session.connection().execute(selection)
-        res = proxy.fetchall()
-        if res:
-            logger.debug("res is %d row by %d cols." % (len(res), len(res[0])))
-        else:
-            logger.debug("res is empty.")
+        mk_hashes_q = self.build_hash_query(ro)
+        mk_hashes_q = mk_hashes_q.distinct()
+        mk_hash_obj, ev_count_obj, belief_obj = self._get_core_cols(ro)
+        sort_obj = ev_count_obj if sort_by == 'ev_count' else belief_obj
+
+        # The seek is applied to the table the hashes are taken from, so
+        # that for an agent or the whole of source_meta, the (sort value,
+        # hash) indices are read from the end of the last page onward.
+        if page_token is not None:
+            sort_value, last_hash = _read_page_token(page_token, sort_by)
+            mk_hashes_q = mk_hashes_q.filter(
+                tuple_(sort_obj, mk_hash_obj) < tuple_(sort_value, last_hash)
+            )
 
-        # Unpack the statements.
-        stmts_dict = OrderedDict()
-        ev_counts = OrderedDict()
-        beliefs = OrderedDict()
-        source_counts = OrderedDict()
-        returned_evidence = 0
-        src_set = ro.get_source_names()
-        for row in res:
-            # Unpack the row
-            row_gen = iter(row)
-
-            mk_hash = next(row_gen)
-            src_dict = dict.fromkeys(src_set, 0)
-            src_dict.update(next(row_gen))
-            ev_count = next(row_gen)
-            belief = next(row_gen)
-            raw_json_bts = next(row_gen)
-            pa_json_bts = next(row_gen)
-            ref_dict = dict(zip(ref_link_keys, row_gen))
-
-            if pa_json_bts is None:
-                logger.warning("Row returned without pa_json. This likely "
-                               "indicates that an over-zealous evidence filter "
-                               "was used, which filtered out all evidence. "
-                               "This case is not currently handled, and the "
-                               "statement will have to be dropped.")
-                continue
+        if evidence_filter is not None:
+            mk_hashes_q = mk_hashes_q.filter(
+                mk_hash_obj.in_(evidence_filter.get_hash_selection(ro))
+            )
 
-            if raw_json_bts is not None:
-                returned_evidence += 1
+        sort_term = [desc(sort_obj), desc(mk_hash_obj)]
+        return self._apply_limits(mk_hashes_q, sort_term, limit, offset)
 
-            # Add a new statement if the hash is new.
-            if mk_hash not in stmts_dict.keys():
-                source_counts[mk_hash] = src_dict
-                ev_counts[mk_hash] = ev_count
-                beliefs[mk_hash] = belief
-                stmts_dict[mk_hash] = json.loads(pa_json_bts.decode('utf-8'))
-                stmts_dict[mk_hash]['evidence'] = []
-
-            # Add annotations if not present.
-            if ev_limit != 0:
-                raw_json = json.loads(raw_json_bts.decode('utf-8'))
-                ev_json = raw_json['evidence'][0]
-                if 'annotations' not in ev_json.keys():
-                    ev_json['annotations'] = {}
-
-                # Add agents' raw text to annotations.
-                ev_json['annotations']['agents'] = \
-                    {'raw_text': _get_raw_texts(raw_json)}
-
-                # Add prior UUIDs to the annotations
-                if 'prior_uuids' not in ev_json['annotations'].keys():
-                    ev_json['annotations']['prior_uuids'] = []
-                ev_json['annotations']['prior_uuids'].append(raw_json['id'])
-
-                # Add and/or update text refs.
-                if 'text_refs' not in ev_json.keys():
-                    ev_json['text_refs'] = {}
-                if ref_dict['pmid']:
-                    ev_json['pmid'] = ref_dict['pmid']
-                elif 'PMID' in ev_json['text_refs']:
-                    del ev_json['text_refs']['PMID']
-                ev_json['text_refs'].update({k.upper(): v
-                                             for k, v in ref_dict.items()
-                                             if v is not None})
-
-                # Add the source dictionary.
-                if ref_dict['source']:
-                    ev_json['annotations']['content_source'] = ref_dict['source']
-
-                # Add the evidence JSON to the list.
-                stmts_dict[mk_hash]['evidence'].append(ev_json)
+    def explain(self, ro=None, analyze=True, result_type='statements',
+                limit=None, offset=None, sort_by='ev_count', ev_limit=None,
+                evidence_filter=None, prefilter_evidence=False) -> dict:
+        """Get the database's plan for this query, with timings.
 
-        return StatementQueryResult(stmts_dict, limit, offset, ev_counts,
-                                    beliefs, returned_evidence, source_counts,
-                                    self.to_json())
+        The plan of the final selection is given as the JSON output of
+        Postgres' EXPLAIN, along with the plan and timing of each component
+        hash query, so that slow parts of a query can be found. The result
+        can be dumped to JSON, for example to be logged.
 
-    def get_hashes(self, ro=None, limit=None, offset=None, sort_by='ev_count') \
-            -> Optional[QueryResult]:
+        Parameters
+        ----------
+        ro : DatabaseManager
+            A database manager handle that has valid Readonly tables built.
+        analyze : bool
+            If True (default), the queries are actually run, and actual row
+            counts, timings, and buffer usage are included. Otherwise only the
+            planner's estimates are given.
+        result_type : str
+            Either 'statements' (default) or 'hashes', selecting whether the
+            selection explained is that of `get_statements` or `get_hashes`.
+        limit, offset, sort_by, ev_limit, evidence_filter, prefilter_evidence :
+            The options as they would be given to `get_statements` or
+            `get_hashes`.
+
+        Returns
+        -------
+        explanation : dict
+            A JSON-serializable dict with the query, the `plan` of the final
+            selection, the `planning_ms` and `execution_ms` (if analyzed), and
+            the `hash_query` entry: the plan summary of this query's hash query,
+            with the entries of any component queries under `components`.
+        """
+        if ro is None:
+            ro = get_ro('primary')
+        if ro is None:
+            raise ApiError("Queries can only be explained with direct access "
+                           "to the readonly database.")
+
+        explanation = {'query': str(self), 'query_json': self.to_json(),
+                       'result_type': result_type, 'analyze': analyze,
+                       'plan': None, 'hash_query': None}
+        if self.empty:
+            return explanation
+
+        if result_type == 'statements':
+            selection, _ = self._get_statements_selection(
+                ro, limit, offset, sort_by, ev_limit, evidence_filter,
+                prefilter_evidence=prefilter_evidence
+            )
+        elif result_type == 'hashes':
+            selection = self._get_hash_page_query(ro, limit, offset, sort_by)
+        else:
+            raise ValueError(f"Cannot explain result type: {result_type}.")
+
+        options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+        plan = _explain_sql(ro, selection, options)[0]
+        explanation['plan'] = plan['Plan']
+        explanation['planning_ms'] = plan.get('Planning Time')
+        explanation['execution_ms'] = plan.get('Execution Time')
+        explanation['hash_query'] = self._explain_hash_query(ro, options)
+        return explanation
+
+    def _explain_hash_query(self, ro, options) -> dict:
+        """Get the summary of the plan and timing of the hash query."""
+        plan = _explain_sql(ro, self.build_hash_query(ro), options)[0]
+        entry = {'query': str(self), 'class': self.__class__.__name__,
+                 'estimated_rows': plan['Plan']['Plan Rows'],
+                 'estimated_cost': plan['Plan']['Total Cost']}
+        if 'Execution Time' in plan:
+            entry['actual_rows'] = plan['Plan']['Actual Rows']
+            entry['planning_ms'] = plan['Planning Time']
+            entry['execution_ms'] = plan['Execution Time']
+        return entry
+
+    @_use_query_cache('hashes')
+    def get_hashes(self, ro=None, limit=None, offset=None, sort_by='ev_count',
+                   page_token=None, with_count=False) -> Optional[QueryResult]:
         """Get the hashes of statements that satisfy this query.
 
         Parameters
@@ -862,6 +1619,13 @@ class Query(object):
         sort_by : str
             'ev_count' or 'belief': select the parameter by which results are
             sorted.
+        page_token : Optional[str]
+            The `next_page_token` of a previous result for this query. If given,
+            results will start after the last hash of that result.
+        with_count : bool
+            If True, the number of hashes that satisfy this query over all
+            pages is set as the `total_count` of the result, as from
+            `get_count`. Default is False.
 
         Returns
         -------
@@ -879,18 +1643,13 @@ class Query(object):
 
         # If the database isn't directly available, route through the web API.
         if ro is None:
-            return self._rest_get('hashes', limit, offset, sort_by)
+            return self._rest_get('hashes', limit, offset, sort_by,
+                                  page_token=page_token,
+                                  with_count=with_count or None)
 
-        # Get the query for mk_hashes and ev_counts, and apply the generic
-        # limits to it.
-        mk_hashes_q = self.build_hash_query(ro)
-        mk_hashes_q = mk_hashes_q.distinct()
-        _, n_ev_obj, belief_obj = self._get_core_cols(ro)
-        if sort_by == 'ev_count':
-            sort_list = [desc(n_ev_obj)]
-        else:
-            sort_list = [desc(belief_obj)]
-        mk_hashes_q = self._apply_limits(mk_hashes_q, sort_list, limit, offset)
+        # Get the query for mk_hashes and ev_counts for this page.
+        mk_hashes_q = self._get_hash_page_query(ro, limit, offset, sort_by,
+                                                page_token)
 
         if self._print_only:
             print(mk_hashes_q)
@@ -898,7 +1657,83 @@ class Query(object):
 
         # Make the query, and package the results.
         logger.debug(f"Executing query (get_hashes):\n{mk_hashes_q}")
-        result = mk_hashes_q.all()
+        result = _execute(ro, mk_hashes_q).fetchall()
+        hash_result = self._make_hash_result(result, limit, offset, sort_by)
+        if with_count:
+            # If this page holds all the results, there is no need to count.
+            if offset is None and page_token is None \
+                    and hash_result.next_page_token is None:
+                hash_result.set_total_count(len(result), True)
+            else:
+                hash_result.set_total_count(*self._get_count(ro))
+        return hash_result
+
+    def get_count(self, ro=None, exact=False) -> int:
+        """Get the number of statements that satisfy this query.
+
+        Parameters
+        ----------
+        ro : DatabaseManager
+            A database manager handle that has valid Readonly tables built.
+        exact : bool
+            If True, the statements are always counted. Otherwise (default),
+            the database's planner estimates the count from its statistics,
+            and the statements are only counted if the estimate is no more
+            than `count_exact_threshold`, so that counting is cheap.
+
+        Returns
+        -------
+        count : int
+            The exact or estimated number of statements.
+        """
+        if ro is None:
+            ro = get_ro('primary')
+        if ro is None:
+            raise ApiError("Queries can only be counted with direct access "
+                           "to the readonly database.")
+        return self._get_count(ro, exact)[0]
+
+    def _get_count(self, ro, exact=False):
+        """Get the count of statements, and whether it is exact."""
+        if self.empty:
+            return 0, True
+
+        mk_hashes_q = self.build_hash_query(ro)
+        if not exact:
+            estimate = _estimate_row_count(ro, mk_hashes_q)
+            if estimate > self.count_exact_threshold:
+                logger.debug(f"Estimated {estimate} statements for {self}.")
+                return estimate, False
+
+        count_q = self._get_count_query(mk_hashes_q)
+        logger.debug(f"Executing query (get_count):\n{count_q}")
+        return _execute(ro, count_q).scalar(), True
+
+    async def _get_count_async(self, ro, exact=False):
+        """Get the count of statements like `_get_count`, asynchronously."""
+        if self.empty:
+            return 0, True
+
+        mk_hashes_q = self.build_hash_query(ro)
+        if not exact:
+            plan = await ro.async_execute(mk_hashes_q, explain=True)
+            estimate = plan[0]['Plan']['Plan Rows']
+            if estimate > self.count_exact_threshold:
+                logger.debug(f"Estimated {estimate} statements for {self}.")
+                return estimate, False
+
+        count_q = self._get_count_query(mk_hashes_q)
+        logger.debug(f"Executing query (get_count_async):\n{count_q}")
+        rows = await ro.async_execute(count_q)
+        return rows[0][0], True
+
+    @staticmethod
+    def _get_count_query(mk_hashes_q):
+        hashes_sq = mk_hashes_q.subquery('count_hashes')
+        return select([func.count(hashes_sq.c.mk_hash.distinct())])
+
+    def _make_hash_result(self, result, limit, offset, sort_by) -> QueryResult:
+        """Package (mk_hash, ev_count, belief) rows into a result."""
         evidence_counts = {}
         belief_scores = {}
         hashes = set()
@@ -907,9 +1742,15 @@ class Query(object):
             evidence_counts[h] = n_ev
             belief_scores[h] = belief
 
+        next_page_token = _get_next_page_token(
+            limit, sort_by,
+            evidence_counts if sort_by == 'ev_count' else belief_scores
+        )
         return QueryResult(hashes, limit, offset, len(result), evidence_counts,
-                           belief_scores, self.to_json(), 'hashes')
+                           belief_scores, self.to_json(), 'hashes',
+                           next_page_token)
 
+    @_use_query_cache('interactions')
     def get_interactions(self, ro=None, limit=None, offset=None,
                          sort_by='ev_count') -> Optional[QueryResult]:
         """Get the simple interaction information from the Statements metadata.
@@ -953,6 +1794,7 @@ class Query(object):
         return QueryResult(results, limit, offset, off_comp, ev_counts,
                            belief_scores, self.to_json(), il.meta_type)
 
+    @_use_query_cache('relations')
     def get_relations(self, ro=None, limit=None, offset=None,
                       sort_by='ev_count', with_hashes=False) \
             -> Optional[QueryResult]:
@@ -1000,8 +1842,9 @@ class Query(object):
         return QueryResult(results, limit, offset, off_comp, ev_counts,
                            belief_scores, self.to_json(), r_sql.meta_type)
 
+    @_use_query_cache('agents')
     def get_agents(self, ro=None, limit=None, offset=None, sort_by='ev_count',
-                   with_hashes=False, complexes_covered=None) \
+                   with_hashes=False, complexes_covered=None, page_token=None) \
             -> Optional[QueryResult]:
         """Get the agent pairs from the Statements metadata.
 
@@ -1028,6 +1871,10 @@ class Query(object):
         complexes_covered : Optional[set]
             The set of hashes for complexes that you have already seen and would
             like skipped.
+        page_token : Optional[str]
+            The `next_page_token` of a previous result for this query. If given,
+            results will start after the last agent group of that result. The
+            `complexes_covered` of that result should be passed as well.
         """
         if ro is None:
             ro = get_ro('primary')
@@ -1038,32 +1885,172 @@ class Query(object):
         if ro is None:
             return self._rest_get('agents', limit, offset, sort_by,
                                   with_hashes=with_hashes,
-                                  complexes_covered=complexes_covered)
+                                  complexes_covered=complexes_covered,
+                                  page_token=page_token)
 
         ag_sql = AgentSQL(ro, with_complex_dups=True,
                           complexes_covered=complexes_covered)
         result_tuple = self._run_meta_sql(ag_sql, ro, limit, offset, sort_by,
-                                          with_hashes)
+                                          with_hashes, page_token)
         if result_tuple is None:
             return
 
         results, ev_counts, belief_scores, off_comp = result_tuple
+        next_page_token = None
+        if limit is not None and len(results) >= limit:
+            next_page_token = _make_page_token(sort_by, *ag_sql.last_position)
         return AgentQueryResult(results, limit, offset, off_comp,
                                 ag_sql.complexes_covered, ev_counts,
-                                belief_scores, self.to_json())
+                                belief_scores, self.to_json(), next_page_token)
 
-    def _run_meta_sql(self, ms, ro, limit, offset, sort_by, with_hashes=None):
+    def _run_meta_sql(self, ms, ro, limit, offset, sort_by, with_hashes=None,
+                      page_token=None):
+        ms = self._prep_meta_sql(ms, ro, limit, offset, sort_by, with_hashes,
+                                 page_token)
+        if self._print_only:
+            ms.print()
+            return
+        return ms.run()
+
+    def _prep_meta_sql(self, ms, ro, limit, offset, sort_by, with_hashes=None,
+                       page_token=None):
         mk_hashes_sq = self.build_hash_query(ro).subquery('mk_hashes')
         ms.filter(ro.AgentInteractions.mk_hash == mk_hashes_sq.c.mk_hash)
         kwargs = {'sort_by': sort_by}
         if with_hashes is not None:
             kwargs['with_hashes'] = with_hashes
         order_params = ms.agg(ro, **kwargs)
-        ms = self._apply_limits(ms, order_params, limit, offset)
-        if self._print_only:
-            ms.print()
-            return
-        return ms.run()
+        if page_token is not None:
+            ms.seek(*_read_page_token(page_token, sort_by))
+        return self._apply_limits(ms, order_params, limit, offset)
+
+    async def get_statements_async(self, ro=None, limit=None, offset=None,
+                                   sort_by='ev_count', ev_limit=None,
+                                   evidence_filter=None, page_token=None,
+                                   json_in_sql=False, prefilter_evidence=False,
+                                   with_count=False) \
+            -> StatementQueryResult:
+        """Get the statements that satisfy this query, asynchronously.
+
+        This takes the same arguments as, and is otherwise equivalent to,
+        `get_statements`, but the query is run on the async connection pool
+        of the readonly database manager, so that many queries may be in
+        flight at once.
+        """
+        if ro is None:
+            ro = get_ro('primary')
+
+        if self.empty:
+            return StatementQueryResult.empty(limit, offset, self.to_json())
+
+        if ro is None:
+            return await self._rest_get_async('statements', limit, offset,
+                                              sort_by, ev_limit=ev_limit,
+                                              page_token=page_token,
+                                              with_count=with_count or None)
+
+        if get_json_codec().load_dictionaries(ro) and json_in_sql:
+            logger.warning("Statement JSONs may be compressed, which the "
+                           "database cannot decode, so they will be "
+                           "assembled in Python.")
+            json_in_sql = False
+
+        selection, ref_link_keys = \
+            self._get_statements_selection(
+                ro, limit, offset, sort_by, ev_limit, evidence_filter,
+                page_token=page_token,
+                prefilter_evidence=prefilter_evidence
+            )
+        if json_in_sql:
+            selection = _get_stmt_json_selection(selection, ref_link_keys)
+        logger.debug(f"Executing query (get_statements_async):\n{selection}")
+        res = await ro.async_execute(selection)
+        if json_in_sql:
+            result = self._make_stmt_json_result(res, ro.get_source_names(),
+                                                 limit, offset, sort_by)
+        else:
+            result = self._make_statement_result(res, ro.get_source_names(),
+                                                 ref_link_keys, limit, offset,
+                                                 sort_by, ev_limit)
+        if with_count:
+            result.set_total_count(*await self._get_count_async(ro))
+        return result
+
+    async def get_hashes_async(self, ro=None, limit=None, offset=None,
+                               sort_by='ev_count', page_token=None,
+                               with_count=False) -> QueryResult:
+        """Get the hashes of statements satisfying this query, asynchronously.
+
+        This is the async equivalent of `get_hashes`; see
+        `get_statements_async`.
+        """
+        if ro is None:
+            ro = get_ro('primary')
+
+        if self.empty:
+            return QueryResult.empty(set(), limit, offset, self.to_json(),
+                                     'hashes')
+
+        if ro is None:
+            return await self._rest_get_async('hashes', limit, offset, sort_by,
+                                              page_token=page_token,
+                                              with_count=with_count or None)
+
+        mk_hashes_q = self._get_hash_page_query(ro, limit, offset, sort_by,
+                                                page_token)
+        logger.debug(f"Executing query (get_hashes_async):\n{mk_hashes_q}")
+        result = await ro.async_execute(mk_hashes_q)
+        hash_result = self._make_hash_result(result, limit, offset, sort_by)
+        if with_count:
+            # If this page holds all the results, there is no need to count.
+            if offset is None and page_token is None \
+                    and hash_result.next_page_token is None:
+                hash_result.set_total_count(len(result), True)
+            else:
+                hash_result.set_total_count(*await self._get_count_async(ro))
+        return hash_result
+
+    async def get_agents_async(self, ro=None, limit=None, offset=None,
+                               sort_by='ev_count', with_hashes=False,
+                               complexes_covered=None, page_token=None) \
+            -> AgentQueryResult:
+        """Get the agent pairs from the Statements metadata, asynchronously.
+
+        This is the async equivalent of `get_agents`; see
+        `get_statements_async`.
+        """
+        if ro is None:
+            ro = get_ro('primary')
+
+        if self.empty:
+            return AgentQueryResult.empty(limit, offset, self.to_json())
+
+        if ro is None:
+            return await self._rest_get_async(
+                'agents', limit, offset, sort_by, with_hashes=with_hashes,
+                complexes_covered=complexes_covered, page_token=page_token
+            )
+
+        ag_sql = AgentSQL(ro, with_complex_dups=True,
+                          complexes_covered=complexes_covered)
+        ag_sql = self._prep_meta_sql(ag_sql, ro, limit, offset, sort_by,
+                                     with_hashes, page_token)
+        results, ev_counts, belief_scores, off_comp = \
+            await ag_sql.run_async(ro)
+
+        next_page_token = None
+        if limit is not None and len(results) >= limit:
+            next_page_token = _make_page_token(sort_by, *ag_sql.last_position)
+        return AgentQueryResult(results, limit, offset, off_comp,
+                                ag_sql.complexes_covered, ev_counts,
+                                belief_scores, self.to_json(), next_page_token)
+
+    async def _rest_get_async(self, result_type, *args, **kwargs):
+        """Retrieve results from the remote API without blocking the loop."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, partial(self._rest_get, result_type, *args, **kwargs)
+        )
 
     @staticmethod
     def _apply_limits(mk_hashes_q, order_params, limit=None, offset=None):
@@ -1137,7 +2124,8 @@ class Query(object):
         raise NotImplementedError()
 
     @staticmethod
-    def _get_content_query(ro, mk_hashes_al, ev_limit):
+    def _get_content_query(ro, mk_hashes_al, ev_limit, tag_name=None,
+                           lateral=None):
         # Incorporate a link to the JSONs in the table.
         pa_json_c = ro.FastRawPaLink.pa_json.label('pa_json')
         reading_id_c = ro.FastRawPaLink.reading_id.label('rid')
@@ -1150,13 +2138,20 @@ class Query(object):
         else:
             raw_json_c = ro.FastRawPaLink.raw_json.label('raw_json')
 
-        # Create the query.
-        if ev_limit is None or ev_limit == 0:
+        # Create the query. A query to be laterally joined to the hashes
+        # only needs the content.
+        if lateral is None:
+            lateral = ev_limit is not None and ev_limit != 0
+        if not lateral:
             mk_hash_c = ro.FastRawPaLink.mk_hash.label('mk_hash')
             ev_count_c = mk_hashes_al.c.ev_count.label('ev_count')
             belief_c = mk_hashes_al.c.belief.label('belief')
             cont_q = ro.session.query(mk_hash_c, ev_count_c, belief_c,
                                       raw_json_c, pa_json_c, reading_id_c)
+            if tag_name is not None:
+                cont_q = cont_q.add_columns(
+                    mk_hashes_al.c[tag_name].label(tag_name)
+                )
         else:
             cont_q = ro.session.query(raw_json_c, pa_json_c, reading_id_c)
         cont_q = cont_q.filter(frp_link)
@@ -1268,6 +2263,139 @@ class Query(object):
         return None
 
 
+def run_batch(queries, ro=None, result_type='statements', limit=None,
+              offset=None, sort_by='ev_count', ev_limit=None,
+              evidence_filter=None, prefilter_evidence=False) -> list:
+    """Run many queries against the database in a single round trip.
+
+    The hash query of each query is tagged with its position in the list, and
+    the hash queries are combined with UNION ALL into a single selection.
+    The rows are then split back up into a result for each query. This is much
+    faster than running many small queries (e.g. a HasAgent query for each of
+    a list of agents) one at a time.
+
+    Parameters
+    ----------
+    queries : list[Query]
+        The queries to run.
+    ro : DatabaseManager
+        A database manager handle that has valid Readonly tables built.
+    result_type : str
+        Either 'statements' (default) or 'hashes'.
+    limit, offset, sort_by :
+        These options apply to each query separately, as they would in
+        `get_statements` or `get_hashes`.
+    ev_limit, evidence_filter :
+        These options apply to the statements of all queries when the result
+        type is 'statements'.
+    prefilter_evidence : bool
+        If True, only statements with at least one evidence passing the
+        `evidence_filter` are included in the page of each query. Default is
+        False.
+
+    Returns
+    -------
+    results : list[QueryResult]
+        The result of each query, in the same order as `queries`.
+    """
+    if result_type not in ['statements', 'hashes']:
+        raise ValueError(f"Invalid result type for a batch: {result_type}.")
+    if sort_by not in ['ev_count', 'belief']:
+        raise ValueError(f"Invalid sort option: {sort_by}.")
+
+    if ro is None:
+        ro = get_ro('primary')
+
+    # If the database isn't available, send the queries to the web service
+    # concurrently.
+    if ro is None:
+        if evidence_filter is not None:
+            logger.warning("No direct R.O. access available, but passing "
+                           "of evidence filter through API not yet "
+                           "implemented.")
+        params = {'result_type': result_type, 'limit': limit,
+                  'offset': offset, 'sort_by': sort_by}
+        if result_type == 'statements':
+            params['ev_limit'] = ev_limit
+        to_send = [q for q in queries if not q.empty]
+        sent_results = iter(get_rest_client().get_results(
+            [dict(params, query_json=q.to_json()) for q in to_send]
+        ))
+        results = []
+        for query in queries:
+            if not query.empty:
+                results.append(next(sent_results))
+            elif result_type == 'statements':
+                results.append(StatementQueryResult.empty(limit, offset,
+                                                          query.to_json()))
+            else:
+                results.append(QueryResult.empty(set(), limit, offset,
+                                                 query.to_json(), 'hashes'))
+        return results
+
+    # Tag the hashes of each page with the index of the query.
+    tag_name = 'query_idx'
+    tagged_hash_sqls = []
+    hash_ev_filter = evidence_filter if prefilter_evidence else None
+    for idx, query in enumerate(queries):
+        if query.empty:
+            continue
+        page_al = query._get_hash_page_query(
+            ro, limit, offset, sort_by, evidence_filter=hash_ev_filter
+        ).subquery(f'query_{idx}')
+        tagged_hash_sqls.append(select([literal(idx).label(tag_name),
+                                        page_al.c.mk_hash.label('mk_hash'),
+                                        page_al.c.ev_count.label('ev_count'),
+                                        page_al.c.belief.label('belief')]))
+
+    # Run all the queries at once, and divide up the rows.
+    rows_by_idx = defaultdict(list)
+    ref_link_keys = None
+    if tagged_hash_sqls:
+        mk_hashes_al = union_all(*tagged_hash_sqls).alias('mk_hashes')
+        if result_type == 'statements':
+            get_json_codec().load_dictionaries(ro)
+            selection, ref_link_keys = \
+                Query._get_content_selection(ro, mk_hashes_al, sort_by,
+                                             ev_limit, evidence_filter,
+                                             tag_name=tag_name,
+                                             row_per_hash=limit is not None)
+            row_idx = -1
+        else:
+            selection = select([mk_hashes_al.c[tag_name],
+                                mk_hashes_al.c.mk_hash,
+                                mk_hashes_al.c.ev_count,
+                                mk_hashes_al.c.belief])
+            row_idx = 0
+
+        logger.debug(f"Executing query (run_batch):\n{selection}")
+        for row in _execute(ro, selection):
+            rows_by_idx[row[row_idx]].append(row)
+
+    # Package the results.
+    results = []
+    src_set = ro.get_source_names() if result_type == 'statements' else None
+    for idx, query in enumerate(queries):
+        rows = rows_by_idx[idx]
+        if result_type == 'statements':
+            if query.empty:
+                res = StatementQueryResult.empty(limit, offset,
+                                                 query.to_json())
+            else:
+                res = query._make_statement_result(rows, src_set,
+                                                   ref_link_keys, limit,
+                                                   offset, sort_by, ev_limit)
+        else:
+            if query.empty:
+                res = QueryResult.empty(set(), limit, offset, query.to_json(),
+                                        'hashes')
+            else:
+                res = query._make_hash_result([row[1:] for row in rows], limit,
+                                              offset, sort_by)
+        results.append(res)
+    return results
+
+
 class EmptyQuery:
     def __and__(self, other):
         if not isinstance(other, Query):
@@ -1716,6 +2844,11 @@ class HasHash(SourceQuery):
     """
     list_name = 'stmt_hashes'
 
+    # Lists of more hashes than this are bound as a single bigint[] rather
+    # than as one parameter per hash, which keeps the size of the SQL and the
+    # time to compile and plan it from growing with the list.
+    array_threshold = 1000
+
     def __init__(self, stmt_hashes):
         empty = len(stmt_hashes) == 0
         self.stmt_hashes = tuple(stmt_hashes)
@@ -1758,6 +2891,15 @@ class HasHash(SourceQuery):
                 clause = mk_hash == self.stmt_hashes[0]
             else:
                 clause = mk_hash != self.stmt_hashes[0]
+        elif len(self.stmt_hashes) > self.array_threshold:
+            # For many hashes, join on the unnested array.
+            hash_array = bindparam('stmt_hashes', list(self.stmt_hashes),
+                                   type_=ARRAY(BigInteger), unique=True)
+            hash_sel = select([func.unnest(hash_array)])
+            if not inverted:
+                clause = mk_hash.in_(hash_sel)
+            else:
+                clause = mk_hash.notin_(hash_sel)
         else:
             # Otherwise use "in"s.
             if not inverted:
@@ -1771,18 +2913,6 @@ class NoGroundingFound(Exception):
     pass
 
 
-def gilda_ground(agent_text):
-    try:
-        from gilda.api import ground
-        gilda_list = [r.to_json() for r in ground(agent_text)]
-    except ImportError:
-        import requests
-        res = requests.post('http://grounding.indra.bio/ground',
-                            json={'text': agent_text})
-        gilda_list = res.json()
-    return gilda_list
-
-
 class HasAgent(Query):
     """Get Statements that have a particular agent in a particular role.
 
@@ -1918,25 +3048,27 @@ class _TextRefCore(Query):
         return isinstance(other, self.__class__) \
                and self._inverted == other._inverted
 
+    def _with_list(self, new_list):
+        """Make a query like this one, but with a different list."""
+        return self.__class__(new_list)
+
     def _do_or(self, other) -> Query:
-        cls = self.__class__
         if self._can_merge_with(other) and not self._inverted:
             my_list = getattr(self, self.list_name)
             thr_list = getattr(other, self.list_name)
-            return cls(list(set(my_list) | set(thr_list)))
+            return self._with_list(list(set(my_list) | set(thr_list)))
         elif self.is_inverse_of(other):
-            return ~cls([])
+            return ~self._with_list([])
 
         return super(_TextRefCore, self)._do_or(other)
 
     def _do_and(self, other) -> Query:
-        cls = self.__class__
         if self._can_merge_with(other) and self._inverted:
             my_list = getattr(self, self.list_name)
             thr_list = getattr(other, self.list_name)
-            return ~cls(list(set(my_list) | set(thr_list)))
+            return ~self._with_list(list(set(my_list) | set(thr_list)))
         elif self.is_inverse_of(other):
-            return cls([])
+            return self._with_list([])
         return super(_TextRefCore, self)._do_and(other)
 
 
@@ -1971,25 +3103,35 @@ class FromPapers(_TextRefCore):
         return ro.SourceMeta
 
     def _get_conditions(self, ro):
-        conditions = []
+        # Resolve the paper IDs to text ref IDs with the shared resolver,
+        # rather than searching on every kind of ID.
+        papers = []
+        tcids = set()
         for id_type, paper_id in self.paper_list:
             if paper_id is None:
                 logger.warning("Got paper with id None.")
                 continue
-
-            # TODO: upgrade this to use new id formatting. This will require
-            # updating the ReadingRefLink table in the readonly build.
-            tbl_attr = getattr(ro.ReadingRefLink, id_type)
-            if not self._inverted:
-                if id_type in ['trid', 'tcid']:
-                    conditions.append(tbl_attr == int(paper_id))
-                else:
-                    conditions.append(tbl_attr.like(str(paper_id)))
+            if id_type == 'tcid':
+                tcids.add(int(paper_id))
             else:
-                if id_type in ['trid', 'tcid']:
-                    conditions.append(tbl_attr != int(paper_id))
-                else:
-                    conditions.append(tbl_attr.notlike(str(paper_id)))
+                papers.append((id_type, paper_id))
+        trid_dict = get_paper_id_resolver().get_trids(ro, papers)
+        trids = {trid for trid_list in trid_dict.values()
+                 for trid in trid_list}
+
+        conditions = []
+        if not self._inverted:
+            if trids:
+                conditions.append(ro.ReadingRefLink.trid.in_(trids))
+            if tcids:
+                conditions.append(ro.ReadingRefLink.tcid.in_(tcids))
+            if not conditions:
+                conditions.append(false())
+        else:
+            if trids:
+                conditions.append(ro.ReadingRefLink.trid.notin_(trids))
+            if tcids:
+                conditions.append(ro.ReadingRefLink.tcid.notin_(tcids))
         return conditions
 
     def _get_hash_query(self, ro, inject_queries=None):
@@ -2031,23 +3173,30 @@ class FromMeshIds(_TextRefCore):
     ----------
     mesh_ids : list
         A canonical MeSH ID, of the "C" or "D" variety, e.g. "D000135".
+    include_descendants : bool
+        If True, Statements from papers with any MeSH term below the given
+        terms in the MeSH hierarchy are also found, using the closure of the
+        hierarchy stored in the readonly database. Only MeSH terms ("D" IDs)
+        have descendants. Default is False.
 
     Attributes
     ----------
     mesh_ids : tuple
         The mesh IDs.
+    include_descendants : bool
+        Whether the descendants of the MeSH terms are included.
     _mesh_type : str
         "C" or "D" indicating which types of IDs are held in this object.
     """
     list_name = 'mesh_ids'
 
     @classmethod
-    def __make(cls, mesh_ids):
+    def __make(cls, mesh_ids, include_descendants):
         new_obj = super(FromMeshIds, cls).__new__(cls)
-        new_obj.__init__(mesh_ids)
+        new_obj.__init__(mesh_ids, include_descendants)
         return new_obj
 
-    def __new__(cls, mesh_ids: list):
+    def __new__(cls, mesh_ids: list, include_descendants: bool = False):
         # Validate the IDs and break them into groups (as appropriate)
         id_groups = defaultdict(set)
         for mesh_id in mesh_ids:
@@ -2062,12 +3211,13 @@ class FromMeshIds(_TextRefCore):
         if len(id_groups) <= 1:
             return super(FromMeshIds, cls).__new__(cls)
         else:
-            c_obj = cls.__make(id_groups['C'])
-            d_obj = cls.__make(id_groups['D'])
+            c_obj = cls.__make(id_groups['C'], include_descendants)
+            d_obj = cls.__make(id_groups['D'], include_descendants)
             return Union([c_obj, d_obj])
 
-    def __init__(self, mesh_ids):
+    def __init__(self, mesh_ids, include_descendants=False):
         self.mesh_ids = tuple(set(mesh_ids))
+        self.include_descendants = include_descendants
         self._mesh_nums = []
         self._mesh_concept_nums = []
         self._mesh_type = None
@@ -2081,20 +3231,49 @@ class FromMeshIds(_TextRefCore):
 
     def __str__(self):
         inv = 'not ' if self._inverted else ''
-        return f"are {inv}from papers with MeSH ID {_join_list(self.mesh_ids)}"
+        desc_str = ' or its descendants' if self.include_descendants else ''
+        return (f"are {inv}from papers with MeSH ID "
+                f"{_join_list(self.mesh_ids)}{desc_str}")
 
     def _can_merge_with(self, other):
         return super(FromMeshIds, self)._can_merge_with(other) \
-               and self._mesh_type == other._mesh_type
+               and self._mesh_type == other._mesh_type \
+               and self.include_descendants == other.include_descendants
+
+    def _with_list(self, new_list):
+        return self.__class__(new_list, self.include_descendants)
 
     def _copy(self):
-        return self.__class__(self.mesh_ids)
+        return self.__class__(self.mesh_ids, self.include_descendants)
 
     def _get_constraint_json(self) -> dict:
         return {'mesh_ids': list(self.mesh_ids),
+                'include_descendants': self.include_descendants,
                 '_mesh_nums': list(self._mesh_nums),
                 '_mesh_type': self._mesh_type}
 
+    def _get_num_clause(self, ro, mesh_num_col, inverted=False):
+        """Get the clause matching a mesh_num column to these MeSH IDs.
+
+        With descendants, the column is matched against the descendants of
+        the MeSH terms in the closure table, as a single semi-join.
+        """
+        if self.include_descendants and self._mesh_type == 'D':
+            closure = ro.MeshTermClosure
+            nums = select([closure.descendant_num])\
+                .where(closure.ancestor_num.in_(self._mesh_nums))
+            if inverted:
+                return mesh_num_col.notin_(nums)
+            return mesh_num_col.in_(nums)
+
+        if len(self._mesh_nums) == 1:
+            if inverted:
+                return mesh_num_col.is_distinct_from(self._mesh_nums[0])
+            return mesh_num_col == self._mesh_nums[0]
+        if inverted:
+            return mesh_num_col.notin_(self._mesh_nums)
+        return mesh_num_col.in_(self._mesh_nums)
+
     def _get_table(self, ro):
         if self._mesh_type == "D":
             return ro.MeshTermMeta
@@ -2104,10 +3283,7 @@ class FromMeshIds(_TextRefCore):
     def _get_hash_query(self, ro, inject_queries=None):
         meta = self._get_table(ro)
         qry = self._base_query(ro)
-        if len(self._mesh_nums) == 1:
-            qry = qry.filter(meta.mesh_num == self._mesh_nums[0])
-        else:
-            qry = qry.filter(meta.mesh_num.in_(self._mesh_nums))
+        qry = qry.filter(self._get_num_clause(ro, meta.mesh_num))
 
         if not self._inverted:
             if inject_queries:
@@ -2143,22 +3319,10 @@ class FromMeshIds(_TextRefCore):
             def get_col(ro):
                 return ro.RawStmtMeshConcepts.mesh_num
 
-        # Make the evidence clause function depending on whether it is inverted
-        # and optimized for the 1-member case.
-        if not self._inverted:
-            if len(self._mesh_nums) == 1:
-                def get_clause(ro):
-                    return get_col(ro) == self._mesh_nums[0]
-            else:
-                def get_clause(ro):
-                    return get_col(ro).in_(self._mesh_nums)
-        else:
-            if len(self._mesh_nums) == 1:
-                def get_clause(ro):
-                    return get_col(ro).is_distinct_from(self._mesh_nums[0])
-            else:
-                def get_clause(ro):
-                    return get_col(ro).notin_(self._mesh_nums)
+        # Make the evidence clause function depending on whether it is
+        # inverted.
+        def get_clause(ro):
+            return self._get_num_clause(ro, get_col(ro), self._inverted)
 
         if self._mesh_type == 'D':
             return EvidenceFilter.from_filter('raw_stmt_mesh_terms', get_clause)
@@ -2447,6 +3611,13 @@ class MergeQuery(Query):
             self._injected_queries = None
         return qry
 
+    def _explain_hash_query(self, ro, options) -> dict:
+        entry = super(MergeQuery, self)._explain_hash_query(ro, options)
+        entry['components'] = [q._explain_hash_query(ro, options)
+                               for q in self.queries
+                               if not q.empty and not q.full]
+        return entry
+
     def _iter_ev_filters(self):
         """Iter over the evidence filters of sub-queries, skipping Nones."""
         for q in self.queries:
@@ -2726,6 +3897,32 @@ class Intersection(MergeQuery):
         return other.is_inverse_of(self)
 
 
+def _explain_sql(ro, sql, options='FORMAT JSON'):
+    """Run EXPLAIN with the given options on a query or selection."""
+    if hasattr(sql, 'statement'):
+        sql = sql.statement
+    conn = ro.session.connection()
+
+    # Lists of values (e.g. from `in_`) are only expanded into separate
+    # parameters when the statement is executed, so they must be rendered
+    # here, or the SQL would hold placeholders Postgres cannot parse.
+    compiled = sql.compile(dialect=conn.dialect,
+                           compile_kwargs={'render_postcompile': True})
+    return conn.execute(f'EXPLAIN ({options}) {compiled}', compiled.params)\
+        .scalar()
+
+
+def _estimate_row_count(ro, sql) -> int:
+    """Get the planner's estimate of the number of rows a query returns.
+
+    This uses the statistics Postgres keeps on each column (e.g. the most
+    common agent IDs in name_meta or types in the meta tables), so the
+    query itself is never run.
+    """
+    plan = _explain_sql(ro, sql)
+    return plan[0]['Plan']['Plan Rows']
+
+
 def _consolidate_queries(queries):
     """Consolidate list-type queries of the same class."""
     # Check for simple 0 and 1 member cases.
@@ -3099,6 +4296,182 @@ class EvidenceFilter:
 
         return query
 
+    def get_hash_selection(self, ro):
+        """Get a selection of the mk_hashes with evidence passing the filter.
+
+        This is used as a semi-join (`mk_hash IN (...)`) on the hashes of a
+        query, so it is kept from correlating with the enclosing query, which
+        may itself use fast_raw_pa_link.
+        """
+        hash_q = ro.session.query(ro.FastRawPaLink.mk_hash)
+        hash_q = self.join_table(ro, hash_q, {'fast_raw_pa_link'})
+        hash_q = self.apply_filter(ro, hash_q)
+        return hash_q.statement.correlate(None)
+
+
+def _unpack_statement_row(row, ref_link_keys, src_set, ev_limit):
+    """Unpack a row of the statement content selection.
+
+    The evidence is given as its raw JSON bytes and text ref dict, to be
+    made into an evidence JSON with `_make_ev_json`, or None if there is no
+    evidence. Returns None if the row must be dropped.
+    """
+    row_gen = iter(row)
+
+    mk_hash = next(row_gen)
+    src_dict = dict.fromkeys(src_set, 0)
+    src_dict.update(next(row_gen))
+    ev_count = next(row_gen)
+    belief = next(row_gen)
+    raw_json_bts = next(row_gen)
+    pa_json_bts = next(row_gen)
+    ref_dict = dict(zip(ref_link_keys, row_gen))
+
+    if pa_json_bts is None:
+        logger.warning("Row returned without pa_json. This likely "
+                       "indicates that an over-zealous evidence filter "
+                       "was used, which filtered out all evidence. "
+                       "The statement will be dropped. Use "
+                       "prefilter_evidence to select only statements "
+                       "with evidence passing the filter.")
+        return None
+
+    if ev_limit != 0 and raw_json_bts is not None:
+        ev_raw = (raw_json_bts, ref_dict)
+    else:
+        ev_raw = None
+    return mk_hash, src_dict, ev_count, belief, pa_json_bts, ev_raw
+
+
+@lru_cache(maxsize=1)
+def _get_agent_order_sql():
+    """Get a jsonb literal mapping each statement type to its agent keys."""
+    agent_orders = {}
+    for stmt_cls in get_all_descendants(Statement):
+        agent_order = getattr(stmt_cls, '_agent_order', None)
+        if isinstance(agent_order, (list, tuple)):
+            agent_orders[stmt_cls.__name__] = list(agent_order)
+    return f"'{json.dumps(agent_orders)}'::jsonb"
+
+
+def _get_stmt_json_selection(selection, ref_link_keys):
+    """Wrap the statement content selection to build the JSON in SQL.
+
+    The evidence JSONs are made just as `_make_ev_json` makes them, and are
+    then aggregated into the statement JSON. The resulting selection has one
+    row per statement, with columns mk_hash, src_json, ev_count, belief,
+    stmt_json, and the number of evidence returned.
+    """
+    # Parse the raw JSON once.
+    ev_rows = selection.alias('ev_rows')
+    ev_docs = select([
+        ev_rows,
+        literal_column("convert_from(ev_rows.raw_json, 'UTF8')::jsonb")
+        .label('raw')
+    ]).alias('ev_docs')
+
+    # Build the evidence JSON from the raw JSON and the text refs.
+    ev = "(ev_docs.raw -> 'evidence' -> 0)"
+    has_pmid = "coalesce(ev_docs.pmid, '') <> ''"
+    raw_texts = (
+        f"(SELECT coalesce(jsonb_agg(ag.value -> 'db_refs' -> 'TEXT' "
+        f"                           ORDER BY ak.ord, ag.ord), '[]'::jsonb) "
+        f" FROM jsonb_array_elements_text("
+        f"        {_get_agent_order_sql()} -> (ev_docs.raw ->> 'type')"
+        f"      ) WITH ORDINALITY AS ak(key, ord) "
+        f" CROSS JOIN LATERAL jsonb_array_elements("
+        f"   CASE jsonb_typeof(ev_docs.raw -> ak.key) "
+        f"     WHEN 'array' THEN ev_docs.raw -> ak.key "
+        f"     ELSE jsonb_build_array(ev_docs.raw -> ak.key) "
+        f"   END"
+        f" ) WITH ORDINALITY AS ag(value, ord))"
+    )
+    prior_uuids = f"({ev} -> 'annotations' -> 'prior_uuids')"
+    annotations = (
+        f"coalesce({ev} -> 'annotations', '{{}}'::jsonb) "
+        f"|| jsonb_build_object("
+        f"     'agents', jsonb_build_object('raw_text', {raw_texts}), "
+        f"     'prior_uuids', coalesce({prior_uuids}, '[]'::jsonb) "
+        f"                    || jsonb_build_array(ev_docs.raw -> 'id')"
+        f"   ) "
+        f"|| CASE WHEN coalesce(ev_docs.source, '') <> '' "
+        f"     THEN jsonb_build_object('content_source', ev_docs.source) "
+        f"     ELSE '{{}}'::jsonb END"
+    )
+    ref_args = ', '.join(f"'{k.upper()}', ev_docs.{k}" for k in ref_link_keys)
+    text_refs = (
+        f"(CASE WHEN {has_pmid} "
+        f"   THEN coalesce({ev} -> 'text_refs', '{{}}'::jsonb) "
+        f"   ELSE coalesce({ev} -> 'text_refs', '{{}}'::jsonb) - 'PMID' END) "
+        f"|| jsonb_strip_nulls(jsonb_build_object({ref_args}))"
+    )
+    ev_json = (
+        f"{ev} || jsonb_build_object('annotations', {annotations}, "
+        f"                           'text_refs', {text_refs}) "
+        f"|| CASE WHEN {has_pmid} "
+        f"     THEN jsonb_build_object('pmid', ev_docs.pmid) "
+        f"     ELSE '{{}}'::jsonb END"
+    )
+    ev_jsons = select([ev_docs.c.mk_hash, ev_docs.c.src_json,
+                       ev_docs.c.ev_count, ev_docs.c.belief,
+                       ev_docs.c.pa_json,
+                       literal_column(ev_json).label('ev_json')])\
+        .alias('ev_jsons')
+
+    # Aggregate the evidence into the statement JSONs. These are returned as
+    # text, so that they are only parsed when they are used.
+    stmt_json = literal_column(
+        "(convert_from(ev_jsons.pa_json, 'UTF8')::jsonb "
+        " || jsonb_build_object("
+        "      'evidence', coalesce("
+        "        jsonb_agg(ev_jsons.ev_json) "
+        "        FILTER (WHERE ev_jsons.ev_json IS NOT NULL), "
+        "        '[]'::jsonb"
+        "      )"
+        "    ))::text",
+        type_=String
+    )
+    return (select([ev_jsons.c.mk_hash, ev_jsons.c.src_json,
+                    ev_jsons.c.ev_count, ev_jsons.c.belief,
+                    stmt_json.label('stmt_json'),
+                    func.count(ev_jsons.c.ev_json).label('n_ev')])
+            .group_by(ev_jsons.c.mk_hash, ev_jsons.c.src_json,
+                      ev_jsons.c.ev_count, ev_jsons.c.belief,
+                      ev_jsons.c.pa_json))
+
+
+def _make_ev_json(raw_json_bts, ref_dict):
+    """Build an evidence JSON from a raw statement JSON and its text refs."""
+    raw_json = load_json(raw_json_bts)
+    ev_json = raw_json['evidence'][0]
+    if 'annotations' not in ev_json.keys():
+        ev_json['annotations'] = {}
+
+    # Add agents' raw text to annotations.
+    ev_json['annotations']['agents'] = \
+        {'raw_text': _get_raw_texts(raw_json)}
+
+    # Add prior UUIDs to the annotations
+    if 'prior_uuids' not in ev_json['annotations'].keys():
+        ev_json['annotations']['prior_uuids'] = []
+    ev_json['annotations']['prior_uuids'].append(raw_json['id'])
+
+    # Add and/or update text refs.
+    if 'text_refs' not in ev_json.keys():
+        ev_json['text_refs'] = {}
+    if ref_dict['pmid']:
+        ev_json['pmid'] = ref_dict['pmid']
+    elif 'PMID' in ev_json['text_refs']:
+        del ev_json['text_refs']['PMID']
+    ev_json['text_refs'].update({k.upper(): v
+                                 for k, v in ref_dict.items()
+                                 if v is not None})
+
+    # Add the source dictionary.
+    if ref_dict['source']:
+        ev_json['annotations']['content_source'] = ref_dict['source']
+    return ev_json
+
 
 def _get_raw_texts(stmt_json):
     raw_text = []
@@ -0,0 +1,231 @@
+__all__ = ['RestClient', 'get_rest_client', 'set_rest_client']
+
+import json
+import logging
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from indra import get_config
+
+logger = logging.getLogger(__name__)
+
+
+# Brotli responses can only be decoded if a brotli package is installed.
+try:
+    import brotli
+    WITH_BROTLI = True
+except ImportError:
+    WITH_BROTLI = False
+
+ACCEPT_ENCODING = 'gzip, deflate, br' if WITH_BROTLI else 'gzip, deflate'
+
+
+class RestClient(object):
+    """A client for the query endpoint of the INDRA DB REST API.
+
+    This is used to resolve queries when there is no direct access to a
+    readonly database. Connections are kept in a pool and reused, responses
+    are compressed, failed requests are retried with exponential backoff,
+    and several requests may be made at once from a pool of threads. If
+    msgpack is installed, results are requested in the binary format.
+
+    Parameters
+    ----------
+    url : Optional[str]
+        The base URL of the REST API. By default, the INDRA_DB_REST_URL config
+        value is used.
+    max_retries : int
+        The number of times to retry a request that failed to connect or got
+        a 429 or 5xx response. Default is 3.
+    backoff_factor : float
+        The factor, in seconds, of the exponential backoff between retries.
+        Default is 0.5.
+    max_workers : int
+        The number of requests that can be in flight at once, which is also
+        the size of the connection pool. Default is 8.
+    """
+    def __init__(self, url=None, max_retries=3, backoff_factor=0.5,
+                 max_workers=8):
+        if url is None:
+            url = get_config('INDRA_DB_REST_URL', failure_ok=False)
+        self.url = url.rstrip('/')
+        self.max_workers = max_workers
+
+        retry = Retry(total=max_retries, backoff_factor=backoff_factor,
+                      status_forcelist=[429, 500, 502, 503, 504],
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=max_workers,
+                              pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+        from .query import WITH_MSGPACK, MSGPACK_MIMETYPE
+        if WITH_MSGPACK:
+            self.session.headers['Accept'] = \
+                f'{MSGPACK_MIMETYPE}, application/json;q=0.9'
+
+        self._executor = None
+        self._lock = Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers)
+            return self._executor
+
+    def close(self):
+        """Close the pooled connections and the threads."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        self.session.close()
+
+    def get_result(self, query_json, result_type, limit=None, offset=None,
+                   sort_by='ev_count', **other_params):
+        """Get the result of a query from the REST API.
+
+        Parameters
+        ----------
+        query_json : dict
+            The JSON of the query, as made by `Query.to_json`.
+        result_type : str
+            The type of result, e.g. 'statements', 'hashes', or 'agents'.
+        limit : Optional[int]
+            The maximum number of results.
+        offset : Optional[int]
+            The offset of the results.
+        sort_by : str
+            'ev_count' or 'belief'.
+        **other_params
+            Any other parameters for the endpoint, such as ev_limit or
+            page_token. Parameters that are None are not sent.
+
+        Returns
+        -------
+        result : QueryResult
+            The result of the query.
+        """
+        from .query import QueryResult, ApiError, MSGPACK_MIMETYPE
+
+        params = {'json': json.dumps(query_json), 'limit': limit,
+                  'offset': offset, 'sort_by': sort_by}
+        params.update(other_params)
+        params = {k: v for k, v in params.items() if v is not None}
+        resp = self.session.get(f'{self.url}/query/{result_type}',
+                                params=params)
+        if resp.status_code != 200:
+            raise ApiError(f"REST API failed with ({resp.status_code}): "
+                           f"{resp.text}")
+        if resp.headers.get('Content-Type', '').startswith(MSGPACK_MIMETYPE):
+            return QueryResult.from_msgpack(resp.content)
+        return QueryResult.from_json(resp.json())
+
+    def get_results(self, requests_list):
+        """Get the results of many queries at once.
+
+        Parameters
+        ----------
+        requests_list : list[dict]
+            A list of dicts of keyword arguments to `get_result`.
+
+        Returns
+        -------
+        results : list[QueryResult]
+            The results, in the order of the requests.
+        """
+        executor = self._get_executor()
+        futures = [executor.submit(self.get_result, **kwargs)
+                   for kwargs in requests_list]
+        return [future.result() for future in futures]
+
+    def iter_pages(self, query_json, result_type, page_size=1000, limit=None,
+                   offset=None, sort_by='ev_count', prefetch=True,
+                   **other_params):
+        """Iterate over the pages of the results of a query.
+
+        Each page after the first starts where the last one ended, using the
+        `next_page_token` of the last page when there is one, and otherwise
+        the `next_offset`. If `prefetch` is True, the next page is requested
+        while the current page is being used.
+
+        Parameters
+        ----------
+        query_json : dict
+            The JSON of the query, as made by `Query.to_json`.
+        result_type : str
+            The type of result, e.g. 'statements', 'hashes', or 'agents'.
+        page_size : int
+            The number of results in each page. Default is 1000.
+        limit : Optional[int]
+            The maximum number of results over all pages.
+        offset : Optional[int]
+            The offset at which to start.
+        sort_by : str
+            'ev_count' or 'belief'.
+        prefetch : bool
+            Request the next page in the background. Default is True.
+        **other_params
+            Any other parameters for the endpoint, such as ev_limit.
+
+        Yields
+        ------
+        result : QueryResult
+            The result for each page.
+        """
+        def get_page(page_offset, page_token, num_so_far):
+            this_size = page_size
+            if limit is not None:
+                this_size = min(page_size, limit - num_so_far)
+            return self.get_result(query_json, result_type, this_size,
+                                   page_offset, sort_by, page_token=page_token,
+                                   **other_params)
+
+        num_results = 0
+        future = None
+        page = get_page(offset, None, num_results)
+        while True:
+            num_results += len(page.results)
+            has_more = page.next_page_token is not None \
+                or page.next_offset is not None
+            if limit is not None and num_results >= limit:
+                has_more = False
+
+            if has_more:
+                if page.next_page_token is not None:
+                    args = (None, page.next_page_token, num_results)
+                else:
+                    args = (page.next_offset, None, num_results)
+                if prefetch:
+                    future = self._get_executor().submit(get_page, *args)
+
+            yield page
+
+            if not has_more:
+                break
+            page = future.result() if prefetch else get_page(*args)
+
+
+_active_client = None
+
+
+def get_rest_client() -> RestClient:
+    """Get the REST client shared by queries, making it on first use."""
+    global _active_client
+    if _active_client is None:
+        _active_client = RestClient()
+    return _active_client
+
+
+def set_rest_client(client: RestClient):
+    """Set the REST client shared by queries."""
+    global _active_client
+    if not isinstance(client, RestClient):
+        raise TypeError(f"Expected a RestClient, but got {type(client)}.")
+    _active_client = client
@@ -1,4 +1,3 @@
-import json
 import logging
 import warnings
 from sqlalchemy import or_
@@ -16,7 +15,8 @@ from indra.util import batch_iter, clockit
 from indra.statements import Unresolved, Evidence, Statement
 
 from indra_db.util import get_db, get_raw_stmts_frm_db_list, \
-    get_statement_object
+    get_statement_object, get_json_codec
+from indra_db.util.json_codec import load_json
 
 
 def get_statements_by_gene_role_type(agent_id=None, agent_ns='HGNC-SYMBOL',
@@ -395,6 +395,7 @@ def get_evidence(pa_stmt_list, db=None, fix_refs=True, use_views=True):
                   DeprecationWarning)
     if db is None:
         db = get_db('primary')
+    get_json_codec().load_dictionaries(db)
 
     # Turn the list into a dict.
     stmt_dict = {s.get_hash(shallow=True): s for s in pa_stmt_list}
@@ -421,7 +422,7 @@ def get_evidence(pa_stmt_list, db=None, fix_refs=True, use_views=True):
             else:
                 mk_hash, raw_json = info
                 rid = None
-            json_dict = json.loads(raw_json.decode('utf-8'))
+            json_dict = load_json(raw_json)
             ev_json = json_dict.get('evidence', [])
             assert len(ev_json) == 1, \
                 "Raw statements must have one evidence, got %d." % len(ev_json)
@@ -4,14 +4,18 @@ __all__ = ['texttypes', 'formats', 'DatabaseManager', 'IndraDbException',
 
 import re
 import json
+import asyncio
 import random
 import logging
 import string
-from io import BytesIO
+from io import BytesIO, StringIO
 from numbers import Number
 from functools import wraps
 from datetime import datetime
-from time import sleep
+from time import sleep, monotonic
+from threading import Lock, Semaphore
+from weakref import WeakKeyDictionary
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
@@ -27,11 +31,13 @@ from sqlalchemy.engine.url import make_url
 
 from indra.util import batch_iter
 from indra_db.config import CONFIG, build_db_url, is_db_testing
-from indra_db.schemas.mixins import IndraDBTableMetaClass
+from indra_db.schemas.mixins import IndraDBTableMetaClass, \
+    get_refresh_key_table
 from indra_db.util import S3Path
 from indra_db.exceptions import IndraDbException
 from indra_db.schemas import principal_schema, readonly_schema
-from indra_db.schemas.readonly_schema import CREATE_ORDER
+from indra_db.schemas.readonly_schema import CREATE_ORDER, \
+    get_mesh_term_closure
 
 
 try:
@@ -40,6 +46,13 @@ try:
 except ImportError:
     WITH_NX = False
 
+try:
+    from psycopg.conninfo import make_conninfo
+    from psycopg_pool import AsyncConnectionPool
+    WITH_ASYNC = True
+except ImportError:
+    WITH_ASYNC = False
+
 
 logger = logging.getLogger(__name__)
 
@@ -293,6 +306,11 @@ class DatabaseManager(object):
             return
         return self.__engine.connect()
 
+    def get_server_version_num(self):
+        """Get the version of the Postgres server, e.g. 110005 for 11.5."""
+        with self.__engine.connect() as conn:
+            return int(conn.execute('SHOW server_version_num;').scalar())
+
     def __del__(self, *args, **kwargs):
         if not self.available:
             return
@@ -1137,6 +1155,9 @@ class PrincipalDatabaseManager(DatabaseManager):
             else:
                 setattr(self, tbl.__name__, tbl)
 
+        # The number of partitions of the tables built by generate_readonly.
+        self.readonly_num_partitions = 0
+
         self._init_foreign_key_map(principal_schema.foreign_key_map)
         return
 
@@ -1155,9 +1176,16 @@ class PrincipalDatabaseManager(DatabaseManager):
     def load_source_meta_cols(self, cols=None):
         self.__SourceMeta.load_cols(self.__engine, cols)
 
-    def generate_readonly(self, belief_dict, allow_continue=True):
+    def generate_readonly(self, belief_dict, allow_continue=True,
+                          max_workers=4, ledger_path=None, num_partitions=0):
         """Manage the materialized views.
 
+        Each table is built, along with its indices, as soon as the tables it
+        is built from exist, so tables that do not depend on each other are
+        built at the same time, each on its own connection. The time, rows,
+        and size of each table are recorded in the readonly_build_ledger
+        table (see `get_readonly_build_ledger`).
+
         Parameters
         ----------
         belief_dict : dict
@@ -1165,11 +1193,34 @@ class PrincipalDatabaseManager(DatabaseManager):
         allow_continue : bool
             If True (default), continue to build the schema if it already
             exists. If False, give up if the schema already exists.
+        max_workers : int
+            The maximum number of tables to build at once. Default is 4. If 1,
+            the tables are built one at a time in the CREATE_ORDER.
+        ledger_path : Optional[str]
+            If given, the ledger of the build is also written to a JSON file
+            at this path.
+        num_partitions : int
+            The number of partitions into which the largest tables (those with
+            a `_partition_col`) are split by hash. Default is 0, meaning no
+            tables are partitioned. Partitioning requires Postgres 11 or later.
+
+        Returns
+        -------
+        build_id : str
+            The ID of the build in the readonly_build_ledger table.
         """
         if self.__protected:
             logger.error("Cannot generate readonly in protected mode.")
             return
 
+        if num_partitions > 1:
+            server_version = self.get_server_version_num()
+            if server_version < 110000:
+                raise IndraDbException(f"Partitioning the readonly tables "
+                                       f"requires Postgres 11 or later, but "
+                                       f"the server version is "
+                                       f"{server_version}.")
+
         # Optionally create the schema.
         if 'readonly' in self.get_schemas():
             if allow_continue:
@@ -1183,67 +1234,455 @@ class PrincipalDatabaseManager(DatabaseManager):
             logger.info("Creating the schema.")
             self.create_schema('readonly')
 
-        # Create function to quickly check if a table will be used further down
-        # the line.
-        def table_is_used(tbl, other_tables):
-            if not tbl._temp:
-                return True
-            for other_idx, tbl_name in enumerate(other_tables):
-                if tbl_name in self.get_active_tables(schema='readonly'):
-                    continue
-                other_tbl = self.readonly[tbl_name]
-                if not table_is_used(other_tbl, other_tables[other_idx+1:]):
-                    continue
-                if tbl.full_name() in other_tbl.definition(self):
-                    return True
-            return False
-
         # Perform some sanity checks (this would fail only due to developer
         # errors.)
         assert len(set(CREATE_ORDER)) == len(CREATE_ORDER),\
             "Elements in CREATE_ORDERED are NOT unique."
         to_create = set(CREATE_ORDER)
-        in_ro = set(self.readonly.keys()) - {'belief'}  # belief is pre-loaded
+        # belief, the MeSH closure, and the JSON dictionaries are pre-loaded
+        in_ro = set(self.readonly.keys()) \
+            - {'belief', 'mesh_term_closure', 'stmt_json_dictionary'}
         assert to_create == in_ro,\
             f"Not all readonly tables included in CREATE_ORDER:\n" \
             f"extra in create_order={to_create-in_ro}\n" \
             f"extra in tables={in_ro-to_create}."
 
+        build_id = datetime.utcnow().strftime('%Y-%m-%d-%H-%M-%S')
+        self.ReadonlyBuildLedger.__table__.create(bind=self.__engine,
+                                                  checkfirst=True)
+
         # Dump the belief dict into the database.
+        start_time = datetime.utcnow()
         self.Belief.__table__.create(bind=self.__engine)
         self.copy(self.Belief.full_name(),
                   [(int(h), n) for h, n in belief_dict.items()],
                   ('mk_hash', 'belief'))
+        end_time = datetime.utcnow()
+        self._record_readonly_build(build_id, self.Belief, start_time,
+                                    end_time, end_time,
+                                    analyze=True)
+
+        # Load the closure of the MeSH term hierarchy.
+        start_time = datetime.utcnow()
+        self.MeshTermClosure.__table__.create(bind=self.__engine)
+        self.copy(self.MeshTermClosure.full_name(),
+                  sorted(get_mesh_term_closure()),
+                  ('ancestor_num', 'descendant_num'))
+        index_start = datetime.utcnow()
+        self.MeshTermClosure.build_indices(self)
+        self._record_readonly_build(build_id, self.MeshTermClosure,
+                                    start_time, index_start, datetime.utcnow())
+
+        # Copy the dictionaries with which statement JSONs may be encoded. The
+        # JSONs themselves are copied as they are stored.
+        start_time = datetime.utcnow()
+        self._copy_json_dictionaries()
+        end_time = datetime.utcnow()
+        self._record_readonly_build(build_id, self.StmtJsonDictionary,
+                                    start_time, end_time, end_time,
+                                    analyze=True)
 
         # Build the tables.
+        self.readonly_num_partitions = num_partitions
+        try:
+            self._build_readonly_tables(max_workers, build_id)
+        finally:
+            self.readonly_num_partitions = 0
+
+        if ledger_path is not None:
+            with open(ledger_path, 'w') as f:
+                json.dump(self.get_readonly_build_ledger(build_id), f,
+                          indent=2)
+        return build_id
+
+    def _copy_json_dictionaries(self):
+        """Replace the JSON dictionaries in the readonly schema."""
+        self.JsonDictionary.__table__.create(bind=self.__engine,
+                                             checkfirst=True)
+        self.StmtJsonDictionary.__table__.create(bind=self.__engine,
+                                                 checkfirst=True)
+        ro_name = self.StmtJsonDictionary.full_name()
+        with self.__engine.begin() as conn:
+            conn.execute(f"DELETE FROM {ro_name};\n"
+                         f"INSERT INTO {ro_name} (id, dictionary)\n"
+                         f"SELECT id, dictionary\n"
+                         f"FROM {self.JsonDictionary.full_name()};")
+        return
+
+    def _record_readonly_build(self, build_id, ro_tbl, start_time,
+                               index_start, end_time, analyze=False):
+        """Record the time, rows, and size of a readonly table in the ledger.
+
+        The number of rows is the count Postgres keeps for the table, which is
+        made when its indices are built. For a table whose indices were not
+        built, set `analyze` to True to have the table analyzed first, so that
+        the count is made.
+        """
+        # A partitioned table holds no rows itself, so add up its partitions.
+        stats_sql = ("SELECT sum(reltuples)::bigint,\n"
+                     "       sum(pg_relation_size(oid))::bigint,\n"
+                     "       sum(pg_indexes_size(oid))::bigint\n"
+                     "FROM pg_class\n"
+                     "WHERE oid IN (SELECT inhrelid FROM pg_inherits\n"
+                     "              WHERE inhparent = %(tbl)s::regclass)\n"
+                     "  OR (oid = %(tbl)s::regclass AND relkind <> 'p')")
+        conn = self.get_raw_connection()
+        try:
+            cursor = conn.cursor()
+            if analyze:
+                cursor.execute(f"ANALYZE {ro_tbl.full_name(force_schema=True)}")
+            cursor.execute(stats_sql,
+                           {'tbl': ro_tbl.full_name(force_schema=True)})
+            num_rows, table_size, index_size = cursor.fetchone()
+            if num_rows is not None and num_rows < 0:
+                num_rows = None
+            cursor.execute(
+                f"INSERT INTO {self.ReadonlyBuildLedger.full_name()}\n"
+                f"  (build_id, table_name, start_time, end_time, index_time,\n"
+                f"   num_rows, table_size, index_size)\n"
+                f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                (build_id, ro_tbl.__tablename__, start_time, end_time,
+                 (end_time - index_start).total_seconds(), num_rows,
+                 table_size, index_size)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return
+
+    def get_readonly_build_ledger(self, build_id=None):
+        """Get the ledger of a readonly build.
+
+        Parameters
+        ----------
+        build_id : Optional[str]
+            The ID of the build, as returned by `generate_readonly`. By
+            default, the latest build is used.
+
+        Returns
+        -------
+        ledger : dict
+            The ID, start and end times, and total time in seconds of the
+            build, and under 'tables' a list of the tables in the order they
+            were started, with the start and end times, the total and index
+            times in seconds, the number of rows, and the table and index
+            sizes in bytes of each.
+        """
+        ledger = self.ReadonlyBuildLedger
+        if build_id is None:
+            latest = self.filter_query(ledger.build_id)\
+                .order_by(ledger.start_time.desc()).first()
+            if latest is None:
+                return None
+            build_id = latest[0]
+
+        entries = self.filter_query(ledger, ledger.build_id == build_id)\
+            .order_by(ledger.start_time).all()
+        if not entries:
+            return None
+
+        tables = []
+        for entry in entries:
+            tables.append({
+                'table_name': entry.table_name,
+                'start_time': entry.start_time.isoformat(),
+                'end_time': entry.end_time.isoformat(),
+                'total_time':
+                    (entry.end_time - entry.start_time).total_seconds(),
+                'index_time': entry.index_time,
+                'num_rows': entry.num_rows,
+                'table_size': entry.table_size,
+                'index_size': entry.index_size
+            })
+
+        start_time = min(entry.start_time for entry in entries)
+        end_time = max(entry.end_time for entry in entries)
+        return {'build_id': build_id, 'start_time': start_time.isoformat(),
+                'end_time': end_time.isoformat(),
+                'total_time': (end_time - start_time).total_seconds(),
+                'tables': tables}
+
+    def _get_readonly_dependencies(self):
+        """Get the names of the tables each readonly table is built from."""
+        deps = {}
         for i, ro_name in enumerate(CREATE_ORDER):
-            # Check to see if the table has already been build (skip if so).
-            if ro_name in self.get_active_tables(schema='readonly'):
-                logger.info(f"[{i}] Build of {ro_name} done, continuing...")
-                continue
+            deps[ro_name] = self.readonly[ro_name].get_dependencies(
+                {name: self.readonly[name] for name in CREATE_ORDER}
+            )
+            out_of_order = deps[ro_name] - set(CREATE_ORDER[:i])
+            assert not out_of_order, \
+                f"{ro_name} is built from {out_of_order}, which come after " \
+                f"it in CREATE_ORDER."
+        return deps
+
+    def _build_readonly_tables(self, max_workers, build_id=None):
+        deps = self._get_readonly_dependencies()
+        active = set(self.get_active_tables(schema='readonly'))
+
+        # Find the tables to build: every table that is not temp, and any temp
+        # table that is needed to build them.
+        to_build = set()
+        needed = [name for name in CREATE_ORDER
+                  if name not in active and not self.readonly[name]._temp]
+        while needed:
+            ro_name = needed.pop()
+            if ro_name not in to_build:
+                to_build.add(ro_name)
+                needed.extend(deps[ro_name] - active)
 
-            # Get table object, and check to see that if it is temp it is used.
-            ro_tbl = self.readonly[ro_name]
-            if not table_is_used(ro_tbl, CREATE_ORDER[i+1:]):
+        for i, ro_name in enumerate(CREATE_ORDER):
+            if ro_name in active:
+                logger.info(f"[{i}] Build of {ro_name} done, continuing...")
+            elif ro_name not in to_build:
                 logger.info(f"[{i}] {ro_name} is marked as a temp table "
                             f"but is not used in future tables. Skipping.")
-                continue
 
-            # Build the table and its indices.
-            logger.info(f"[{i}] Creating {ro_name} readonly table...")
-            ro_tbl.create(self)
-            ro_tbl.build_indices(self)
+        # Only one table at a time may use the session and its connection.
+        session_lock = Lock()
+
+        # The tables and the partitions of their indices are all built within
+        # one budget of connections.
+        connection_slots = Semaphore(max_workers)
 
-            # Drop any temp tables that will not be used further down the line.
+        def build_table(ro_name):
+            ro_tbl = self.readonly[ro_name]
+            start_time = datetime.utcnow()
+            if ro_tbl._uses_session:
+                with session_lock, connection_slots:
+                    ro_tbl.create(self)
+            else:
+                with connection_slots:
+                    ro_tbl.create(self)
+            index_start = datetime.utcnow()
+            ro_tbl.build_indices(self, max_workers=max_workers,
+                                 connection_slots=connection_slots)
+            if build_id is not None:
+                self._record_readonly_build(build_id, ro_tbl, start_time,
+                                            index_start, datetime.utcnow(),
+                                            analyze=not ro_tbl._indices)
+            return
+
+        def drop_unused_temp_tables(pending):
             to_drop = []
             for existing_tbl in self.get_active_tables(schema='readonly'):
-                if not table_is_used(self.readonly[existing_tbl],
-                                     CREATE_ORDER[i+1:]):
-                    to_drop.append(existing_tbl)
-            self.drop_tables(to_drop, force=True)
+                # Partitions are listed too, and dropped with their table.
+                if not getattr(self.readonly.get(existing_tbl), '_temp',
+                               False):
+                    continue
+                if any(existing_tbl in deps[name] for name in pending):
+                    continue
+                to_drop.append(existing_tbl)
+            if to_drop:
+                self.drop_tables(to_drop, force=True)
+
+        # Start each table as soon as the tables it is built from are done,
+        # preferring tables earlier in the CREATE_ORDER.
+        done = active.copy()
+        waiting = [name for name in CREATE_ORDER if name in to_build]
+        running = {}
+        with ThreadPoolExecutor(max_workers) as executor:
+            while waiting or running:
+                for ro_name in waiting[:]:
+                    if len(running) >= max_workers:
+                        break
+                    if deps[ro_name] <= done:
+                        waiting.remove(ro_name)
+                        logger.info(f"[{CREATE_ORDER.index(ro_name)}] "
+                                    f"Creating {ro_name} readonly table...")
+                        future = executor.submit(build_table, ro_name)
+                        running[future] = ro_name
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    ro_name = running.pop(future)
+                    future.result()
+                    done.add(ro_name)
+                    logger.info(f"[{CREATE_ORDER.index(ro_name)}] Finished "
+                                f"{ro_name} readonly table.")
+
+                # Drop any temp tables that will not be used further down the
+                # line.
+                drop_unused_temp_tables(waiting + list(running.values()))
+        return
+
+    def refresh_readonly(self, belief_dict, mk_hashes=None, since=None):
+        """Refresh the readonly tables for new or changed statements.
+
+        Rather than rebuilding the whole readonly schema, only the rows of the
+        given statements are recomputed, using the same definitions as a full
+        build restricted to those statements, and replaced in place. The temp
+        tables are built with only those statements, and dropped at the end.
 
+        All the tables are refreshed in one transaction, so readers never see
+        a partly refreshed schema, and the build version (see
+        `ReadonlyDatabaseManager.get_build_version`) is changed, so results
+        cached from before the refresh are not used.
+
+        Parameters
+        ----------
+        belief_dict : dict
+            The dictionary, keyed by hash, of belief calculated for Statements.
+            It must include the statements being refreshed.
+        mk_hashes : Optional[iterable[int]]
+            The hashes of the statements to refresh. This may include hashes
+            of statements that have since been removed, whose rows are then
+            removed.
+        since : Optional[datetime]
+            If `mk_hashes` is not given, refresh the statements made after this
+            time, and the statements with raw statements made after this time.
+        """
+        if self.__protected:
+            logger.error("Cannot refresh readonly in protected mode.")
+            return
+
+        missing = {name for name in CREATE_ORDER
+                   if not self.readonly[name]._temp}
+        missing -= set(self.get_active_tables(schema='readonly'))
+        if missing:
+            raise IndraDbException(f"Cannot refresh the readonly schema, "
+                                   f"which is missing tables: {missing}.")
+
+        self.grab_session()
+        if mk_hashes is None:
+            if since is None:
+                raise ValueError("Either mk_hashes or since must be given.")
+            link = self.RawUniqueLinks
+            new_pa_q = self.session.query(self.PAStatements.mk_hash)\
+                .filter(self.PAStatements.create_date > since)
+            new_raw_q = self.session.query(link.pa_stmt_mk_hash)\
+                .filter(link.raw_stmt_id == self.RawStatements.id,
+                        self.RawStatements.create_date > since)
+            mk_hashes = {h for h, in new_pa_q.union(new_raw_q).all()}
+        mk_hashes = {int(h) for h in mk_hashes}
+        if not mk_hashes:
+            logger.info("No statements to refresh.")
+            return
+
+        keys = self._get_refresh_keys(mk_hashes)
+        logger.info(f"Refreshing {len(keys['mk_hash'])} statements, with "
+                    f"{len(keys['sid'])} raw statements.")
+
+        # Any dictionaries trained since the build may have been used to
+        # encode the JSONs of these statements.
+        self._copy_json_dictionaries()
+
+        # Drop any temp tables left over, so they can be made with only the
+        # statements being refreshed.
+        self._drop_readonly_temp_tables()
+
+        # Everything else is done on the copy connection in one transaction,
+        # so readers never see a partly refreshed schema.
+        try:
+            self._load_refresh_keys(keys)
+
+            # Replace the beliefs of the statements.
+            beliefs = [(h, belief_dict.get(h, belief_dict.get(str(h))))
+                       for h in keys['mk_hash']]
+            beliefs = [(h, b) for h, b in beliefs if b is not None]
+            if len(beliefs) < len(keys['mk_hash']):
+                logger.warning(f"{len(keys['mk_hash']) - len(beliefs)} "
+                               f"statements have no belief, and will be left "
+                               f"out.")
+            self.get_copy_cursor().execute(
+                f"DELETE FROM {self.Belief.full_name()}\n"
+                f"WHERE mk_hash IN (SELECT key FROM "
+                f"{get_refresh_key_table('mk_hash')});"
+            )
+            self.copy(self.Belief.full_name(), beliefs, ('mk_hash', 'belief'),
+                      commit=False)
+
+            for i, ro_name in enumerate(CREATE_ORDER):
+                ro_tbl = self.readonly[ro_name]
+                if ro_name == 'source_meta':
+                    self._check_refresh_sources()
+                logger.info(f"[{i}] Refreshing {ro_name} readonly table...")
+                ro_tbl.refresh(self)
+                if ro_tbl._temp:
+                    for index in ro_tbl._indices:
+                        self.get_copy_cursor().execute(
+                            ro_tbl.create_index(self, index, commit=False)
+                        )
+
+            # Change the build version, so results cached from before the
+            # refresh are not used (see `get_build_version`).
+            self.get_copy_cursor().execute(
+                "CREATE SEQUENCE IF NOT EXISTS readonly.refresh_version;\n"
+                "SELECT nextval('readonly.refresh_version');"
+            )
+        except Exception:
+            if self._conn is not None:
+                self._conn.rollback()
+                self._conn = None
+            raise
+        self.commit_copy("Failed to commit the refresh of the readonly "
+                         "schema.")
+
+        self._drop_readonly_temp_tables()
+        return
+
+    def _load_refresh_keys(self, keys):
+        """Copy the keys of the rows to refresh into temp tables.
+
+        The tables are made on the copy connection, where the refresh is run,
+        and are dropped when it commits.
+        """
+        cursor = self.get_copy_cursor()
+        for key, values in keys.items():
+            tbl_name = get_refresh_key_table(key)
+            cursor.execute(f"CREATE TEMP TABLE {tbl_name} "
+                           f"(key bigint PRIMARY KEY) ON COMMIT DROP;")
+            cursor.copy_expert(f"COPY {tbl_name} (key) FROM STDIN",
+                               StringIO(''.join(f'{int(v)}\n'
+                                                for v in values)))
+            cursor.execute(f"ANALYZE {tbl_name};")
         return
 
+    def _get_refresh_keys(self, mk_hashes):
+        """Get the keys of the readonly rows that derive from some statements.
+        """
+        sids = {sid for sid, in self.select_all(
+            self.RawUniqueLinks.raw_stmt_id,
+            self.RawUniqueLinks.pa_stmt_mk_hash.in_(mk_hashes)
+        )}
+        rids = {rid for rid, in self.select_all(
+            self.RawStatements.reading_id,
+            self.RawStatements.id.in_(sids),
+            self.RawStatements.reading_id.isnot(None)
+        )}
+        pmid_nums = {pmid_num for pmid_num, in self.select_all(
+            self.TextRef.pmid_num,
+            self.Reading.id.in_(rids),
+            self.Reading.text_content_id == self.TextContent.id,
+            self.TextContent.text_ref_id == self.TextRef.id,
+            self.TextRef.pmid_num.isnot(None)
+        )}
+        return {'mk_hash': mk_hashes, 'sid': sids, 'rid': rids,
+                'pmid_num': pmid_nums}
+
+    def _drop_readonly_temp_tables(self):
+        to_drop = [name for name in self.get_active_tables(schema='readonly')
+                   if getattr(self.readonly.get(name), '_temp', False)]
+        if to_drop:
+            self.drop_tables(to_drop, force=True)
+
+    def _check_refresh_sources(self):
+        """Make sure the existing source_meta has a column for every source.
+        """
+        # The refreshed raw_stmt_src is only seen on the copy connection.
+        cursor = self.get_copy_cursor()
+        cursor.execute(f"SELECT DISTINCT src "
+                       f"FROM {self.RawStmtSrc.full_name()};")
+        srcs = {src for src, in cursor.fetchall()}
+        cursor.execute("SELECT column_name FROM information_schema.columns\n"
+                       "WHERE table_schema = 'readonly'\n"
+                       "  AND table_name = 'source_meta';")
+        existing_srcs = {col for col, in cursor.fetchall()}
+        new_srcs = srcs - existing_srcs
+        if new_srcs:
+            raise IndraDbException(f"Statements from new sources {new_srcs} "
+                                   f"cannot be refreshed. Rebuild the "
+                                   f"readonly schema with generate_readonly.")
+
     def dump_readonly(self, dump_file=None):
         """Dump the readonly schema to s3."""
 
@@ -1363,6 +1802,7 @@ class ReadonlyDatabaseManager(DatabaseManager):
     _instance_type = 'db.m5.xlarge'
     _instance_name_fmt = 'indradb-readonly-{name}'
     _db_name = 'indradb_readonly'
+    build_version_ttl = 5
 
     def __init__(self, host, label=None, protected=True):
         super(self.__class__, self).__init__(host, label, protected)
@@ -1380,12 +1820,108 @@ class ReadonlyDatabaseManager(DatabaseManager):
             else:
                 setattr(self, tbl.__name__, tbl)
         self.__non_source_cols = None
+        self.__async_pools = WeakKeyDictionary()
+        self.__build_version = None
 
     def get_config_string(self):
         res = super(ReadonlyDatabaseManager, self).get_config_string()
         res = 'role = readonly\n' + res
         return res
 
+    async def get_async_pool(self, max_size=20):
+        """Get the pool of async connections for the running event loop.
+
+        The pool is made with psycopg (version 3) and psycopg_pool, which must
+        be installed. A pool can only be used in the event loop it was opened
+        in, so a pool is created and opened the first time it is requested in
+        each loop.
+
+        Parameters
+        ----------
+        max_size : int
+            The maximum number of connections the pool will open. This only has
+            an effect when the pool is first created. Default is 20.
+        """
+        if not WITH_ASYNC:
+            raise IndraDbException("Async queries require psycopg and "
+                                   "psycopg_pool to be installed.")
+        # Within a coroutine, this is the running loop (on Python 3.6 too).
+        loop = asyncio.get_event_loop()
+        entry = self.__async_pools.get(loop)
+        if entry is None:
+            conninfo = make_conninfo(host=self.url.host, port=self.url.port,
+                                     dbname=self.url.database,
+                                     user=self.url.username,
+                                     password=self.url.password)
+            pool = AsyncConnectionPool(conninfo, max_size=max_size,
+                                       open=False)
+
+            # Other tasks may ask for the pool while it is being opened, so
+            # they all wait on the same opening.
+            entry = (pool, loop.create_task(pool.open()))
+            self.__async_pools[loop] = entry
+        pool, opening = entry
+        await opening
+        return pool
+
+    async def async_execute(self, selection, explain=False) -> list:
+        """Execute a selection or query asynchronously, returning all rows.
+
+        The selection is compiled by SQLAlchemy as it would be for psycopg2,
+        whose parameter style psycopg 3 shares, and run on a connection from
+        the async pool. The values of the parameters and of the results are
+        processed by their SQLAlchemy types, as they would be by `execute`.
+        If `explain` is True, the JSON plan of the selection is returned
+        instead.
+        """
+        if hasattr(selection, 'statement'):
+            selection = selection.statement
+        dialect = self.__engine.dialect
+        compiled = selection.compile(
+            dialect=dialect,
+            compile_kwargs={'literal_binds': False, 'render_postcompile': True}
+        )
+        params = {}
+        for name, value in compiled.construct_params().items():
+            bind = compiled.binds.get(name)
+            process = None
+            if bind is not None:
+                process = bind.type.dialect_impl(dialect)\
+                    .bind_processor(dialect)
+            params[name] = process(value) if process is not None else value
+
+        sql = str(compiled)
+        if explain:
+            sql = f'EXPLAIN (FORMAT JSON) {sql}'
+
+        pool = await self.get_async_pool()
+        async with pool.connection() as conn:
+            cur = await conn.execute(sql, params)
+            rows = await cur.fetchall()
+            description = cur.description
+        if explain:
+            return rows[0][0]
+
+        columns = getattr(selection, 'selected_columns', None)
+        if columns is None:
+            columns = selection.columns
+        processors = [col.type.dialect_impl(dialect)
+                      .result_processor(dialect, col_desc.type_code)
+                      for col, col_desc in zip(columns, description)]
+        if not any(processors):
+            return rows
+        return [tuple(value if process is None else process(value)
+                      for process, value in zip(processors, row))
+                for row in rows]
+
+    async def close_async_pool(self):
+        """Close the async connection pool of the running loop, if any."""
+        entry = self.__async_pools.pop(asyncio.get_event_loop(), None)
+        if entry is not None:
+            pool, opening = entry
+            await opening
+            await pool.close()
+
     def get_source_names(self) -> set:
         """Get a list of the source names as they appear in SourceMeta cols."""
         all_cols = set(self.get_column_names(self.SourceMeta))
@@ -1414,8 +1950,55 @@ class ReadonlyDatabaseManager(DatabaseManager):
         """
         return super(ReadonlyDatabaseManager, self).get_active_tables(schema)
 
+    def get_build_version(self, max_age=None):
+        """Get a stamp that changes whenever the readonly build is replaced.
+
+        The stamp is the object ID of the source_meta table, which is new each
+        time the readonly schema is built or loaded from a dump (see
+        `load_dump`), along with the number of times the schema has been
+        refreshed in place (see `PrincipalDatabaseManager.refresh_readonly`).
+        This is used to key cached query results. None is returned if the
+        readonly tables do not exist.
+
+        Parameters
+        ----------
+        max_age : Optional[float]
+            The age in seconds beyond which a previously fetched stamp is
+            fetched again. By default, `build_version_ttl` is used. Use 0 to
+            always fetch the stamp from the database.
+        """
+        if max_age is None:
+            max_age = self.build_version_ttl
+        if self.__build_version is not None:
+            fetched_at, build_version = self.__build_version
+            if monotonic() - fetched_at < max_age:
+                return build_version
+
+        build_version = self.__fetch_build_version()
+        self.__build_version = (monotonic(), build_version)
+        return build_version
+
+    def __fetch_build_version(self):
+        with self.__engine.connect() as con:
+            oid, refreshed = con.execute(
+                "SELECT to_regclass('readonly.source_meta')::oid,\n"
+                "       to_regclass('readonly.refresh_version') IS NOT NULL;"
+            ).first()
+            if oid is None:
+                return None
+            if not refreshed:
+                return str(oid)
+            refresh_num = con.execute(
+                "SELECT last_value FROM readonly.refresh_version;"
+            ).scalar()
+        return f'{oid}.{refresh_num}'
+
     def load_dump(self, dump_file, force_clear=True):
-        """Load from a dump of the readonly schema on s3."""
+        """Load from a dump of the readonly schema on s3.
+
+        Any cached query results for the previous build are invalidated,
+        because the build version (see `get_build_version`) changes.
+        """
         if self.__protected:
             logger.error("Cannot load a dump while in protected mode.")
             return
@@ -1431,6 +2014,7 @@ class ReadonlyDatabaseManager(DatabaseManager):
 
         # Do the restore
         self.pg_restore(dump_file)
+        self.__build_version = None
 
         # Run Vacuuming
         logger.info("Running vacuuming.")
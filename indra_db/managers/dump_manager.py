@@ -1,3 +1,4 @@
+import os
 import json
 
 import boto3
@@ -10,8 +11,9 @@ from indra.statements import get_all_descendants
 from indra.statements.io import stmts_from_json
 from indra_db.belief import get_belief
 from indra_db.config import CONFIG, get_s3_dump, record_in_test
-from indra_db.util import get_db, get_ro, S3Path
+from indra_db.util import get_db, get_ro, S3Path, make_paper_id_snapshot
 from indra_db.util.aws import get_role_kwargs
+from indra_db.util.json_codec import get_json_codec, decode_json, load_json
 from indra_db.util.dump_sif import dump_sif, get_source_counts, load_res_pos
 
 
@@ -348,8 +350,10 @@ class FullPaJson(Dumper):
         super(FullPaJson, self).__init__(use_principal=use_principal, **kwargs)
 
     def dump(self, continuing=False):
+        get_json_codec().load_dictionaries(self.db)
         query_res = self.db.session.query(self.db.FastRawPaLink.pa_json.distinct())
-        jsonl_str = '\n'.join([js.decode() for js, in query_res.all()])
+        jsonl_str = '\n'.join([decode_json(js).decode()
+                               for js, in query_res.all()])
         s3 = boto3.client('s3')
         self.get_s3_path().upload(s3, jsonl_str.encode('utf-8'))
 
@@ -365,8 +369,9 @@ class FullPaStmts(Dumper):
         super(FullPaStmts, self).__init__(use_principal=use_principal, **kwargs)
 
     def dump(self, continuing=False):
+        get_json_codec().load_dictionaries(self.db)
         query_res = self.db.session.query(self.db.FastRawPaLink.pa_json.distinct())
-        stmt_list = stmts_from_json([json.loads(js[0]) for js in
+        stmt_list = stmts_from_json([load_json(js[0]) for js in
                                      query_res.all()])
         s3 = boto3.client('s3')
         self.get_s3_path().upload(s3, pickle.dumps(stmt_list))
@@ -386,7 +391,8 @@ class Readonly(Dumper):
         s3 = boto3.client('s3')
         belief_data = belief_dump.get(s3)
         belief_dict = json.loads(belief_data['Body'].read())
-        self.db.generate_readonly(belief_dict, allow_continue=continuing)
+        self.build_id = self.db.generate_readonly(belief_dict,
+                                                  allow_continue=continuing)
 
         logger.info("%s - Beginning dump of database (est. 1 + epsilon hours)"
                     % datetime.now())
@@ -394,6 +400,43 @@ class Readonly(Dumper):
         return
 
 
+class BuildLedger(Dumper):
+    """Dumps the time, rows, and size of each table of a readonly build."""
+    name = 'build_ledger'
+    fmt = 'json'
+    db_required = True
+    db_options = ['principal']
+
+    def dump(self, build_id=None, continuing=False):
+        ledger = self.db.get_readonly_build_ledger(build_id)
+        if ledger is None:
+            logger.warning("No readonly build has been recorded.")
+            return
+        s3 = boto3.client('s3')
+        self.get_s3_path().upload(s3, json.dumps(ledger).encode('utf-8'))
+
+
+class PaperIds(Dumper):
+    """Dumps a sqlite snapshot of the mapping from paper IDs to trids."""
+    name = 'paper_ids'
+    fmt = 'sqlite'
+    db_required = True
+    db_options = ['principal', 'readonly']
+
+    def __init__(self, use_principal=True, **kwargs):
+        super(PaperIds, self).__init__(use_principal=use_principal, **kwargs)
+
+    def dump(self, continuing=False):
+        snapshot_path = f'{self.name}_{self.date_stamp}.{self.fmt}'
+        make_paper_id_snapshot(self.db, snapshot_path)
+        try:
+            with open(snapshot_path, 'rb') as f:
+                s3 = boto3.client('s3')
+                self.get_s3_path().upload(s3, f.read())
+        finally:
+            os.remove(snapshot_path)
+
+
 class StatementHashMeshId(Dumper):
     name = 'mti_mesh_ids'
     fmt = 'pkl'
@@ -509,6 +552,10 @@ def dump(principal_db, readonly_db, delete_existing=False, allow_continue=True,
             ro_dumper.dump(belief_dump=belief_dump,
                            continuing=allow_continue)
             dump_file = ro_dumper.get_s3_path()
+
+            logger.info("Dumping the readonly build ledger.")
+            BuildLedger(db=principal_db, date_stamp=starter.date_stamp)\
+                .dump(build_id=ro_dumper.build_id, continuing=allow_continue)
         else:
             logger.info("Readonly dump exists, skipping.")
 
@@ -536,6 +583,11 @@ def dump(principal_db, readonly_db, delete_existing=False, allow_continue=True,
                                 date_stamp=starter.date_stamp)\
                 .dump(continuing=allow_continue)
 
+        if not allow_continue or not PaperIds.from_list(starter.manifest):
+            logger.info("Dumping the paper id snapshot.")
+            PaperIds(db=principal_db, date_stamp=starter.date_stamp)\
+                .dump(continuing=allow_continue)
+
         End(date_stamp=starter.date_stamp).dump(continuing=allow_continue)
     else:
         # Find the most recent dump that has a readonly.
@@ -5,7 +5,7 @@ from collections import defaultdict
 
 from indra.statements import Statement
 from indra_db.reading.read_db import DatabaseStatementData, generate_reading_id
-from indra_db.util import S3Path, get_db, insert_raw_agents
+from indra_db.util import S3Path, get_db, insert_raw_agents, get_json_codec
 
 logger = logging.getLogger(__name__)
 
@@ -95,6 +95,7 @@ class XddManager:
         r_cols = ('id', 'text_content_id', 'reader', 'reader_version',
                   'format', 'batch_id')
         s_rows = set()
+        get_json_codec().load_dictionaries(db)
         rd_batch_id = db.make_copy_batch_id()
         stmt_batch_id = db.make_copy_batch_id()
         stmts = []
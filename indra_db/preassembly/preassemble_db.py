@@ -1,4 +1,3 @@
-import json
 import pickle
 import logging
 from os import path
@@ -22,7 +21,9 @@ from indra_db.reading.read_db_aws import bucket_name
 
 from indra_db.util.data_gatherer import DataGatherer, DGContext
 from indra_db.util import insert_pa_stmts, distill_stmts, get_db, \
-    extract_agent_data, insert_pa_agents, hash_pa_agents, S3Path
+    extract_agent_data, insert_pa_agents, hash_pa_agents, S3Path, \
+    get_json_codec
+from indra_db.util.json_codec import load_json
 
 site_logger.setLevel(logging.INFO)
 grounding_logger.setLevel(logging.INFO)
@@ -39,6 +40,7 @@ def _handle_update_table(func):
     @wraps(func)
     def run_and_record_update(obj, db, *args, **kwargs):
         run_datetime = datetime.utcnow()
+        get_json_codec().load_dictionaries(db)
         completed = func(obj, db, *args, **kwargs)
         if completed:
             is_corpus_init = (func.__name__ == 'create_corpus')
@@ -684,7 +686,7 @@ class DbPreassembler:
 
 
 def _stmt_from_json(stmt_json_bytes):
-    return Statement._from_json(json.loads(stmt_json_bytes.decode('utf-8')))
+    return Statement._from_json(load_json(stmt_json_bytes))
 
 
 # This is purely for reducing having to type this long thing so often.
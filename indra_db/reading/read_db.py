@@ -25,7 +25,8 @@ from indra.util import zip_string
 from indra_db import get_db, formats
 from indra_db.databases import readers, reader_versions
 from indra_db.util.data_gatherer import DataGatherer, DGContext
-from indra_db.util import insert_raw_agents, unpack
+from indra_db.util import insert_raw_agents, unpack, get_json_codec
+from indra_db.util.json_codec import encode_json
 
 logger = logging.getLogger(__name__)
 
@@ -183,13 +184,17 @@ class DatabaseStatementData(DatabaseResultData):
                'source_hash', 'type', 'json', 'indra_version', 'text_hash'
 
     def make_tuple(self, batch_id):
-        """Make a tuple for copying into the database."""
+        """Make a tuple for copying into the database.
+
+        The JSON is encoded by the shared codec, which compresses it if a
+        dictionary has been loaded for encoding.
+        """
         return (batch_id, self.reading_id, self.db_info_id,
                 self.result.uuid, self.result.get_hash(),
                 self.result.evidence[0].get_source_hash(),
                 self.result.__class__.__name__,
-                json.dumps(self.result.to_json()), self.indra_version,
-                self._get_text_hash())
+                encode_json(json.dumps(self.result.to_json())),
+                self.indra_version, self._get_text_hash())
 
     def _get_text_hash(self):
         ev = self.result.evidence[0]
@@ -440,6 +445,8 @@ class DatabaseReader(object):
         batch_id = self._db.make_copy_batch_id()
 
         if self.reader.results_type == 'statements':
+            get_json_codec().load_dictionaries(self._db)
+
             # Find and filter out duplicate statements.
             stmt_tuples = {}
             stmts = []
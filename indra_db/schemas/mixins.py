@@ -1,4 +1,8 @@
+import re
 import logging
+from threading import Semaphore
+from concurrent.futures import ThreadPoolExecutor
+
 from termcolor import colored
 from psycopg2.errors import DuplicateTable
 from sqlalchemy import inspect, Column, BigInteger
@@ -12,6 +16,21 @@ class DbIndexError(Exception):
     pass
 
 
+def get_refresh_key_table(key):
+    """Get the name of the temp table of the keys of the rows to refresh.
+
+    While the readonly schema is refreshed, the keys of the rows to refresh,
+    of each kind ('mk_hash', 'sid', 'rid', and 'pmid_num'), are held in a
+    temp table on the connection doing the refresh.
+    """
+    return f'refresh_keys_{key}'
+
+
+def _refresh_keys_sql(key):
+    """Get a subquery of the keys of a kind that are being refreshed."""
+    return f'(SELECT key FROM {get_refresh_key_table(key)})'
+
+
 class IndraDBTableMetaClass(type):
     """This serves as a meta class for all tables, allowing `str` to be useful.
 
@@ -158,15 +177,142 @@ class ReadonlyTable(IndraDBTable):
     # to live beyond the readonly build process.
     _temp = False
 
+    # Tables whose build uses the database session (not just a fresh raw
+    # connection) must not be built at the same time as other such tables.
+    _uses_session = False
+
+    # The column by which the rows of this table are refreshed for a set of
+    # statements: the hash ('mk_hash'), or the raw statement ids ('sid'),
+    # reading ids ('rid'), or pmids ('pmid_num') of those statements.
+    _refresh_key = 'mk_hash'
+
+    # The names of the other readonly tables this table is built from,
+    # whether they are named in the definition or used by custom build code.
+    _depends_on = ()
+
+    # Large tables may be partitioned by the hash of a column, so that their
+    # indices can be built in parallel and lookups by that column only search
+    # one partition. A table with a _partition_col is partitioned when it is
+    # created if the database manager building it has a
+    # `readonly_num_partitions` of more than 1 (see `generate_readonly`).
+    _partition_col = None
+
     @classmethod
     def create(cls, db, commit=True):
-        sql = cls.__create_table_fmt__ \
-              % (cls.full_name(force_schema=True),
-                 cls.get_definition())
+        sql = cls._get_create_sql(db, cls.get_definition())
         if commit:
             cls.execute(db, sql)
         return sql
 
+    @classmethod
+    def is_partitioned(cls, db):
+        """Check whether this table is partitioned in the database."""
+        with db.get_conn() as conn:
+            relkind = conn.execute(
+                "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+                (cls.full_name(force_schema=True),)
+            ).scalar()
+        return relkind == 'p'
+
+    @classmethod
+    def get_partition_names(cls, db):
+        """Get the full names of the partitions of this table, if any."""
+        with db.get_conn() as conn:
+            res = conn.execute(
+                "SELECT inhrelid::regclass::text FROM pg_inherits\n"
+                "WHERE inhparent = to_regclass(%s)\n"
+                "ORDER BY 1",
+                (cls.full_name(force_schema=True),)
+            )
+            return [name for name, in res]
+
+    @classmethod
+    def _get_num_partitions(cls, db):
+        if cls._partition_col is None:
+            return 0
+        return getattr(db, 'readonly_num_partitions', 0)
+
+    @classmethod
+    def _get_create_sql(cls, db, definition):
+        full_name = cls.full_name(force_schema=True)
+        num_partitions = cls._get_num_partitions(db)
+        if num_partitions <= 1:
+            return cls.__create_table_fmt__ % (full_name, definition)
+
+        # A partitioned table cannot be created from a query, so the columns
+        # are taken from an empty table made from the definition.
+        template = f'{full_name}_template'
+        sql = (f"CREATE TABLE {template} AS {definition}\nWITH NO DATA;\n"
+               f"CREATE TABLE IF NOT EXISTS {full_name} (LIKE {template})\n"
+               f"  PARTITION BY HASH ({cls._partition_col});\n"
+               f"DROP TABLE {template};\n")
+        for i in range(num_partitions):
+            sql += (f"CREATE TABLE IF NOT EXISTS {full_name}_part{i}\n"
+                    f"  PARTITION OF {full_name}\n"
+                    f"  FOR VALUES WITH (MODULUS {num_partitions}, "
+                    f"REMAINDER {i});\n")
+        sql += f"INSERT INTO {full_name}\n{definition};"
+        return sql
+
+    @classmethod
+    def build_indices(cls, db, max_workers=1, connection_slots=None):
+        """Build the indices, building those of partitions in parallel.
+
+        An index of a partitioned table is made on the table alone, and then
+        the same index is built on each partition, up to `max_workers` at a
+        time, and attached to it.
+
+        Parameters
+        ----------
+        db : DatabaseManager
+            The database in which the table exists.
+        max_workers : int
+            The maximum number of partitions whose indices are built at once.
+            Default is 1.
+        connection_slots : Optional[threading.Semaphore]
+            If given, a slot is held while each statement is run, so that the
+            statements of tables built at the same time share one budget of
+            connections.
+        """
+        if connection_slots is None:
+            connection_slots = Semaphore(max_workers)
+
+        with connection_slots:
+            if not cls.is_partitioned(db):
+                return super(ReadonlyTable, cls).build_indices(db)
+            part_names = cls.get_partition_names(db)
+
+        if sum(bool(index.cluster) for index in cls._indices) > 1:
+            raise DbIndexError("Only one index may be clustered at a time.")
+
+        full_name = cls.full_name(force_schema=True)
+        schema = cls.get_schema('public')
+        for index in cls._indices:
+            logger.info("Building index: %s" % index.name)
+            with connection_slots:
+                cls.execute(db, f"CREATE INDEX IF NOT EXISTS {index.name} "
+                                f"ON ONLY {full_name} "
+                                f"USING {index.definition};")
+
+        def build_partition_indices(part_num, part_name):
+            for index in cls._indices:
+                part_index = f'{index.name}_part{part_num}'
+                sql = (f"CREATE INDEX IF NOT EXISTS {part_index} "
+                       f"ON {part_name} USING {index.definition};\n"
+                       f"ALTER INDEX {schema}.{index.name} "
+                       f"ATTACH PARTITION {schema}.{part_index};")
+                if index.cluster:
+                    sql += f"\nCLUSTER {part_name} USING {part_index};"
+                with connection_slots:
+                    cls.execute(db, sql)
+
+        with ThreadPoolExecutor(max_workers) as executor:
+            futures = [executor.submit(build_partition_indices, i, part_name)
+                       for i, part_name in enumerate(part_names)]
+            for future in futures:
+                future.result()
+        return
+
     @classmethod
     def get_definition(cls):
         return cls.__definition__
@@ -175,20 +321,126 @@ class ReadonlyTable(IndraDBTable):
     def definition(cls, db):
         return cls.get_definition()
 
+    @classmethod
+    def _get_definition_template(cls):
+        return cls.get_definition()
+
+    @classmethod
+    def get_active_column_names(cls, db):
+        """Get the names of the columns of this table in the database."""
+        with db.get_conn() as conn:
+            cols = inspect(conn).get_columns(cls.__tablename__,
+                                             schema=cls.get_schema())
+        return [col['name'] for col in cols]
+
+    @classmethod
+    def refresh_definition(cls, db, cols='*'):
+        """Get the definition restricted to the rows being refreshed."""
+        key = cls._refresh_key
+        return (f"SELECT {cols} FROM (\n{cls.definition(db)}\n) AS refreshed\n"
+                f"WHERE refreshed.{key} IN {_refresh_keys_sql(key)}")
+
+    @classmethod
+    def refresh(cls, db, execute=True):
+        """Recompute the rows of this table for a set of statements.
+
+        A temp table is created with only those rows. For any other table,
+        the existing rows are deleted and made again.
+
+        The keys of the rows to refresh must already be in the temp tables
+        named by `get_refresh_key_table`, on the copy connection of `db` (see
+        `PrincipalDatabaseManager.refresh_readonly`). The SQL is run on that
+        connection, and is not committed, so that all the tables are refreshed
+        in one transaction.
+
+        Parameters
+        ----------
+        db : PrincipalDatabaseManager
+            The database in which the readonly schema is being refreshed.
+        execute : bool
+            If True (default), execute the SQL.
+
+        Returns
+        -------
+        sql : str
+            The SQL that refreshes the table.
+        """
+        full_name = cls.full_name(force_schema=True)
+        if cls._temp:
+            sql = cls.__create_table_fmt__ \
+                % (full_name, cls.refresh_definition(db))
+        else:
+            key = cls._refresh_key
+            cols = ', '.join(cls.get_active_column_names(db))
+            sql = (f"DELETE FROM {full_name}\n"
+                   f"WHERE {key} IN {_refresh_keys_sql(key)};\n"
+                   f"INSERT INTO {full_name} ({cols})\n"
+                   f"{cls.refresh_definition(db, cols)};")
+        if execute:
+            db.get_copy_cursor().execute(sql)
+        return sql
+
+    @classmethod
+    def get_dependencies(cls, tables):
+        """Get the names of the tables this table is built from.
+
+        Parameters
+        ----------
+        tables : dict
+            A dict of table classes keyed by name, such as the readonly tables
+            of a database manager.
+
+        Returns
+        -------
+        dependencies : set[str]
+            The names of the tables in `tables` that this table declares it is
+            built from in `_depends_on`.
+        """
+        return {name for name in cls._depends_on if name in tables}
+
+    @classmethod
+    def find_referenced_tables(cls, tables):
+        """Find the tables named in the definition of this table.
+
+        This is used to check that `_depends_on` is complete.
+
+        Parameters
+        ----------
+        tables : dict
+            A dict of table classes keyed by name, such as the readonly tables
+            of a database manager.
+
+        Returns
+        -------
+        referenced : set[str]
+            The names of the tables in `tables` that are referenced by the
+            definition of this table, not including this table.
+        """
+        sql = cls._get_definition_template()
+        return {name for name, tbl in tables.items()
+                if tbl is not cls
+                and re.search(r'(?<![\w.])' + re.escape(tbl.full_name())
+                              + r'(?!\w)', sql)}
+
 
 class SpecialColumnTable(ReadonlyTable):
+    _uses_session = True
 
     @classmethod
     def create(cls, db, commit=True):
         cls.__definition__ = cls.definition(db)
-        sql = cls.__create_table_fmt__ \
-            % (cls.full_name(force_schema=True),
-               cls.__definition__)
+        sql = cls._get_create_sql(db, cls.__definition__)
         if commit:
             cls.execute(db, sql)
         cls.loaded = True
         return sql
 
+    @classmethod
+    def _get_definition_template(cls):
+        # The full definition can only be made once the tables it is built
+        # from exist, but the template names the same tables.
+        return cls.__definition_fmt__
+
     @classmethod
     def load_cols(cls, engine, cols=None):
         if cls.loaded:
@@ -3,7 +3,7 @@ __all__ = ['get_schema', 'foreign_key_map']
 import logging
 
 from sqlalchemy import Column, Integer, String, UniqueConstraint, ForeignKey, \
-     Boolean, DateTime, func, BigInteger, or_, tuple_
+     Boolean, DateTime, func, BigInteger, Float, or_, tuple_
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import BYTEA, INET, JSONB
 
@@ -491,6 +491,29 @@ def get_schema(Base):
         stmt_type = Column(String)
     table_dict[PreassemblyUpdates.__tablename__] = PreassemblyUpdates
 
+    class ReadonlyBuildLedger(Base, IndraDBTable):
+        __tablename__ = 'readonly_build_ledger'
+        _always_disp = ['build_id', 'table_name']
+        id = Column(Integer, primary_key=True)
+        build_id = Column(String(40), nullable=False)
+        table_name = Column(String(250), nullable=False)
+        start_time = Column(DateTime, nullable=False)
+        end_time = Column(DateTime, nullable=False)
+        index_time = Column(Float)
+        num_rows = Column(BigInteger)
+        table_size = Column(BigInteger)
+        index_size = Column(BigInteger)
+    table_dict[ReadonlyBuildLedger.__tablename__] = ReadonlyBuildLedger
+
+    class JsonDictionary(Base, IndraDBTable):
+        __tablename__ = 'json_dictionary'
+        _skip_disp = ['dictionary']
+        _always_disp = ['id', 'create_date']
+        id = Column(Integer, primary_key=True)
+        dictionary = Column(BYTEA, nullable=False)
+        create_date = Column(DateTime, default=func.now())
+    table_dict[JsonDictionary.__tablename__] = JsonDictionary
+
     class PAStatements(Base, IndraDBTable):
         __tablename__ = 'pa_statements'
         _skip_disp = ['json']
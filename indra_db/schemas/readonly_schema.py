@@ -9,7 +9,7 @@ from sqlalchemy.dialects.postgresql import BYTEA, JSON, JSONB, REAL
 from indra.statements import get_all_descendants, Statement
 
 from .mixins import ReadonlyTable, NamespaceLookup, SpecialColumnTable, \
-    IndraDBTable
+    IndraDBTable, _refresh_keys_sql
 from .indexes import *
 
 
@@ -92,6 +92,39 @@ class RoleMapping(StringIntMapping):
 ro_role_map = RoleMapping()
 
 
+def get_mesh_term_closure():
+    """Get the ancestor-descendant pairs of the MeSH term hierarchy.
+
+    The hierarchy is given by the tree numbers of each MeSH term (D IDs), as
+    loaded by INDRA's MeSH client: a term is an ancestor of another if one
+    of its tree numbers is a prefix of one of the other's. Each term is also
+    paired with itself, so that joining through the closure keeps the terms
+    themselves.
+
+    Returns
+    -------
+    closure : set[tuple]
+        A set of (ancestor mesh_num, descendant mesh_num) pairs.
+    """
+    from indra.databases.mesh_client import mesh_id_to_tree_numbers
+
+    tree_num_map = {}
+    for mesh_id, tree_nums in mesh_id_to_tree_numbers.items():
+        if mesh_id.startswith('D'):
+            for tree_num in tree_nums:
+                tree_num_map[tree_num] = int(mesh_id[1:])
+
+    closure = set()
+    for tree_num, mesh_num in tree_num_map.items():
+        closure.add((mesh_num, mesh_num))
+        parts = tree_num.split('.')
+        for i in range(1, len(parts)):
+            ancestor_num = tree_num_map.get('.'.join(parts[:i]))
+            if ancestor_num is not None:
+                closure.add((ancestor_num, mesh_num))
+    return closure
+
+
 def get_schema(Base):
     """Return the schema for the reading view of the database.
 
@@ -102,8 +135,9 @@ def get_schema(Base):
     through sqlalchemy: instead they are generated and updated manually
     (or by other non-sqlalchemy scripts).
 
-    Before building these tables, the `belief` table must already have been
-    loaded into the readonly database.
+    Before building these tables, the `belief`, `mesh_term_closure`, and
+    `stmt_json_dictionary` tables must already have been loaded into the
+    readonly database.
 
     The following views must be built in this specific order (_temp_):
       1. raw_stmt_src
@@ -147,9 +181,29 @@ def get_schema(Base):
         belief = Column(REAL)
     ro_tables[Belief.__tablename__] = Belief
 
+    class MeshTermClosure(Base, IndraDBTable):
+        __tablename__ = 'mesh_term_closure'
+        __table_args__ = {'schema': 'readonly'}
+        _indices = [BtreeIndex('mtc_ancestor_num_idx', 'ancestor_num'),
+                    BtreeIndex('mtc_descendant_num_idx', 'descendant_num')]
+        _temp = False
+        ancestor_num = Column(Integer, primary_key=True)
+        descendant_num = Column(Integer, primary_key=True)
+    ro_tables[MeshTermClosure.__tablename__] = MeshTermClosure
+
+    class StmtJsonDictionary(Base, IndraDBTable):
+        __tablename__ = 'stmt_json_dictionary'
+        __table_args__ = {'schema': 'readonly'}
+        _skip_disp = ['dictionary']
+        _temp = False
+        id = Column(Integer, primary_key=True)
+        dictionary = Column(BYTEA, nullable=False)
+    ro_tables[StmtJsonDictionary.__tablename__] = StmtJsonDictionary
+
     class EvidenceCounts(Base, ReadonlyTable):
         __tablename__ = 'evidence_counts'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('fast_raw_pa_link',)
         __definition__ = ('SELECT count(id) AS ev_count, mk_hash '
                           'FROM readonly.fast_raw_pa_link '
                           'GROUP BY mk_hash')
@@ -179,6 +233,7 @@ def get_schema(Base):
                     StringIndex('rrl_manuscript_id_idx', 'manuscript_id'),
                     BtreeIndex('rrl_tcid_idx', 'tcid'),
                     BtreeIndex('rrl_trid_idx', 'trid')]
+        _refresh_key = 'rid'
         trid = Column(Integer)
         pmid = Column(String(20))
         pmid_num = Column(Integer)
@@ -200,6 +255,7 @@ def get_schema(Base):
     class FastRawPaLink(Base, ReadonlyTable):
         __tablename__ = 'fast_raw_pa_link'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('raw_stmt_src',)
         __definition__ = ('WITH %s\n'
                           'SELECT raw.id AS id,\n'
                           '       raw.json AS raw_json,\n'
@@ -223,6 +279,7 @@ def get_schema(Base):
                     BtreeIndex('frp_reading_id_idx', 'reading_id'),
                     BtreeIndex('frp_db_info_id_idx', 'db_info_id'),
                     StringIndex('frp_src_idx', 'src')]
+        _partition_col = 'mk_hash'
 
         @classmethod
         def get_definition(cls):
@@ -262,6 +319,8 @@ def get_schema(Base):
                           'WHERE db_info.id = raw_statements.db_info_id')
         _indices = [BtreeIndex('raw_stmt_src_sid_idx', 'sid'),
                     StringIndex('raw_stmt_src_src_idx', 'src')]
+        _refresh_key = 'sid'
+        _partition_col = 'sid'
         sid = Column(Integer, primary_key=True)
         src = Column(String)
     ro_tables[RawStmtSrc.__tablename__] = RawStmtSrc
@@ -269,9 +328,10 @@ def get_schema(Base):
     class _PaStmtSrc(Base, SpecialColumnTable):
         __tablename__ = 'pa_stmt_src'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('raw_stmt_src', 'fast_raw_pa_link')
         __definition_fmt__ = ("SELECT * FROM crosstab("
                               "'SELECT mk_hash, src, count(id) "
-                              "  FROM readonly.fast_raw_pa_link "
+                              "  FROM readonly.fast_raw_pa_link %s"
                               "  GROUP BY (mk_hash, src)', "
                               "$$SELECT unnest('{%s}'::text[])$$"
                               " ) final_result(mk_hash bigint, %s)")
@@ -283,6 +343,20 @@ def get_schema(Base):
 
         @classmethod
         def definition(cls, db):
+            return cls._make_definition(db)
+
+        @classmethod
+        def refresh_definition(cls, db, cols='*'):
+            # The rows must be restricted inside the crosstab, where the
+            # planner can use them.
+            where_clause = f"WHERE mk_hash IN {_refresh_keys_sql('mk_hash')}"
+            sql = cls._make_definition(db, where_clause)
+            if cols != '*':
+                sql = f"SELECT {cols} FROM ({sql}) AS refreshed"
+            return sql
+
+        @classmethod
+        def _make_definition(cls, db, where_clause=''):
             db.grab_session()
 
             # Make sure the necessary extension is installed.
@@ -300,7 +374,7 @@ def get_schema(Base):
                     setattr(cls, src, Column(BigInteger))
                 cols.append(src)
                 entries.append('%s bigint' % src)
-            sql = cls.__definition_fmt__ % (', '.join(cols),
+            sql = cls.__definition_fmt__ % (where_clause, ', '.join(cols),
                                             ', '.join(entries))
             return sql
 
@@ -316,6 +390,7 @@ def get_schema(Base):
     class _PaRefLink(Base, ReadonlyTable):
         __tablename__ = 'pa_ref_link'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('fast_raw_pa_link', 'reading_ref_link')
         __definition__ = ('SELECT mk_hash, trid, pmid_num, pmcid_num, source,\n'
                           '       reader\n'
                           'FROM readonly.fast_raw_pa_link\n'
@@ -343,6 +418,7 @@ def get_schema(Base):
                           '  WHERE NOT is_concept')
         _temp = True
         _indices = [BtreeIndex('mt_pmid_num_idx', 'pmid_num')]
+        _refresh_key = 'pmid_num'
         mesh_num = Column(Integer, primary_key=True)
         pmid_num = Column(Integer, primary_key=True)
     ro_tables[_MeshTerms.__tablename__] = _MeshTerms
@@ -357,6 +433,7 @@ def get_schema(Base):
                           '  WHERE is_concept IS true')
         _temp = True
         _indices = [BtreeIndex('mc_pmid_num_idx', 'pmid_num')]
+        _refresh_key = 'pmid_num'
         mesh_num = Column(Integer, primary_key=True)
         pmid_num = Column(Integer, primary_key=True)
     ro_tables[_MeshConcepts.__tablename__] = _MeshConcepts
@@ -364,6 +441,7 @@ def get_schema(Base):
     class _HashPmidCounts(Base, ReadonlyTable):
         __tablename__ = 'hash_pmid_counts'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('pa_ref_link',)
         __definition__ = ('SELECT mk_hash,\n'
                           '       count(distinct pmid_num)::integer as pmid_count\n'
                           'FROM readonly.pa_ref_link GROUP BY mk_hash')
@@ -376,6 +454,7 @@ def get_schema(Base):
     class MeshTermRefCounts(Base, ReadonlyTable):
         __tablename__ = 'mesh_term_ref_counts'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('mesh_terms', 'pa_ref_link', 'hash_pmid_counts')
         __definition__ = ('WITH mesh_hash_pmids AS (\n'
                           '    SELECT readonly.mesh_terms.pmid_num, mk_hash,\n'
                           '           mesh_num\n'
@@ -401,6 +480,7 @@ def get_schema(Base):
     class MeshConceptRefCounts(Base, ReadonlyTable):
         __tablename__ = 'mesh_concept_ref_counts'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('mesh_concepts', 'pa_ref_link', 'hash_pmid_counts')
         __definition__ = ('WITH mesh_hash_pmids AS (\n'
                           '    SELECT readonly.mesh_concepts.pmid_num, mk_hash,\n'
                           '           mesh_num\n'
@@ -426,6 +506,7 @@ def get_schema(Base):
     class RawStmtMeshTerms(Base, ReadonlyTable):
         __tablename__ = 'raw_stmt_mesh_terms'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('mesh_terms',)
         __definition__ = ('SELECT DISTINCT raw_statements.id as sid,\n'
                           '       mesh_num\n'
                           'FROM text_ref\n'
@@ -437,6 +518,7 @@ def get_schema(Base):
                           '  JOIN raw_statements ON reading.id = reading_id\n')
         _indices = [BtreeIndex('rsmd_mesh_num_idx', 'mesh_num'),
                     BtreeIndex('rsmd_sid_idx', 'sid')]
+        _refresh_key = 'sid'
 
         sid = Column(Integer, primary_key=True)
         mesh_num = Column(Integer, primary_key=True)
@@ -445,6 +527,7 @@ def get_schema(Base):
     class RawStmtMeshConcepts(Base, ReadonlyTable):
         __tablename__ = 'raw_stmt_mesh_concepts'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('mesh_concepts',)
         __definition__ = ('SELECT DISTINCT raw_statements.id as sid,\n'
                           '       mesh_num\n'
                           'FROM text_ref\n'
@@ -456,6 +539,7 @@ def get_schema(Base):
                           '  JOIN raw_statements ON reading.id = reading_id\n')
         _indices = [BtreeIndex('rsmc_mesh_num_idx', 'mesh_num'),
                     BtreeIndex('rsmc_sid_idx', 'sid')]
+        _refresh_key = 'sid'
 
         sid = Column(Integer, primary_key=True)
         mesh_num = Column(Integer, primary_key=True)
@@ -464,6 +548,7 @@ def get_schema(Base):
     class _PaMeta(Base, ReadonlyTable):
         __tablename__ = 'pa_meta'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('pa_agent_counts', 'evidence_counts')
         __definition__ = (
             'SELECT pa_agents.db_name, pa_agents.db_id,\n'
             '       pa_agents.id AS ag_id, role_num, pa_agents.ag_num,\n'
@@ -485,6 +570,7 @@ def get_schema(Base):
         _temp = True
         _indices = [StringIndex('pa_meta_db_name_idx', 'db_name'),
                     BtreeIndex('pa_meta_hash_idx', 'mk_hash')]
+        _partition_col = 'mk_hash'
         ag_id = Column(Integer, primary_key=True)
         ag_num = Column(Integer)
         db_name = Column(String)
@@ -501,11 +587,25 @@ def get_schema(Base):
 
         @classmethod
         def create(cls, db, commit=True):
-            sql = cls.__create_table_fmt__ \
-                  % (cls.full_name(force_schema=True),
-                     cls.get_definition())
+            sql = cls._get_create_sql(db, cls.get_definition())
             sql += '\n'
-            sql += (f'INSERT INTO readonly.pa_meta \n'
+            sql += cls._get_complex_dup_sql()
+            if commit:
+                cls.execute(db, sql)
+            return sql
+
+        @classmethod
+        def refresh(cls, db, execute=True):
+            sql = super(_PaMeta, cls).refresh(db, execute=False)
+            sql += '\n'
+            sql += cls._get_complex_dup_sql()
+            if execute:
+                db.get_copy_cursor().execute(sql)
+            return sql
+
+        @staticmethod
+        def _get_complex_dup_sql():
+            return (f'INSERT INTO readonly.pa_meta \n'
                     f'SELECT db_name, db_id, ag_id,\n '
                     f'  generate_series(-1, 1, 2) AS role_num,\n'
                     f'  generate_series(0, 1) AS ag_num,\n'
@@ -513,9 +613,6 @@ def get_schema(Base):
                     f'  is_active, agent_count, true AS is_complex_dup\n'
                     f'FROM readonly.pa_meta\n'
                     f'WHERE type_num = {ro_type_map.get_int("Complex")}\n')
-            if commit:
-                cls.execute(db, sql)
-            return sql
 
         @classmethod
         def get_definition(cls):
@@ -529,6 +626,7 @@ def get_schema(Base):
     class SourceMeta(Base, SpecialColumnTable):
         __tablename__ = 'source_meta'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('pa_stmt_src', 'name_meta')
         __definition_fmt__ = (
             'WITH jsonified AS (\n'
             '    SELECT mk_hash, \n'
@@ -585,7 +683,11 @@ def get_schema(Base):
                     StringIndex('source_meta_only_src_idx', 'only_src'),
                     StringIndex('source_meta_activity_idx', 'activity'),
                     BtreeIndex('source_meta_type_num_idx', 'type_num'),
-                    BtreeIndex('source_meta_num_srcs_idx', 'num_srcs')]
+                    BtreeIndex('source_meta_num_srcs_idx', 'num_srcs'),
+                    BtreeIndex('source_meta_ev_count_seek_idx',
+                               'ev_count, mk_hash'),
+                    BtreeIndex('source_meta_belief_seek_idx',
+                               'belief, mk_hash')]
         loaded = False
 
         mk_hash = Column(BigInteger, primary_key=True)
@@ -620,11 +722,16 @@ def get_schema(Base):
     class TextMeta(Base, NamespaceLookup):
         __tablename__ = 'text_meta'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('pa_meta',)
         __dbname__ = 'TEXT'
         _indices = [StringIndex('text_meta_db_id_idx', 'db_id'),
                     BtreeIndex('text_meta_type_num_idx', 'type_num'),
                     StringIndex('text_meta_activity_idx', 'activity'),
-                    BtreeIndex('text_meta_mk_hash_idx', 'mk_hash')]
+                    BtreeIndex('text_meta_mk_hash_idx', 'mk_hash'),
+                    BtreeIndex('text_meta_ev_count_seek_idx',
+                               'db_id, ev_count, mk_hash'),
+                    BtreeIndex('text_meta_belief_seek_idx',
+                               'db_id, belief, mk_hash')]
         ag_id = Column(Integer, primary_key=True)
         ag_num = Column(Integer)
         db_id = Column(String)
@@ -642,11 +749,17 @@ def get_schema(Base):
     class NameMeta(Base, NamespaceLookup):
         __tablename__ = 'name_meta'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('pa_meta',)
         __dbname__ = 'NAME'
         _indices = [StringIndex('name_meta_db_id_idx', 'db_id'),
                     BtreeIndex('name_meta_type_num_idx', 'type_num'),
                     StringIndex('name_meta_activity_idx', 'activity'),
-                    BtreeIndex('name_meta_mk_hash_idx', 'mk_hash')]
+                    BtreeIndex('name_meta_mk_hash_idx', 'mk_hash'),
+                    BtreeIndex('name_meta_ev_count_seek_idx',
+                               'db_id, ev_count, mk_hash'),
+                    BtreeIndex('name_meta_belief_seek_idx',
+                               'db_id, belief, mk_hash')]
+        _partition_col = 'mk_hash'
         ag_id = Column(Integer, primary_key=True)
         ag_num = Column(Integer)
         db_id = Column(String)
@@ -664,6 +777,7 @@ def get_schema(Base):
     class OtherMeta(Base, ReadonlyTable):
         __tablename__ = 'other_meta'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('pa_meta',)
         __definition__ = ("SELECT db_name, db_id, ag_id, role_num, ag_num,\n"
                           "       type_num, mk_hash, ev_count, belief,\n"
                           "       activity, is_active, agent_count,\n"
@@ -674,7 +788,11 @@ def get_schema(Base):
                     BtreeIndex('other_meta_type_num_idx', 'type_num'),
                     StringIndex('other_meta_db_name_idx', 'db_name'),
                     StringIndex('other_meta_activity_idx', 'activity'),
-                    BtreeIndex('other_meta_mk_hash_idx', 'mk_hash')]
+                    BtreeIndex('other_meta_mk_hash_idx', 'mk_hash'),
+                    BtreeIndex('other_meta_ev_count_seek_idx',
+                               'db_id, ev_count, mk_hash'),
+                    BtreeIndex('other_meta_belief_seek_idx',
+                               'db_id, belief, mk_hash')]
         ag_id = Column(Integer, primary_key=True)
         ag_num = Column(Integer)
         db_name = Column(String)
@@ -693,6 +811,7 @@ def get_schema(Base):
     class MeshTermMeta(Base, ReadonlyTable):
         __tablename__ = 'mesh_term_meta'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('raw_stmt_mesh_terms', 'source_meta')
         __definition__ = ("SELECT DISTINCT meta.mk_hash, meta.ev_count,\n"
                           "       meta.belief, mesh_num, type_num, activity,\n"
                           "       is_active, agent_count\n"
@@ -720,6 +839,7 @@ def get_schema(Base):
     class MeshConceptMeta(Base, ReadonlyTable):
         __tablename__ = 'mesh_concept_meta'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('raw_stmt_mesh_concepts', 'source_meta')
         __definition__ = ("SELECT DISTINCT meta.mk_hash, meta.ev_count,\n"
                           "       meta.belief, mesh_num, type_num, activity,\n"
                           "       is_active, agent_count\n"
@@ -746,6 +866,7 @@ def get_schema(Base):
     class AgentInteractions(Base, ReadonlyTable):
         __tablename__ = 'agent_interactions'
         __table_args__ = {'schema': 'readonly'}
+        _depends_on = ('name_meta', 'source_meta')
         __definition__ = ("SELECT\n" 
                           "  low_level_names.mk_hash AS mk_hash, \n"
                           "  jsonb_object(\n"
@@ -799,31 +920,58 @@ def get_schema(Base):
                     BtreeIndex('agent_interactions_type_num_idx', 'type_num')]
         _always_disp = ['mk_hash', 'agent_json']
 
+        _uses_session = True
+
         @classmethod
         def create(cls, db, commit=True):
             super(AgentInteractions, cls).create(db, commit)
+            cls._add_complex_dups(db)
+            return
+
+        @classmethod
+        def refresh(cls, db, execute=True):
+            sql = super(AgentInteractions, cls).refresh(db, execute)
+            if execute:
+                cls._add_complex_dups(db, refresh=True)
+            return sql
+
+        @classmethod
+        def _add_complex_dups(cls, db, refresh=False):
+            """Add the rows of each pair of agents in complexes.
+
+            The rows are read and written on the copy connection, so when
+            refreshing, only the complexes being refreshed are used, and the
+            new rows are committed with the rest of the refresh.
+            """
             from itertools import permutations
-            interactions = db.select_all(
-                db.AgentInteractions,
-                db.AgentInteractions.type_num == ro_type_map.get_int('Complex')
-            )
+            sql = ("SELECT mk_hash, ev_count, belief, type_num, agent_count,\n"
+                   "       agent_json, src_json\n"
+                   "FROM readonly.agent_interactions\n"
+                   "WHERE type_num = %d" % ro_type_map.get_int('Complex'))
+            if refresh:
+                sql += f"\n  AND mk_hash IN {_refresh_keys_sql('mk_hash')}"
+            cursor = db.get_copy_cursor()
+            cursor.execute(sql)
             new_interactions = []
-            for interaction in interactions:
-                if interaction.agent_count < 2:
+            for mk_hash, ev_count, belief, type_num, agent_count, agent_json, \
+                    src_json in cursor.fetchall():
+                if agent_count < 2:
                     continue
-                for pair in permutations(interaction.agent_json, 2):
-                    if interaction.agent_count == 2 and pair == ('0', '1'):
+                for pair in permutations(agent_json, 2):
+                    if agent_count == 2 and pair == ('0', '1'):
                         continue
-                    new_agent_json = {str(i): interaction.agent_json[j]
+                    new_agent_json = {str(i): agent_json[j]
                                       for i, j in enumerate(pair)}
                     new_interactions.append(
-                        (interaction.mk_hash, interaction.ev_count,
-                         interaction.belief, interaction.type_num, 2,
-                         new_agent_json, interaction.src_json, True)
+                        (mk_hash, ev_count, belief, type_num, 2,
+                         new_agent_json, src_json, True)
                     )
             db.copy('readonly.agent_interactions', new_interactions,
                     ('mk_hash', 'ev_count', 'belief', 'type_num', 'agent_count',
-                     'agent_json', 'src_json', 'is_complex_dup'))
+                     'agent_json', 'src_json', 'is_complex_dup'),
+                    commit=not refresh)
+            if not refresh:
+                db.commit_copy("Failed to add the complex pairs.")
             return
 
         mk_hash = Column(BigInteger, primary_key=True)
@@ -3,6 +3,8 @@ import random
 from collections import defaultdict
 from itertools import combinations, permutations, product
 
+from nose import SkipTest
+
 from indra.statements import Agent, get_statement_by_name, get_all_descendants, \
     Complex
 from indra_db.client.readonly.query import QueryResult
@@ -10,6 +12,8 @@ from indra_db.schemas.readonly_schema import ro_type_map, ro_role_map, \
     SOURCE_GROUPS
 from indra_db.util import extract_agent_data, get_ro
 from indra_db.client.readonly.query import *
+from indra_db.client.readonly.cache import *
+from indra_db.client.readonly import bitmap
 
 from indra_db.tests.util import get_temp_db
 
@@ -315,6 +319,26 @@ def test_from_papers():
                for s in res.statements())
 
 
+def test_paper_id_resolver():
+    import os
+    from tempfile import TemporaryDirectory
+    from indra_db.util import PaperIdResolver, make_paper_id_snapshot
+    ro = get_ro('primary')
+    papers = [('pmid', '27014235'), ('pmid', 'not-a-pmid')]
+    resolver = PaperIdResolver()
+    trid_dict = resolver.get_trids(ro, papers)
+    assert trid_dict[papers[0]]
+    assert trid_dict[papers[1]] == []
+    assert resolver.get_trids(ro, papers) == trid_dict
+
+    with TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, 'paper_ids.sqlite')
+        make_paper_id_snapshot(ro, snapshot_path)
+        snap_resolver = PaperIdResolver(snapshot_path=snapshot_path)
+        assert snap_resolver.get_trids(None, papers[:1]) \
+            == {papers[0]: trid_dict[papers[0]]}
+
+
 def test_has_num_agents():
     ro = get_ro('primary')
     q = HasNumAgents((1, 2))
@@ -368,6 +392,43 @@ def test_from_mesh():
     assert all(1943 in mn_list for mn_list in mm_dict.values())
 
 
+def test_from_mesh_descendants():
+    ro = get_ro('primary')
+    q = FromMeshIds(['D001943'])
+    q_desc = FromMeshIds(['D001943'], include_descendants=True)
+    assert Query.from_json(q_desc.to_json()).include_descendants
+    assert q.to_json() != q_desc.to_json()
+    assert (q_desc | FromMeshIds(['D009369'], include_descendants=True))\
+        .include_descendants
+
+    hashes = q.get_hashes(ro).results
+    desc_hashes = q_desc.get_hashes(ro).results
+    assert hashes <= desc_hashes
+
+    # Every term found must be the term given or one of its descendants.
+    res = q_desc.get_statements(ro, limit=5, ev_limit=8)
+    desc_nums = {n for n, in ro.select_all(
+        ro.MeshTermClosure.descendant_num,
+        ro.MeshTermClosure.ancestor_num == 1943
+    )}
+    assert 1943 in desc_nums
+    mm_entries = ro.select_all([ro.MeshTermMeta.mk_hash,
+                                ro.MeshTermMeta.mesh_num],
+                               ro.MeshTermMeta.mk_hash.in_(set(res.results)))
+    mm_dict = defaultdict(set)
+    for h, mn in mm_entries:
+        mm_dict[h].add(mn)
+    assert all(mn_set & desc_nums for mn_set in mm_dict.values())
+
+    from indra_db.client.readonly.mesh_ref_counts import get_mesh_ref_counts
+    counts = get_mesh_ref_counts(['D001943'], ro=ro)
+    desc_counts = get_mesh_ref_counts(['D001943'], ro=ro,
+                                      include_descendants=True)
+    assert set(counts) <= set(desc_counts)
+    assert all(desc_counts[h]['D001943'] >= counts[h]['D001943']
+               for h in counts)
+
+
 def test_is_inverse_of_for_intersections():
     q = FromMeshIds(['D001943']) & HasAgent('MEK')
     nq = ~q
@@ -600,6 +661,22 @@ def test_get_agents():
     assert len(js['results']) == len(res.results)
 
 
+def test_get_agents_complex_dups():
+    ro = get_ro('primary')
+    query = HasAgent('TP53') & HasType(['Complex'])
+    res = query.get_agents(ro, limit=20, with_hashes=True)
+    complexes_seen = set()
+    for entry in res.results.values():
+        hashes = set(entry['hashes'])
+        assert not hashes <= complexes_seen, entry['id']
+        complexes_seen |= hashes
+    assert complexes_seen == res.complexes_covered
+
+    first = query.get_agents(ro, limit=10)
+    second = query.get_agents(ro, limit=10, offset=first.next_offset)
+    assert set(first.results) | set(second.results) == set(res.results)
+
+
 def test_evidence_filtering_has_only_source():
     ro = get_ro('primary')
     q1 = HasAgent('TP53')
@@ -701,6 +778,21 @@ def test_evidence_filtering_pairs():
         query.get_statements(ro, limit=2, ev_limit=5, evidence_filter=ev_filter)
 
 
+def test_evidence_filtering_prefilter():
+    ro = get_ro('primary')
+    query = HasAgent('TP53')
+    ev_filter = FromMeshIds(['D001943']).ev_filter()
+    res = query.get_statements(ro, limit=10, ev_limit=5,
+                               evidence_filter=ev_filter,
+                               prefilter_evidence=True)
+    assert len(res.results) == 10, len(res.results)
+    assert all(s['evidence'] for s in res.results.values())
+
+    # The page should be the same as that of the pre-filtered query.
+    mesh_res = (query & FromMeshIds(['D001943'])).get_hashes(ro, limit=10)
+    assert set(res.results.keys()) == mesh_res.results
+
+
 def test_evidence_filtering_trios():
     ro = get_ro('primary')
     q1 = HasAgent('TP53')
@@ -850,3 +942,538 @@ def test_belief_sorting_intersection():
 def test_belief_sorting_union():
     q = HasAgent('MEK', namespace='NAME') | HasAgent('MAP2K1', namespace='NAME')
     _check_belief_sorted_result(q)
+
+
+def test_iter_statements():
+    ro = get_ro('primary')
+    query = HasAgent('TP53') - HasOnlySource('medscan')
+    res = query.get_statements(ro, limit=20, ev_limit=5)
+    stmt_jsons = list(query.iter_statements(ro, limit=20, ev_limit=5,
+                                            chunk_size=7))
+    assert len(stmt_jsons) == len(res.results)
+    assert sorted(len(sj['evidence']) for sj in stmt_jsons) \
+        == sorted(len(sj['evidence']) for sj in res.results.values())
+    assert all(len(sj['evidence']) <= 5 for sj in stmt_jsons)
+
+
+def test_page_token_paging():
+    ro = get_ro('primary')
+    query = HasAgent('TP53') - HasOnlySource('medscan')
+    for sort_by in ['ev_count', 'belief']:
+        res = query.get_hashes(ro, limit=20, sort_by=sort_by)
+        first = query.get_hashes(ro, limit=10, sort_by=sort_by)
+        assert first.next_page_token is not None
+        second = query.get_hashes(ro, limit=10, sort_by=sort_by,
+                                  page_token=first.next_page_token)
+        assert not first.results & second.results
+        assert first.results | second.results == res.results
+
+        stmt_res = query.get_statements(ro, limit=10, ev_limit=2,
+                                        sort_by=sort_by,
+                                        page_token=first.next_page_token)
+        assert set(stmt_res.results.keys()) == second.results
+        assert stmt_res.next_page_token == second.next_page_token
+
+    res = query.get_agents(ro, limit=20)
+    first = query.get_agents(ro, limit=10)
+    second = query.get_agents(ro, limit=10,
+                              complexes_covered=first.complexes_covered,
+                              page_token=first.next_page_token)
+    assert not set(first.results) & set(second.results)
+    assert set(first.results) | set(second.results) == set(res.results)
+
+
+def test_page_token_with_dropped_statements():
+    ro = get_ro('primary')
+    query = HasAgent('TP53')
+    ev_filter = HasOnlySource('signor').ev_filter()
+    all_hashes = query.get_hashes(ro, limit=200).results
+    assert len(all_hashes) > 20
+
+    # Statements with no evidence passing the filter are dropped, but the
+    # pages carry on to the end of the hashes.
+    for ev_limit in [None, 2]:
+        seen = set()
+        page_token = None
+        for _ in range(20):
+            page = query.get_statements(ro, limit=10, ev_limit=ev_limit,
+                                        evidence_filter=ev_filter,
+                                        page_token=page_token)
+            assert not seen & set(page.results)
+            seen |= set(page.results)
+            page_token = page.next_page_token
+            if page_token is None:
+                break
+        expected = query.get_statements(ro, limit=200, ev_limit=ev_limit,
+                                        evidence_filter=ev_filter)
+        assert seen == set(expected.results), ev_limit
+
+
+def test_agent_page_token_paging():
+    ro = get_ro('primary')
+    query = HasAgent('MEK', namespace='NAME')
+    for sort_by in ['ev_count', 'belief']:
+        res = query.get_agents(ro, limit=28, sort_by=sort_by)
+        seen = []
+        page_token = None
+        covered = None
+        for _ in range(4):
+            page = query.get_agents(ro, limit=7, sort_by=sort_by,
+                                    complexes_covered=covered,
+                                    page_token=page_token)
+            seen.extend(page.results)
+            covered = page.complexes_covered
+            page_token = page.next_page_token
+            if page_token is None:
+                break
+        assert len(seen) == len(set(seen)), sort_by
+        assert set(seen) == set(res.results), sort_by
+
+
+def test_query_cache():
+    ro = get_ro('primary')
+    query = HasAgent('TP53') & HasOnlySource('signor')
+    same_query = HasOnlySource('signor') & HasAgent('TP53')
+    cache = MemoryQueryCache()
+    set_query_cache(cache)
+    try:
+        res = query.get_statements(ro, limit=10, ev_limit=2)
+        assert len(cache._cache) == 1
+        cached_res = same_query.get_statements(ro, limit=10, ev_limit=2)
+        assert len(cache._cache) == 1
+        assert cached_res.results == res.results
+        assert cached_res.query_json == same_query.to_json()
+
+        # A different limit is a different result.
+        query.get_statements(ro, limit=5, ev_limit=2)
+        assert len(cache._cache) == 2
+    finally:
+        set_query_cache(None)
+
+
+def test_build_version_ttl():
+    ro = get_ro('primary')
+    fetch = ro._ReadonlyDatabaseManager__fetch_build_version
+    fetches = []
+
+    def counted_fetch():
+        fetches.append(1)
+        return fetch()
+
+    ro._ReadonlyDatabaseManager__fetch_build_version = counted_fetch
+    set_query_cache(MemoryQueryCache())
+    try:
+        version = ro.get_build_version(max_age=0)
+        assert len(fetches) == 1
+
+        # Cache lookups within the TTL reuse the fetched version.
+        query = HasAgent('TP53') & HasOnlySource('signor')
+        for limit in [5, 10, 5]:
+            query.get_statements(ro, limit=limit, ev_limit=2)
+        assert len(fetches) == 1
+
+        assert ro.get_build_version(max_age=0) == version
+        assert len(fetches) == 2
+    finally:
+        set_query_cache(None)
+        del ro._ReadonlyDatabaseManager__fetch_build_version
+
+
+def test_disk_query_cache_eviction():
+    from tempfile import TemporaryDirectory
+    with TemporaryDirectory() as tmp_dir:
+        cache = DiskQueryCache(tmp_dir, max_bytes=2000)
+        for i in range(5):
+            cache.put(f'key{i}', QueryResult(set(range(100)), 100, None, 100,
+                                             {}, {}, {}, 'hashes'))
+        assert cache.get('key0') is None
+        assert cache.get('key4').results == set(range(100))
+        cache.clear()
+        assert cache.get('key4') is None
+
+
+def test_explain():
+    ro = get_ro('primary')
+    query = HasAgent('MEK', namespace='NAME') & HasOnlySource('signor')
+    explanation = query.explain(ro, limit=10, ev_limit=2)
+    json.dumps(explanation)
+    assert explanation['plan'] is not None
+    assert explanation['execution_ms'] is not None
+    components = explanation['hash_query']['components']
+    assert len(components) == len(query.queries)
+    assert all('execution_ms' in c for c in components)
+
+    explanation = query.explain(ro, analyze=False, result_type='hashes')
+    assert explanation['execution_ms'] is None
+    assert 'actual_rows' not in explanation['hash_query']
+
+    # Constraints with lists of values compile to expanding IN clauses.
+    hashes = list(HasAgent('TP53').get_hashes(ro, limit=10).results)
+    for list_query in [HasType(['Activation', 'Inhibition']),
+                       HasHash(hashes)]:
+        explanation = list_query.explain(ro, limit=10, ev_limit=2)
+        assert explanation['plan'] is not None, list_query
+
+
+def test_run_batch():
+    ro = get_ro('primary')
+    queries = [HasAgent('TP53'), HasAgent('MEK', namespace='NAME'),
+               HasHash([]), HasAgent('TP53') & HasOnlySource('signor')]
+
+    hash_results = run_batch(queries, ro, result_type='hashes', limit=10)
+    assert len(hash_results) == len(queries)
+    for query, res in zip(queries, hash_results):
+        assert res.results == query.get_hashes(ro, limit=10).results
+
+    stmt_results = run_batch(queries, ro, limit=10, ev_limit=2)
+    assert len(stmt_results) == len(queries)
+    for query, res in zip(queries, stmt_results):
+        assert isinstance(res, StatementQueryResult)
+        single_res = query.get_statements(ro, limit=10, ev_limit=2)
+        assert set(res.results) == set(single_res.results)
+        assert res.returned_evidence == single_res.returned_evidence
+
+
+def _run_async(coro):
+    """Run a coroutine in a new event loop (`asyncio.run` needs Python 3.7)."""
+    import asyncio
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_async_queries():
+    from indra_db.databases import WITH_ASYNC
+    if not WITH_ASYNC:
+        raise SkipTest("psycopg and psycopg_pool are not installed.")
+    import asyncio
+    ro = get_ro('primary')
+    queries = [HasAgent('TP53'), HasAgent('MEK', namespace='NAME')
+               & HasOnlySource('signor')]
+
+    async def run_all():
+        try:
+            stmt_results = await asyncio.gather(
+                *[q.get_statements_async(ro, limit=10, ev_limit=2)
+                  for q in queries]
+            )
+            hash_results = await asyncio.gather(
+                *[q.get_hashes_async(ro, limit=10) for q in queries]
+            )
+            agent_res = await queries[0].get_agents_async(ro, limit=5)
+        finally:
+            await ro.close_async_pool()
+        return stmt_results, hash_results, agent_res
+
+    stmt_results, hash_results, agent_res = _run_async(run_all())
+    for query, stmt_res, hash_res in zip(queries, stmt_results, hash_results):
+        assert set(stmt_res.results) \
+            == set(query.get_statements(ro, limit=10, ev_limit=2).results)
+        assert hash_res.results == query.get_hashes(ro, limit=10).results
+    assert set(agent_res.results) \
+        == set(queries[0].get_agents(ro, limit=5).results)
+
+
+def test_async_query_options():
+    from indra_db.databases import WITH_ASYNC
+    if not WITH_ASYNC:
+        raise SkipTest("psycopg and psycopg_pool are not installed.")
+    ro = get_ro('primary')
+    query = HasAgent('TP53') - HasOnlySource('medscan')
+
+    async def run_options():
+        try:
+            json_res = await query.get_statements_async(
+                ro, limit=10, ev_limit=2, json_in_sql=True, with_count=True
+            )
+            hash_res = await query.get_hashes_async(ro, limit=10,
+                                                    with_count=True)
+        finally:
+            await ro.close_async_pool()
+        return json_res, hash_res
+
+    # Each run has its own event loop, so each must get its own pool.
+    for _ in range(2):
+        json_res, hash_res = _run_async(run_options())
+        sync_json_res = query.get_statements(ro, limit=10, ev_limit=2,
+                                             json_in_sql=True, with_count=True)
+        assert json_res.results == sync_json_res.results
+        assert json_res.total_count == sync_json_res.total_count
+        sync_hash_res = query.get_hashes(ro, limit=10, with_count=True)
+        assert hash_res.results == sync_hash_res.results
+        assert hash_res.total_count == sync_hash_res.total_count
+
+
+def test_json_in_sql():
+    ro = get_ro('primary')
+    query = HasAgent('TP53') - HasOnlySource('medscan')
+    for ev_limit in [None, 0, 5]:
+        res = query.get_statements(ro, limit=10, ev_limit=ev_limit)
+        sql_res = query.get_statements(ro, limit=10, ev_limit=ev_limit,
+                                       json_in_sql=True)
+        assert set(sql_res.results) == set(res.results)
+        assert sql_res.returned_evidence == res.returned_evidence
+        assert sql_res.source_counts == res.source_counts
+        for mk_hash, stmt_json in res.results.items():
+            sql_stmt_json = sql_res.results[mk_hash]
+            ev_key = lambda ev: ev['annotations']['prior_uuids'][-1]
+            assert sorted(sql_stmt_json['evidence'], key=ev_key) \
+                == sorted(stmt_json['evidence'], key=ev_key)
+            assert {k: v for k, v in sql_stmt_json.items() if k != 'evidence'} \
+                == {k: v for k, v in stmt_json.items() if k != 'evidence'}
+
+
+def test_bitmap_index():
+    if not bitmap.WITH_ROARING:
+        raise SkipTest("pyroaring is not installed.")
+    ro = get_ro('primary')
+    index = bitmap.HashBitmapIndex(ro)
+    queries = [HasAgent('TP53') & HasType(['Phosphorylation']),
+               HasAgent('TP53') | HasAgent('MEK'),
+               HasAgent('TP53') - HasOnlySource('medscan'),
+               HasAgent('TP53') & ~HasType(['Inhibition'])]
+    for query in queries:
+        for sort_by in ['ev_count', 'belief']:
+            res = query.get_hashes(ro, limit=10, sort_by=sort_by)
+            bm_res = index.get_hashes(query, limit=10, sort_by=sort_by)
+            assert set(bm_res.results) == set(res.results), query
+            assert bm_res.next_page_token == res.next_page_token, query
+
+    query = queries[0]
+    res = query.get_statements(ro, limit=5, ev_limit=2)
+    bm_res = index.get_statements(query, limit=5, ev_limit=2)
+    assert set(bm_res.results) == set(res.results)
+    assert bm_res.returned_evidence == res.returned_evidence
+    assert bm_res.next_page_token == res.next_page_token
+
+    # The tokens page through the results as the SQL tokens do.
+    next_res = query.get_statements(ro, limit=5, ev_limit=2,
+                                    page_token=res.next_page_token)
+    bm_next_res = index.get_statements(query, limit=5, ev_limit=2,
+                                       page_token=bm_res.next_page_token)
+    assert set(bm_next_res.results) == set(next_res.results)
+    assert bm_next_res.next_page_token == next_res.next_page_token
+
+
+def test_compiled_sql_cache():
+    ro = get_ro('primary')
+    cache = CompiledSqlCache()
+    set_compiled_cache(cache)
+    try:
+        for agent in ['TP53', 'MEK', 'ERK']:
+            query = HasAgent(agent)
+            res = query.get_statements(ro, limit=5, ev_limit=2)
+            set_compiled_cache(None)
+            uncached_res = query.get_statements(ro, limit=5, ev_limit=2)
+            set_compiled_cache(cache)
+            assert res.results == uncached_res.results, agent
+        assert cache.misses == 1, cache.misses
+        assert cache.hits == 2, cache.hits
+    finally:
+        set_compiled_cache(None)
+
+
+def test_compiled_sql_cache_collisions():
+    from sqlalchemy import select, extract, func
+    db = get_temp_db()
+    tr = db.TextRef
+    pairs = [
+        (tr.pmid.like('1/_2', escape='/'), tr.pmid.like('1/_2')),
+        (tr.pmid_num.between(1, 5, symmetric=True),
+         tr.pmid_num.between(1, 5)),
+        (tr.pmid_num.op('&')(1) > 0, tr.pmid_num.op('|')(1) > 0),
+        (tr.pmid.collate('C') == 'a', tr.pmid == 'a'),
+        (extract('year', func.now()) > 0, extract('month', func.now()) > 0),
+    ]
+    selections = []
+    for clause_a, clause_b in pairs:
+        selections.append((select([tr.id]).where(clause_a),
+                           select([tr.id]).where(clause_b)))
+    selections.append((select([tr.id]).with_for_update(),
+                       select([tr.id])))
+    selections.append((select([tr.id]).distinct(tr.pmid),
+                       select([tr.id]).distinct(tr.pmcid)))
+
+    cache = CompiledSqlCache()
+    conn = db.session.connection()
+    for sel_a, sel_b in selections:
+        cache.clear()
+        cache.execute(conn, sel_a).fetchall()
+        cache.execute(conn, sel_b).fetchall()
+        sql_a = str(sel_a.compile(dialect=conn.dialect))
+        sql_b = str(sel_b.compile(dialect=conn.dialect))
+        assert sql_a != sql_b, sql_a
+        assert len(cache) == 2, sql_a
+        assert set(cache.get_compiled_sql()) == {sql_a, sql_b}, sql_a
+    db.session.rollback()
+
+
+def test_has_hash_array_binding():
+    ro = get_ro('primary')
+    hashes = HasAgent('TP53').get_hashes(ro, limit=1500).results
+    assert len(hashes) > HasHash.array_threshold, len(hashes)
+    query = HasHash(hashes)
+    res = query.get_hashes(ro)
+    assert res.results == hashes, len(res.results)
+
+    inv_query = HasAgent('TP53') & ~HasHash(list(hashes)[:1200])
+    res = inv_query.get_hashes(ro)
+    assert not res.results & set(list(hashes)[:1200])
+    assert set(list(hashes)[1200:]) <= res.results
+
+
+def test_grounder_cache():
+    import os
+    from tempfile import TemporaryDirectory
+    from indra_db.client.readonly.grounding import Grounder
+    grounder = Grounder()
+    res = grounder.ground_batch(['MEK', 'TP53', ' TP53 '])
+    assert res['MEK'] and res['TP53']
+    assert res[' TP53 '] == res['TP53']
+    assert grounder.ground('MEK') == res['MEK']
+
+    with TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'groundings.json')
+        grounder.save(path)
+        warm_grounder = Grounder(warm_start_path=path)
+        assert warm_grounder._cache['TP53'] == res['TP53']
+
+
+def test_grounder_service_errors():
+    import sys
+    import requests
+    from indra_db.client.readonly import grounding
+
+    class FakeResponse(object):
+        def __init__(self, status_code, json_body):
+            self.status_code = status_code
+            self._json_body = json_body
+
+        def raise_for_status(self):
+            if self.status_code != 200:
+                raise requests.HTTPError(f"{self.status_code} error")
+
+        def json(self):
+            return self._json_body
+
+    responses = [FakeResponse(500, {'error': 'down'}),
+                 FakeResponse(200, {'error': 'bad request'}),
+                 FakeResponse(200, [[]])]
+    post = grounding.requests.post
+    gilda_api = sys.modules.get('gilda.api')
+
+    # Block the import of gilda, so the grounding service is used.
+    sys.modules['gilda.api'] = None
+    try:
+        for response in responses:
+            grounding.requests.post = (lambda *args, **kwargs: response)
+            grounder = grounding.Grounder()
+            try:
+                grounder.ground_batch(['MEK', 'TP53'])
+                assert False, "Expected the bad response to be an error."
+            except (requests.HTTPError, ValueError):
+                pass
+            assert not grounder._cache
+    finally:
+        grounding.requests.post = post
+        if gilda_api is None:
+            del sys.modules['gilda.api']
+        else:
+            sys.modules['gilda.api'] = gilda_api
+
+
+def test_rest_client_paging():
+    from indra_db.client.readonly.rest_client import RestClient
+    ro = get_ro('primary')
+    query = HasAgent('TP53')
+    client = RestClient()
+    try:
+        pages = list(client.iter_pages(query.to_json(), 'hashes',
+                                       page_size=10, limit=30))
+        assert len(pages) == 3, len(pages)
+        hashes = set()
+        for page in pages:
+            assert not hashes & page.results
+            hashes |= page.results
+        assert hashes == query.get_hashes(ro, limit=30).results
+
+        results = client.get_results([
+            {'query_json': q.to_json(), 'result_type': 'hashes', 'limit': 5}
+            for q in [HasAgent('TP53'), HasAgent('MEK')]
+        ])
+        assert all(len(res.results) == 5 for res in results)
+    finally:
+        client.close()
+
+
+def test_get_count():
+    ro = get_ro('primary')
+    query = HasAgent('MEK', namespace='FPLX')
+    all_hashes = query.get_hashes(ro).results
+    assert query.get_count(ro, exact=True) == len(all_hashes)
+    assert query.get_count(ro) > 0
+
+    res = query.get_hashes(ro, limit=10, with_count=True)
+    assert res.total_count_exact in [True, False]
+    if res.total_count_exact:
+        assert res.total_count == len(all_hashes)
+    assert res.json()['total_count'] == res.total_count
+
+    res = query.get_statements(ro, limit=2, ev_limit=1, with_count=True)
+    assert res.total_count is not None
+    assert (~query).get_count(ro) > 0
+
+    # Estimates must also work for constraints with lists of values.
+    list_query = HasType(['Activation', 'Inhibition'])
+    list_hashes = list_query.get_hashes(ro).results
+    assert list_query.get_count(ro, exact=True) == len(list_hashes)
+    assert list_query.get_count(ro) > 0
+    res = list_query.get_hashes(ro, limit=10, with_count=True)
+    assert res.total_count is not None
+
+
+def test_query_result_msgpack():
+    from indra_db.client.readonly.query import WITH_MSGPACK
+    if not WITH_MSGPACK:
+        raise SkipTest("msgpack is not installed.")
+    ro = get_ro('primary')
+    query = HasAgent('MEK', namespace='FPLX')
+    results = [query.get_statements(ro, limit=10, ev_limit=5),
+               query.get_hashes(ro, limit=10),
+               query.get_agents(ro, limit=10)]
+    for res in results:
+        data = res.to_msgpack()
+        assert len(data) < len(json.dumps(res.json()))
+        res_json = QueryResult.from_json(json.loads(json.dumps(res.json())))
+        res_bin = QueryResult.from_msgpack(data)
+        assert type(res_bin) == type(res)
+        assert res_bin.json() == res_json.json()
+
+
+def test_lazy_statement_result():
+    from indra_db.client.readonly.query import LazyStatementJsons
+    ro = get_ro('primary')
+    query = HasAgent('MEK', namespace='FPLX')
+    res = query.get_statements(ro, limit=10, ev_limit=3)
+    assert isinstance(res.results, LazyStatementJsons)
+    assert len(res.results) == 10
+    assert not any(res.results.is_parsed(h) for h in res.results)
+
+    # The metadata can be read without parsing any statements.
+    mk_hash = next(iter(res.results))
+    assert res.get_ev_count(mk_hash) == res.evidence_counts[mk_hash]
+    assert res.get_belief(mk_hash) == res.belief_scores[mk_hash]
+    assert sum(res.get_source_counts(mk_hash).values()) \
+        == res.get_ev_count(mk_hash)
+    assert not res.results.is_parsed(mk_hash)
+
+    # Getting one statement only parses that statement.
+    stmt = res.get_statement(mk_hash)
+    assert stmt.get_hash() == mk_hash
+    assert len(stmt.evidence) <= 3
+    assert sum(res.results.is_parsed(h) for h in res.results) == 1
+
+    assert len(res.statements()) == 10
+    assert json.loads(json.dumps(res.json()))['results']
@@ -1,6 +1,263 @@
-from indra_db.tests.util import get_temp_db
+import random
+
+from nose import SkipTest
+
+from indra_db.util import get_json_codec
+from indra_db.tests.util import get_temp_db, get_prepped_db
 
 
 def test_db_presence():
     db = get_temp_db(clear=True)
     db.insert(db.TextRef, pmid='12345')
+
+
+def test_readonly_dependencies():
+    from indra_db.schemas.readonly_schema import CREATE_ORDER
+    db = get_temp_db()
+    deps = db._get_readonly_dependencies()
+    assert set(deps) == set(CREATE_ORDER)
+    assert deps['raw_stmt_src'] == set()
+    assert deps['fast_raw_pa_link'] == {'raw_stmt_src'}
+    assert deps['source_meta'] == {'name_meta', 'pa_stmt_src'}
+    assert deps['pa_stmt_src'] == {'raw_stmt_src', 'fast_raw_pa_link'}
+    assert 'belief' not in deps['pa_meta']
+
+    # Every table named in a definition must be declared as a dependency.
+    tables = {name: db.readonly[name] for name in CREATE_ORDER}
+    for name, tbl in tables.items():
+        missing = tbl.find_referenced_tables(tables) - deps[name]
+        assert not missing, f"{name} does not declare {missing}."
+
+
+def test_readonly_refresh():
+    db = get_prepped_db(1000, with_pa=True, with_agents=True)
+    hashes = {h for h, in db.select_all(db.PAStatements.mk_hash)}
+    belief_dict = {h: random.random() for h in hashes}
+    db.generate_readonly(belief_dict)
+
+    def get_rows(hash_set):
+        rows = {}
+        for tbl in [db.FastRawPaLink, db.EvidenceCounts, db.NameMeta,
+                    db.TextMeta, db.OtherMeta, db.MeshTermMeta,
+                    db.AgentInteractions]:
+            rows[tbl.__tablename__] = {
+                repr(sorted((k, str(v)) for k, v in row.__dict__.items()
+                            if not k.startswith('_')))
+                for row in db.select_all(tbl, tbl.mk_hash.in_(hash_set))
+            }
+        return rows
+
+    # Refreshing statements that have not changed should change nothing.
+    refreshed = set(random.sample(sorted(hashes), 20))
+    rows_before = get_rows(refreshed)
+    db.refresh_readonly(belief_dict, mk_hashes=refreshed)
+    assert get_rows(refreshed) == rows_before
+    assert not any(db.readonly[name]._temp
+                   for name in db.get_active_tables(schema='readonly'))
+
+
+def _remove_pa_stmts(db, mk_hashes, save_as=None):
+    """Remove preassembled statements, optionally saving their rows."""
+    hash_list = ', '.join(str(h) for h in mk_hashes)
+    tables = [('pa_support_links', 'supporting_mk_hash'),
+              ('pa_support_links', 'supported_mk_hash'),
+              ('pa_agents', 'mk_hash'),
+              ('raw_unique_links', 'pa_stmt_mk_hash'),
+              ('pa_statements', 'mk_hash')]
+    for tbl_name, col in tables:
+        where = f"WHERE {col} IN ({hash_list})"
+        if save_as is not None and tbl_name != 'pa_support_links':
+            db.session.execute(f"CREATE TABLE {save_as}_{tbl_name} AS "
+                               f"SELECT * FROM {tbl_name} {where};")
+        db.session.execute(f"DELETE FROM {tbl_name} {where};")
+    db.session.commit()
+
+
+def _restore_pa_stmts(db, save_as):
+    """Put back the statements removed by `_remove_pa_stmts`."""
+    for tbl_name in ['pa_statements', 'raw_unique_links', 'pa_agents']:
+        db.session.execute(f"INSERT INTO {tbl_name} "
+                           f"SELECT * FROM {save_as}_{tbl_name};\n"
+                           f"DROP TABLE {save_as}_{tbl_name};")
+    db.session.commit()
+
+
+def test_readonly_refresh_changes():
+    db = get_prepped_db(1000, with_pa=True, with_agents=True)
+    hashes = sorted({h for h, in db.select_all(db.PAStatements.mk_hash)})
+    belief_dict = {h: random.random() for h in hashes}
+    new_hash, removed_hash, changed_hash = random.sample(hashes, 3)
+
+    # Build the readonly schema without one statement.
+    _remove_pa_stmts(db, [new_hash], save_as='held_out')
+    db.generate_readonly(belief_dict)
+
+    def get_rows(mk_hash):
+        return {tbl.__tablename__: db.select_all(tbl, tbl.mk_hash == mk_hash)
+                for tbl in [db.FastRawPaLink, db.EvidenceCounts, db.NameMeta,
+                            db.SourceMeta, db.Belief]}
+
+    assert not any(get_rows(new_hash).values())
+    assert all(get_rows(removed_hash).values())
+    assert not db.session.execute(
+        "SELECT to_regclass('readonly.refresh_version') IS NOT NULL"
+    ).scalar()
+
+    # Add the statement back, remove another, and change the belief of a
+    # third.
+    _restore_pa_stmts(db, 'held_out')
+    _remove_pa_stmts(db, [removed_hash])
+    belief_dict[changed_hash] = 0.123
+    db.refresh_readonly(belief_dict,
+                        mk_hashes=[new_hash, removed_hash, changed_hash])
+    db.session.rollback()
+
+    new_rows = get_rows(new_hash)
+    assert all(new_rows.values()), {k: len(v) for k, v in new_rows.items()}
+    assert not any(get_rows(removed_hash).values())
+    changed_rows = get_rows(changed_hash)
+    assert abs(changed_rows['belief'][0].belief - 0.123) < 1e-6
+    assert all(abs(row.belief - 0.123) < 1e-6
+               for row in changed_rows['name_meta'])
+    assert not any(db.readonly[name]._temp
+                   for name in db.get_active_tables(schema='readonly'))
+
+    # The refresh changes the build version.
+    assert db.session.execute(
+        "SELECT last_value FROM readonly.refresh_version"
+    ).scalar() == 1
+
+
+def test_readonly_build_ledger():
+    from indra_db.schemas.readonly_schema import CREATE_ORDER
+    db = get_prepped_db(100, with_pa=True, with_agents=True)
+    hashes = {h for h, in db.select_all(db.PAStatements.mk_hash)}
+    build_id = db.generate_readonly({h: 0.5 for h in hashes})
+
+    ledger = db.get_readonly_build_ledger()
+    assert ledger['build_id'] == build_id
+    assert ledger == db.get_readonly_build_ledger(build_id)
+    tables = {entry['table_name']: entry for entry in ledger['tables']}
+    assert {'belief', 'mesh_term_closure', 'stmt_json_dictionary'} \
+        | set(CREATE_ORDER) == set(tables)
+    assert tables['fast_raw_pa_link']['num_rows'] > 0
+
+    # Tables loaded without building indices are analyzed to count them.
+    assert tables['belief']['num_rows'] == len(hashes)
+    assert tables['stmt_json_dictionary']['num_rows'] == 0
+    assert all(entry['total_time'] >= entry['index_time'] >= 0
+               for entry in tables.values())
+    assert ledger['total_time'] >= max(entry['total_time']
+                                       for entry in tables.values())
+
+
+def test_readonly_partitions():
+    db = get_prepped_db(100, with_pa=True, with_agents=True)
+    if db.get_server_version_num() < 110000:
+        raise SkipTest("Partitioning requires Postgres 11 or later.")
+    hashes = {h for h, in db.select_all(db.PAStatements.mk_hash)}
+    db.generate_readonly({h: 0.5 for h in hashes}, num_partitions=4)
+
+    # The partitions are found from the database, not the build settings.
+    active_tables = set(db.get_active_tables(schema='readonly'))
+    for ro_name in ['fast_raw_pa_link', 'raw_stmt_src', 'name_meta']:
+        ro_tbl = db.readonly[ro_name]
+        assert ro_tbl.is_partitioned(db)
+        part_names = {name.split('.')[-1]
+                      for name in ro_tbl.get_partition_names(db)}
+        assert len(part_names) == 4
+        assert part_names <= active_tables
+    assert not db.readonly['evidence_counts'].is_partitioned(db)
+
+    # The partitions should be invisible to queries.
+    link_hashes = {h for h, in db.select_all(db.FastRawPaLink.mk_hash)}
+    assert link_hashes and link_hashes <= hashes
+    some_hash = next(iter(link_hashes))
+    assert db.select_all(db.FastRawPaLink,
+                         db.FastRawPaLink.mk_hash == some_hash)
+
+    ledger = db.get_readonly_build_ledger()
+    tables = {entry['table_name']: entry for entry in ledger['tables']}
+    assert tables['fast_raw_pa_link']['num_rows'] > 0
+    assert tables['fast_raw_pa_link']['index_size'] > 0
+
+
+def test_readonly_partitions_need_pg11():
+    from indra_db.exceptions import IndraDbException
+    db = get_prepped_db(100, with_pa=True, with_agents=True)
+    if db.get_server_version_num() >= 110000:
+        raise SkipTest("The server supports partitioning.")
+    try:
+        db.generate_readonly({}, num_partitions=4)
+        assert False, "Expected partitioning to be refused."
+    except IndraDbException:
+        pass
+
+
+def test_json_dictionary():
+    from indra_db.util.json_codec import WITH_ZSTD, ZSTD_MAGIC, JsonCodec, \
+        set_json_codec, train_json_dictionary, load_json
+    if not WITH_ZSTD:
+        raise SkipTest("zstandard is not installed.")
+    set_json_codec(JsonCodec())
+    db = get_prepped_db(1000, with_pa=True, with_agents=True)
+    dict_id = train_json_dictionary(db, sample_percent=100, dict_size=4096)
+    assert len(db.select_all(db.JsonDictionary)) == 1
+
+    # Encode the JSON of one statement, as if it had been inserted since.
+    pa_stmt = db.select_one(db.PAStatements)
+    stmt_json = load_json(pa_stmt.json)
+    encoded = get_json_codec().encode(pa_stmt.json)
+    assert encoded.startswith(ZSTD_MAGIC)
+    db.session.query(db.PAStatements)\
+        .filter(db.PAStatements.mk_hash == pa_stmt.mk_hash)\
+        .update({'json': encoded}, synchronize_session=False)
+    db.session.commit()
+
+    hashes = {h for h, in db.select_all(db.PAStatements.mk_hash)}
+    db.generate_readonly({h: 0.5 for h in hashes})
+    assert len(db.select_all(db.StmtJsonDictionary)) == 1
+    pa_jsons = {pa_json for pa_json, in db.select_all(
+        db.FastRawPaLink.pa_json,
+        db.FastRawPaLink.mk_hash == pa_stmt.mk_hash
+    )}
+    assert pa_jsons == {encoded}
+
+    # A new codec can only decode the JSON once the dictionary is loaded.
+    codec = JsonCodec()
+    set_json_codec(codec)
+    assert codec.load_dictionaries(db) == 1
+    assert dict_id in codec.get_dictionary_ids()
+    assert load_json(encoded) == stmt_json
+    set_json_codec(JsonCodec())
+
+
+def test_json_dictionary_reload():
+    from indra_db.exceptions import IndraDbException
+    from indra_db.util.json_codec import WITH_ZSTD, JsonCodec, \
+        set_json_codec, train_json_dictionary, _sample_jsons
+    if not WITH_ZSTD:
+        raise SkipTest("zstandard is not installed.")
+    set_json_codec(JsonCodec())
+    db = get_prepped_db(1000, with_pa=True, with_agents=True)
+
+    # A codec that read the database before the dictionary was trained.
+    reader = JsonCodec()
+    assert reader.load_dictionaries(db) == 0
+
+    dict_id = train_json_dictionary(db, sample_percent=100, dict_size=4096)
+    pa_json = db.select_one(db.PAStatements).json
+    encoded = get_json_codec().encode(pa_json)
+    assert reader.decode(encoded) == bytes(pa_json)
+    assert dict_id in reader.get_dictionary_ids()
+
+    # A dictionary that is in no database still cannot be decoded.
+    other = JsonCodec()
+    samples = _sample_jsons(db, 100, 10000)
+    other.add_dictionary(JsonCodec.train(samples, 2048), for_encoding=True)
+    try:
+        reader.decode(other.encode(pa_json))
+        assert False, "Expected the unknown dictionary to be an error."
+    except IndraDbException:
+        pass
+    set_json_codec(JsonCodec())
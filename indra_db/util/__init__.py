@@ -9,11 +9,16 @@ Some key functions' capabilities include:
 __all__ = ['get_primary_db', 'get_db', 'insert_raw_agents', 'insert_pa_stmts',
            'insert_pa_agents', 'insert_db_stmts', 'get_raw_stmts_frm_db_list',
            'distill_stmts', 'regularize_agent_id', 'get_statement_object',
-           'extract_agent_data', 'get_ro', 'S3Path', 'hash_pa_agents']
+           'extract_agent_data', 'get_ro', 'S3Path', 'hash_pa_agents',
+           'PaperIdResolver', 'get_paper_id_resolver', 'set_paper_id_resolver',
+           'make_paper_id_snapshot', 'JsonCodec', 'get_json_codec',
+           'set_json_codec']
 
 from .insert import *
 from .s3_path import *
 from .helpers import *
 from .constructors import *
+from .paper_ids import *
+from .json_codec import *
 from .content_scripts import *
 from .distill_statements import *
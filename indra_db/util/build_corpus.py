@@ -8,15 +8,17 @@ methods are used, and three corpora are produces, each as a directory.
 import os
 import json
 from indra_db.util import unpack
-from indra_db.util import get_ro, get_db
+from indra_db.util import get_ro, get_db, get_json_codec
+from indra_db.util.json_codec import load_json
 
 db = get_db('primary')
+get_json_codec().load_dictionaries(db)
 
 rs = db.select_all(db.RawStatements, db.Reading.reader == 'REACH', 
                    db.RawStatements.reading_id == db.Reading.id, yield_per=10000)
 found_by = {}
 for r in rs:
-    found_by[r.id] = json.loads(r.json)['evidence'][0]['annotations']['found_by']
+    found_by[r.id] = load_json(r.json)['evidence'][0]['annotations']['found_by']
     
 fb_set = set(found_by.values())
 print(f"Found {len(fb_set)} distinct found-by rules.")
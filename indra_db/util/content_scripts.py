@@ -6,7 +6,8 @@ from cachetools.keys import hashkey
 from cachetools import cached, LRUCache
 
 from .constructors import get_db
-from .helpers import unpack, _get_trids
+from .helpers import unpack
+from .paper_ids import get_paper_id_resolver
 
 
 def get_stmts_with_agent_text_like(pattern, filter_genes=False,
@@ -440,18 +441,16 @@ class TextContentSessionHandler(object):
         # return it
         if 'TRID' in text_refs:
             return text_refs['TRID']
-        text_ref_id = None
-        for id_type in ['pmid', 'pmcid', 'doi',
-                        'pii', 'url', 'manuscript_id']:
-            try:
-                id_val = text_refs[id_type.upper()]
-                trids = _get_trids(self.__db, id_val, id_type)
-                if trids:
-                    text_ref_id = trids[0]
-                    break
-            except KeyError:
-                pass
-        return text_ref_id
+        # Resolve all the IDs at once, and take the first found in order of
+        # preference.
+        id_types = ['pmid', 'pmcid', 'doi', 'pii', 'url', 'manuscript_id']
+        paper_list = [(id_type, text_refs[id_type.upper()])
+                      for id_type in id_types if id_type.upper() in text_refs]
+        trid_dict = get_paper_id_resolver().get_trids(self.__db, paper_list)
+        for paper in paper_list:
+            if trid_dict[paper]:
+                return trid_dict[paper][0]
+        return None
 
     def _get_text_content_from_trid(self, text_ref_id):
         texts = self.__db.select_all([self.__db.TextContent.content,
@@ -2,7 +2,6 @@ __all__ = ['distill_stmts', 'get_filtered_rdg_stmts', 'get_filtered_db_stmts',
            'delete_raw_statements_by_id', 'get_reading_stmt_dict',
            'reader_versions', 'text_content_sources']
 
-import json
 import pickle
 import logging
 from datetime import datetime
@@ -14,6 +13,7 @@ from indra.util.nested_dict import NestedDict
 from indra_db.databases import reader_versions
 
 from .helpers import _set_evidence_text_ref
+from .json_codec import get_json_codec, load_json
 
 logger = logging.getLogger('util-distill')
 
@@ -70,6 +70,7 @@ def get_reading_stmt_dict(db, clauses=None, get_full_stmts=True):
                 db.RawStatements.mk_hash, db.RawStatements.text_hash]
     if get_full_stmts:
         elements += [db.RawStatements.json]
+        get_json_codec().load_dictionaries(db)
 
     q = (db.session.query(*elements)
          .filter(db.RawStatements.reading_id == db.Reading.id,
@@ -87,8 +88,7 @@ def get_reading_stmt_dict(db, clauses=None, get_full_stmts=True):
     for data in q.yield_per(1000):
         if get_full_stmts:
             tr, tcid, src, tt, rid, rv, sid, mk_hash, text_hash, sjson = data
-            stmt_json = json.loads(sjson.decode('utf8'))
-            stmt = Statement._from_json(stmt_json)
+            stmt = Statement._from_json(load_json(sjson))
             _set_evidence_text_ref(stmt, tr)
         else:
             tr, tcid, src, tt, rid, rv, sid, mk_hash, text_hash = data
@@ -231,6 +231,7 @@ def get_filtered_db_stmts(db, get_full_stmts=False, clauses=None):
     # Only get the json if it's going to be used.
     if get_full_stmts:
         tbl_list = [db.RawStatements.json]
+        get_json_codec().load_dictionaries(db)
     else:
         tbl_list = [db.RawStatements.id]
 
@@ -243,7 +244,7 @@ def get_filtered_db_stmts(db, get_full_stmts=False, clauses=None):
     # Produce a generator of statement groups.
     db_stmt_data = db_s_q.yield_per(10000)
     if get_full_stmts:
-        return {Statement._from_json(json.loads(s_json.decode('utf-8')))
+        return {Statement._from_json(load_json(s_json))
                 for s_json, in db_stmt_data}
     else:
         return {sid for sid, in db_stmt_data}
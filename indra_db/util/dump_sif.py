@@ -24,6 +24,7 @@ except ImportError:
 
 from indra_db.util.s3_path import S3Path
 from indra_db.util.constructors import get_ro, get_db
+from indra_db.util.json_codec import get_json_codec, load_json
 
 logger = logging.getLogger(__name__)
 S3_SIF_BUCKET = 'bigmech'
@@ -155,6 +156,7 @@ def load_res_pos(ro=None):
     logger.info('Getting residue and position info')
     if ro is None:
         ro = get_ro('primary')
+    get_json_codec().load_dictionaries(ro)
     res = {'residue': {}, 'position': {}}
     for stmt_type in get_all_descendants(Modification):
         stmt_name = stmt_type.__name__
@@ -166,7 +168,7 @@ def load_res_pos(ro=None):
         query = ro.select_all(ro.FastRawPaLink.pa_json,
                               ro.FastRawPaLink.type_num == type_num)
         for jsb, in query:
-            js = json.loads(jsb)
+            js = load_json(jsb)
             if 'residue' in js:
                 res['residue'][int(js['matches_hash'])] = js['residue']
             if 'position' in js:
@@ -2,23 +2,24 @@ __all__ = ['unpack', '_get_trids', '_fix_evidence_refs',
            'get_raw_stmts_frm_db_list', '_set_evidence_text_ref',
            'get_statement_object']
 
-import json
 import zlib
 import logging
 
 from indra.util import clockit
 from indra.statements import Statement
 
+from .json_codec import ZSTD_MAGIC, get_json_codec, decode_json, load_json
+
 logger = logging.getLogger('util-helpers')
 
 
 def get_statement_object(db_stmt):
     """Get an INDRA Statement object from a db_stmt."""
-    if isinstance(db_stmt, bytes):
+    if isinstance(db_stmt, (bytes, memoryview)):
         jb = db_stmt
     else:
         jb = db_stmt.json
-    return Statement._from_json(json.loads(jb.decode('utf-8')))
+    return Statement._from_json(load_json(jb))
 
 
 def _set_evidence_text_ref(stmt, tr):
@@ -59,6 +60,7 @@ def _fix_evidence_refs(db, rid_stmt_trios):
 @clockit
 def get_raw_stmts_frm_db_list(db, db_stmt_objs, fix_refs=True, with_sids=True):
     """Convert table objects of raw statements into INDRA Statement objects."""
+    get_json_codec().load_dictionaries(db)
     rid_stmt_sid_trios = [(db_stmt.reading_id, db_stmt.id,
                            get_statement_object(db_stmt))
                           for db_stmt in db_stmt_objs]
@@ -73,7 +75,10 @@ def get_raw_stmts_frm_db_list(db, db_stmt_objs, fix_refs=True, with_sids=True):
 
 
 def unpack(bts, decode=True):
-    ret = zlib.decompress(bts, zlib.MAX_WBITS+16)
+    if bts[:4] == ZSTD_MAGIC:
+        ret = decode_json(bts)
+    else:
+        ret = zlib.decompress(bts, zlib.MAX_WBITS+16)
     if decode:
         ret = ret.decode('utf-8')
     return ret
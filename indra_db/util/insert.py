@@ -13,6 +13,7 @@ from indra.statements import Complex, SelfModification, ActiveForm, \
 from indra_db.exceptions import IndraDbException
 
 from .helpers import get_statement_object
+from .json_codec import get_json_codec
 
 
 logger = logging.getLogger('util-insert')
@@ -48,6 +49,7 @@ def insert_raw_agents(db, batch_id, stmts=None, verbose=False,
     if stmts is None:
         s_col = 'json'
         stmt_dict = None
+        get_json_codec().load_dictionaries(db)
     else:
         s_col = 'uuid'
         stmt_dict = {s.uuid: s for s in stmts}
@@ -260,6 +262,8 @@ def insert_db_stmts(db, stmts, db_ref_id, verbose=False, batch_id=None):
         batch_id = db.make_copy_batch_id()
 
     stmt_data = []
+    codec = get_json_codec()
+    codec.load_dictionaries(db)
 
     cols = ('uuid', 'mk_hash', 'source_hash', 'db_info_id', 'type', 'json',
             'indra_version', 'batch_id')
@@ -273,7 +277,7 @@ def insert_db_stmts(db, stmts, db_ref_id, verbose=False, batch_id=None):
         stmt_rec = (stmt.uuid, stmt.get_hash(refresh=True),
                     stmt.evidence[0].get_source_hash(refresh=True), db_ref_id,
                     stmt.__class__.__name__,
-                    json.dumps(stmt.to_json()).encode('utf8'),
+                    codec.encode(json.dumps(stmt.to_json()).encode('utf8')),
                     get_version(), batch_id)
 
         stmt_data.append(stmt_rec)
@@ -324,6 +328,8 @@ def insert_pa_stmts(db, stmts, verbose=False, do_copy=True,
     logger.info("Beginning to insert pre-assembled statements.")
     stmt_data = []
     indra_version = get_version()
+    codec = get_json_codec()
+    codec.load_dictionaries(db)
     cols = ('uuid', 'matches_key', 'mk_hash', 'type', 'json', 'indra_version')
     activity_rows = []
     if verbose:
@@ -334,7 +340,7 @@ def insert_pa_stmts(db, stmts, verbose=False, do_copy=True,
             stmt.matches_key(),
             stmt.get_hash(shallow=True),
             stmt.__class__.__name__,
-            json.dumps(stmt.to_json()).encode('utf8'),
+            codec.encode(json.dumps(stmt.to_json()).encode('utf8')),
             indra_version
         )
         stmt_data.append(stmt_rec)
@@ -0,0 +1,406 @@
+"""Optionally compress statement JSONs with a trained zstd dictionary.
+
+The JSONs of raw and pre-assembled statements share a great deal of
+structure, so a zstd dictionary trained on a sample of them compresses each
+JSON far better than it could be compressed alone. Dictionaries are kept in
+the `json_dictionary` table, and copied into the readonly schema when it is
+built, so a JSON can always be decoded with the dictionary it was encoded
+with. JSONs are only encoded once a dictionary has been trained, and JSONs
+that were stored before then (or without zstandard installed) are passed
+through unchanged when decoded.
+"""
+
+__all__ = ['JsonCodec', 'get_json_codec', 'set_json_codec', 'encode_json',
+           'decode_json', 'load_json', 'train_json_dictionary',
+           'benchmark_json_codec']
+
+import json
+import logging
+import argparse
+from time import perf_counter
+from threading import Lock
+
+from indra_db.exceptions import IndraDbException
+
+logger = logging.getLogger(__name__)
+
+
+# Compression requires the zstandard package to be installed.
+try:
+    import zstandard
+    WITH_ZSTD = True
+except ImportError:
+    WITH_ZSTD = False
+
+# The first bytes of every zstd frame, which can never start a JSON.
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+class JsonCodec(object):
+    """Encode and decode statement JSONs with trained zstd dictionaries.
+
+    Any number of dictionaries may be loaded for decoding, since each
+    compressed JSON records the ID of its dictionary, but only one, the
+    latest loaded from the principal database, is used for encoding.
+
+    Parameters
+    ----------
+    level : int
+        The zstd compression level. Default is 3.
+    """
+    def __init__(self, level=3):
+        self.level = level
+        self._dictionaries = {}
+        self._compressor = None
+        self._decompressors = {}
+        self._loaded_dbs = {}
+        self._dbs = {}
+        self._reloaded_ids = set()
+        self._lock = Lock()
+
+    @property
+    def can_encode(self):
+        """True if JSONs will be compressed by `encode`."""
+        return self._compressor is not None
+
+    def add_dictionary(self, dict_data, for_encoding=False):
+        """Add a trained dictionary, as bytes.
+
+        Parameters
+        ----------
+        dict_data : bytes
+            The dictionary, as trained by `train`.
+        for_encoding : bool
+            If True, this dictionary is used to encode JSONs from now on.
+            Default is False, in which case it is only used for decoding.
+
+        Returns
+        -------
+        dict_id : int
+            The ID of the dictionary, which is recorded in each JSON encoded
+            with it.
+        """
+        if not WITH_ZSTD:
+            raise IndraDbException("Dictionaries require zstandard to be "
+                                   "installed.")
+        zstd_dict = zstandard.ZstdCompressionDict(bytes(dict_data))
+        dict_id = zstd_dict.dict_id()
+        with self._lock:
+            self._dictionaries[dict_id] = zstd_dict
+            self._decompressors[dict_id] = \
+                zstandard.ZstdDecompressor(dict_data=zstd_dict)
+            if for_encoding:
+                self._compressor = \
+                    zstandard.ZstdCompressor(level=self.level,
+                                             dict_data=zstd_dict)
+        return dict_id
+
+    def get_dictionary_ids(self):
+        """Get the IDs of the dictionaries that have been added."""
+        return set(self._dictionaries.keys())
+
+    def load_dictionaries(self, db, force=False):
+        """Add the dictionaries stored in a database.
+
+        The dictionaries are taken from the `json_dictionary` table of a
+        principal database, the latest of which is used for encoding, or
+        from the `stmt_json_dictionary` table of a readonly database. Each
+        database is only read once, unless `force` is True. The databases
+        are remembered, so that they can be read again if a JSON is found
+        that was encoded with a dictionary added since (see `decode`).
+
+        Returns
+        -------
+        num_dictionaries : int
+            The number of dictionaries stored in the database.
+        """
+        db_key = str(db.url)
+        if db_key in self._loaded_dbs and not force:
+            return self._loaded_dbs[db_key]
+        if not WITH_ZSTD:
+            logger.debug("zstandard is not installed, so no dictionaries "
+                         "will be loaded.")
+            return 0
+
+        if 'json_dictionary' in db.tables:
+            tbl = db.tables['json_dictionary']
+            for_encoding = True
+        else:
+            tbl = db.tables['stmt_json_dictionary']
+            for_encoding = False
+
+        # Databases from before dictionaries were added have no table.
+        dictionaries = []
+        if tbl.__tablename__ in db.get_active_tables(tbl.get_schema()):
+            q = db.filter_query(tbl.dictionary).order_by(tbl.id)
+            dictionaries = [dict_data for dict_data, in q.all()]
+            for i, dict_data in enumerate(dictionaries):
+                self.add_dictionary(
+                    dict_data,
+                    for_encoding and i == len(dictionaries) - 1
+                )
+            logger.info(f"Loaded {len(dictionaries)} JSON dictionaries from "
+                        f"{db.url.database}.")
+        self._loaded_dbs[db_key] = len(dictionaries)
+        self._dbs[db_key] = db
+        return len(dictionaries)
+
+    def _reload_dictionaries(self, dict_id):
+        """Read the databases again, once, to find a new dictionary."""
+        if dict_id in self._reloaded_ids:
+            return
+        self._reloaded_ids.add(dict_id)
+        for db in list(self._dbs.values()):
+            logger.info(f"Dictionary {dict_id} is unknown, reloading the "
+                        f"dictionaries of {db.url.database}.")
+            self.load_dictionaries(db, force=True)
+            if dict_id in self._decompressors:
+                return
+
+    @staticmethod
+    def train(samples, dict_size=112640):
+        """Train a dictionary on a sample of JSONs.
+
+        Parameters
+        ----------
+        samples : list[bytes]
+            The (uncompressed) JSONs on which to train the dictionary. A few
+            thousand JSONs are usually enough.
+        dict_size : int
+            The maximum size of the dictionary in bytes. Default is 110 KiB,
+            the default of the zstd command line tool.
+
+        Returns
+        -------
+        dict_data : bytes
+            The trained dictionary.
+        """
+        if not WITH_ZSTD:
+            raise IndraDbException("Training a dictionary requires zstandard "
+                                   "to be installed.")
+        return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+    def encode(self, json_bts):
+        """Compress a JSON, if a dictionary has been added for encoding.
+
+        If there is no such dictionary, the JSON is returned unchanged, so a
+        str is only returned if a str is given.
+        """
+        if self._compressor is None:
+            return json_bts
+        if isinstance(json_bts, str):
+            json_bts = json_bts.encode('utf-8')
+        with self._lock:
+            return self._compressor.compress(json_bts)
+
+    def decode(self, bts):
+        """Decompress a JSON if it was encoded, otherwise return it as is.
+
+        If the JSON was encoded with a dictionary that has not been added,
+        the dictionaries of the databases read by `load_dictionaries` are
+        read again, once, in case it was added since they were read.
+        """
+        if isinstance(bts, str):
+            return bts.encode('utf-8')
+        if isinstance(bts, memoryview):
+            bts = bts.tobytes()
+        if not bts.startswith(ZSTD_MAGIC):
+            return bts
+        if not WITH_ZSTD:
+            raise IndraDbException("Compressed JSON found, but zstandard is "
+                                   "not installed.")
+
+        dict_id = zstandard.get_frame_parameters(bts).dict_id
+        if dict_id and dict_id not in self._decompressors:
+            self._reload_dictionaries(dict_id)
+        with self._lock:
+            decompressor = self._decompressors.get(dict_id)
+            if decompressor is None:
+                if dict_id:
+                    raise IndraDbException(
+                        f"JSON was encoded with dictionary {dict_id}, which "
+                        f"has not been loaded (see `load_dictionaries`)."
+                    )
+                decompressor = zstandard.ZstdDecompressor()
+                self._decompressors[dict_id] = decompressor
+            return decompressor.decompress(bts)
+
+
+_active_codec = None
+
+
+def get_json_codec() -> JsonCodec:
+    """Get the codec shared by everything that reads or writes JSONs."""
+    global _active_codec
+    if _active_codec is None:
+        _active_codec = JsonCodec()
+    return _active_codec
+
+
+def set_json_codec(codec: JsonCodec):
+    """Set the codec shared by everything that reads or writes JSONs."""
+    global _active_codec
+    if not isinstance(codec, JsonCodec):
+        raise TypeError(f"Expected a JsonCodec, but got {type(codec)}.")
+    _active_codec = codec
+
+
+def encode_json(json_bts):
+    """Compress a JSON with the shared codec, if it can encode."""
+    return get_json_codec().encode(json_bts)
+
+
+def decode_json(bts):
+    """Get the bytes of a JSON stored in the database, as encoded or not."""
+    return get_json_codec().decode(bts)
+
+
+def load_json(bts):
+    """Load a JSON stored in the database, as encoded or not."""
+    return json.loads(decode_json(bts).decode('utf-8'))
+
+
+def _sample_jsons(db, sample_percent, max_samples):
+    """Get a sample of the plain JSONs of raw and pre-assembled statements."""
+    codec = get_json_codec()
+    codec.load_dictionaries(db)
+    db.grab_session()
+    samples = []
+    for tbl in [db.RawStatements, db.PAStatements]:
+        res = db.session.execute(
+            f"SELECT json FROM {tbl.full_name()}\n"
+            f"TABLESAMPLE SYSTEM ({float(sample_percent)})\n"
+            f"LIMIT {int(max_samples)}"
+        )
+        samples.extend(codec.decode(json_bts) for json_bts, in res)
+    return samples
+
+
+def train_json_dictionary(db, sample_percent=0.1, max_samples=10000,
+                          dict_size=112640):
+    """Train a new dictionary on the statement JSONs in the database.
+
+    The dictionary is stored in the `json_dictionary` table and is used by
+    the shared codec to encode new JSONs from then on.
+
+    Parameters
+    ----------
+    db : PrincipalDatabaseManager
+        The database from whose raw and pre-assembled statements the JSONs are
+        sampled, and in which the dictionary is stored.
+    sample_percent : float
+        The percent of the pages of each table from which JSONs are sampled.
+        Default is 0.1.
+    max_samples : int
+        The maximum number of JSONs sampled from each table. Default is 10000.
+    dict_size : int
+        The maximum size of the dictionary in bytes. Default is 110 KiB.
+
+    Returns
+    -------
+    dict_id : int
+        The ID of the new dictionary.
+    """
+    codec = get_json_codec()
+    samples = _sample_jsons(db, sample_percent, max_samples)
+    logger.info(f"Training a dictionary on {len(samples)} JSONs.")
+
+    dict_data = JsonCodec.train(samples, dict_size)
+    if db.JsonDictionary.__tablename__ not in db.get_active_tables():
+        db.create_table(db.JsonDictionary)
+    db.insert(db.JsonDictionary, dictionary=dict_data)
+
+    # Reload the dictionaries, so the new one is used for encoding.
+    codec.load_dictionaries(db, force=True)
+    return zstandard.ZstdCompressionDict(dict_data).dict_id()
+
+
+def benchmark_json_codec(json_list, codec=None, num_reads=3):
+    """Compare the size and read throughput of encoded and plain JSONs.
+
+    Parameters
+    ----------
+    json_list : list[bytes]
+        The plain JSONs, such as a sample of the `json` of raw statements.
+    codec : Optional[JsonCodec]
+        The codec with which the JSONs are encoded. It must be able to
+        encode. By default, the shared codec is used.
+    num_reads : int
+        The number of times the JSONs are read in each form, of which the
+        fastest is taken. Default is 3.
+
+    Returns
+    -------
+    results : dict
+        The number of JSONs, their total size in bytes plain and encoded, the
+        compression ratio, and the rate at which they were read (loaded from
+        bytes into JSON) in MB of plain JSON per second, plain and encoded.
+    """
+    if codec is None:
+        codec = get_json_codec()
+    if not codec.can_encode:
+        raise IndraDbException("The codec has no dictionary for encoding.")
+
+    encoded_list = [codec.encode(js) for js in json_list]
+    plain_size = sum(len(js) for js in json_list)
+    encoded_size = sum(len(bts) for bts in encoded_list)
+
+    def get_read_rate(bts_list, decode):
+        best_time = None
+        for _ in range(num_reads):
+            start = perf_counter()
+            for bts in bts_list:
+                json.loads(decode(bts).decode('utf-8'))
+            dt = perf_counter() - start
+            if best_time is None or dt < best_time:
+                best_time = dt
+        return plain_size / 1e6 / best_time
+
+    return {'num_jsons': len(json_list),
+            'plain_size': plain_size,
+            'encoded_size': encoded_size,
+            'ratio': plain_size / encoded_size,
+            'plain_read_rate': get_read_rate(json_list, lambda bts: bts),
+            'encoded_read_rate': get_read_rate(encoded_list, codec.decode)}
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Train or benchmark the dictionary used to compress '
+                    'statement JSONs.'
+    )
+    parser.add_argument('task', choices=['train', 'benchmark'],
+                        help='Train a new dictionary, or benchmark the '
+                             'latest dictionary on a sample of JSONs.')
+    parser.add_argument('--sample-percent', type=float, default=0.1,
+                        help='The percent of pages of each statement table '
+                             'to sample.')
+    parser.add_argument('--max-samples', type=int, default=10000,
+                        help='The maximum number of JSONs to sample from '
+                             'each statement table.')
+    return parser
+
+
+def main():
+    from indra_db.util.constructors import get_db
+
+    args = get_parser().parse_args()
+    db = get_db('primary')
+    if args.task == 'train':
+        dict_id = train_json_dictionary(db, args.sample_percent,
+                                        args.max_samples)
+        print(f"Trained dictionary {dict_id}.")
+        return
+
+    json_list = _sample_jsons(db, args.sample_percent, args.max_samples)
+    results = benchmark_json_codec(json_list)
+    print(f"JSONs: {results['num_jsons']}\n"
+          f"Size: {results['plain_size']} bytes plain, "
+          f"{results['encoded_size']} encoded "
+          f"({results['ratio']:.1f}x smaller)\n"
+          f"Read rate: {results['plain_read_rate']:.1f} MB/s plain, "
+          f"{results['encoded_read_rate']:.1f} MB/s encoded")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+__all__ = ['PaperIdResolver', 'get_paper_id_resolver', 'set_paper_id_resolver',
+           'make_paper_id_snapshot']
+
+import os
+import sqlite3
+import logging
+from threading import Lock
+from collections import defaultdict
+
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+PAPER_ID_TYPES = ['pmid', 'pmcid', 'doi', 'pii', 'url', 'manuscript_id']
+
+
+def _normalize_id(id_type, id_val):
+    """Put a paper ID in the form it is stored in the text_ref table."""
+    id_val = str(id_val).strip()
+    if id_type == 'pmcid':
+        id_val = id_val.upper().split('.')[0]
+    elif id_type == 'doi':
+        id_val = id_val.upper()
+    return id_val
+
+
+def _get_id_table(db):
+    """Get the table and trid column from which IDs are resolved."""
+    text_ref = getattr(db, 'TextRef', None)
+    if text_ref is not None:
+        return text_ref, text_ref.id
+    return db.ReadingRefLink, db.ReadingRefLink.trid
+
+
+class PaperIdResolver(object):
+    """Resolve paper IDs, such as pmids and dois, to text ref IDs (trids).
+
+    IDs are resolved in batches, with one query for each type of ID, and the
+    results are kept in an LRU cache. Optionally, a snapshot of the full
+    mapping made by `make_paper_id_snapshot` may be given, in which case IDs
+    are looked up there before the database is queried. IDs that cannot be
+    found are not cached, so papers added after a snapshot is made are still
+    found.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of IDs whose trids are kept in memory. Default is
+        100000.
+    snapshot_path : Optional[str]
+        The path to a snapshot file made by `make_paper_id_snapshot`.
+    """
+    def __init__(self, max_size=100000, snapshot_path=None):
+        self._cache = LRUCache(maxsize=max_size)
+        self._lock = Lock()
+        self._snapshot = None
+        if snapshot_path is not None:
+            self.load_snapshot(snapshot_path)
+
+    def load_snapshot(self, snapshot_path):
+        """Use the snapshot at the given path to look up IDs."""
+        if not os.path.exists(snapshot_path):
+            raise FileNotFoundError(f"No paper ID snapshot at "
+                                    f"{snapshot_path}.")
+        self._snapshot = sqlite3.connect(f'file:{snapshot_path}?mode=ro',
+                                         uri=True, check_same_thread=False)
+
+    def clear(self):
+        """Remove all resolved IDs from the cache."""
+        with self._lock:
+            self._cache.clear()
+
+    def get_trids(self, db, paper_list):
+        """Get the trids of a list of papers.
+
+        Parameters
+        ----------
+        db : DatabaseManager
+            A handle to a principal or a readonly database, used to look up
+            any IDs not in the cache or the snapshot.
+        paper_list : list[(<id_type>, <paper_id>)]
+            A list of tuples, where each tuple indicates an id-type (e.g.
+            'pmid') and an id value for a particular paper. IDs of type 'trid'
+            are returned as they are.
+
+        Returns
+        -------
+        trid_dict : dict
+            A dictionary keyed by the (id_type, paper_id) tuples given, with a
+            list of the matching trids as each value. Papers that were not
+            found have an empty list.
+        """
+        trid_dict = {}
+        missing = defaultdict(dict)
+        with self._lock:
+            for id_type, paper_id in paper_list:
+                if id_type == 'trid':
+                    trid_dict[(id_type, paper_id)] = [int(paper_id)]
+                    continue
+                if id_type not in PAPER_ID_TYPES:
+                    raise ValueError(f"id_type must be one of: "
+                                     f"{PAPER_ID_TYPES + ['trid']}")
+                norm_id = _normalize_id(id_type, paper_id)
+                trids = self._cache.get((id_type, norm_id))
+                if trids is None:
+                    missing[id_type][norm_id] = (id_type, paper_id)
+                else:
+                    trid_dict[(id_type, paper_id)] = trids
+
+        for id_type, norm_ids in missing.items():
+            found = {}
+            if self._snapshot is not None:
+                found.update(self._lookup_snapshot(id_type, list(norm_ids)))
+            still_missing = [i for i in norm_ids if i not in found]
+            if still_missing:
+                found.update(self._lookup_db(db, id_type, still_missing))
+
+            with self._lock:
+                for norm_id, key in norm_ids.items():
+                    trids = sorted(found.get(norm_id, []))
+                    trid_dict[key] = trids
+                    if trids:
+                        self._cache[(id_type, norm_id)] = trids
+        return trid_dict
+
+    def _lookup_snapshot(self, id_type, norm_ids):
+        found = defaultdict(set)
+        # Stay well under the sqlite limit on the number of parameters.
+        for i in range(0, len(norm_ids), 500):
+            batch = norm_ids[i:i + 500]
+            marks = ', '.join('?' * len(batch))
+            with self._lock:
+                rows = self._snapshot.execute(
+                    f'SELECT id_val, trid FROM paper_ids '
+                    f'WHERE id_type = ? AND id_val IN ({marks})',
+                    [id_type] + batch
+                ).fetchall()
+            for id_val, trid in rows:
+                found[id_val].add(trid)
+        return found
+
+    @staticmethod
+    def _lookup_db(db, id_type, norm_ids):
+        logger.debug(f"Looking up {len(norm_ids)} {id_type}s in the "
+                     f"database.")
+        table, trid_col = _get_id_table(db)
+        id_col = getattr(table, id_type)
+        rows = db.session.query(id_col, trid_col).distinct()\
+            .filter(id_col.in_(norm_ids))
+        found = defaultdict(set)
+        for id_val, trid in rows:
+            found[id_val].add(trid)
+        return found
+
+
+def make_paper_id_snapshot(db, snapshot_path):
+    """Write a snapshot of the mapping from paper IDs to trids to a file.
+
+    The snapshot is a sqlite database that can be given to a
+    `PaperIdResolver`.
+
+    Parameters
+    ----------
+    db : DatabaseManager
+        A handle to a principal or a readonly database.
+    snapshot_path : str
+        The path of the file to write. Any existing file is replaced.
+    """
+    table, trid_col = _get_id_table(db)
+    tmp_path = snapshot_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('CREATE TABLE paper_ids (id_type TEXT NOT NULL, '
+                 'id_val TEXT NOT NULL, trid INTEGER NOT NULL)')
+
+    id_cols = [getattr(table, id_type) for id_type in PAPER_ID_TYPES]
+    q = db.session.query(trid_col, *id_cols).distinct().yield_per(100000)
+    batch = []
+    num_rows = 0
+    for trid, *id_vals in q:
+        for id_type, id_val in zip(PAPER_ID_TYPES, id_vals):
+            if id_val is not None:
+                batch.append((id_type, id_val, trid))
+        if len(batch) >= 100000:
+            conn.executemany('INSERT INTO paper_ids VALUES (?, ?, ?)', batch)
+            num_rows += len(batch)
+            batch = []
+    conn.executemany('INSERT INTO paper_ids VALUES (?, ?, ?)', batch)
+    num_rows += len(batch)
+
+    conn.execute('CREATE INDEX paper_ids_idx ON paper_ids (id_type, id_val)')
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, snapshot_path)
+    logger.info(f"Wrote {num_rows} paper IDs to {snapshot_path}.")
+
+
+_active_resolver = None
+
+
+def get_paper_id_resolver() -> PaperIdResolver:
+    """Get the paper ID resolver shared by the clients.
+
+    If the environment variable INDRA_DB_PAPER_ID_SNAPSHOT is set, it is
+    used as the path of a snapshot when the resolver is first made.
+    """
+    global _active_resolver
+    if _active_resolver is None:
+        snapshot_path = os.environ.get('INDRA_DB_PAPER_ID_SNAPSHOT')
+        _active_resolver = PaperIdResolver(snapshot_path=snapshot_path)
+    return _active_resolver
+
+
+def set_paper_id_resolver(resolver: PaperIdResolver):
+    """Set the paper ID resolver shared by the clients."""
+    global _active_resolver
+    if not isinstance(resolver, PaperIdResolver):
+        raise TypeError(f"Expected a PaperIdResolver, but got "
+                        f"{type(resolver)}.")
+    _active_resolver = resolver
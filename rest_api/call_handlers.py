@@ -18,12 +18,13 @@ from indra.assemblers.html.assembler import HtmlAssembler, _format_stmt_text, \
     _format_evidence_text
 
 from indra_db.client.readonly import *
+from indra_db.client.readonly.query import WITH_MSGPACK, MSGPACK_MIMETYPE
 from indra_db.client.principal.curation import *
 from indralab_auth_tools.log import note_in_log, is_log_running
 
 from rest_api.config import MAX_STMTS, REDACT_MESSAGE, TITLE, TESTING, \
-    jwt_nontest_optional
-from rest_api.util import LogTracker, sec_since, get_source, process_agent, \
+    JSON_IN_SQL, jwt_nontest_optional
+from rest_api.util import LogTracker, sec_since, get_source, process_agents, \
     process_mesh_term, DbAPIError, iter_free_agents, _make_english_from_meta, \
     get_html_source_info
 
@@ -41,6 +42,7 @@ class ApiCall:
 
         self.web_query = request.args.copy()
         self.offs = self._pop('offset', type_cast=int)
+        self.page_token = self._pop('page_token')
         self.best_first = self._pop('best_first', True, bool)
         if 'limit' in self.web_query:
             self.limit = min(self._pop('limit', MAX_STMTS, int), MAX_STMTS)
@@ -50,6 +52,7 @@ class ApiCall:
         self.w_english = self._pop('with_english', False, bool)
         self.w_cur_counts = self._pop('with_cur_counts', False, bool)
         self.strict = self._pop('strict', False, bool)
+        self.with_count = self._pop('with_count', False, bool)
         self.agent_dict = None
         self.agent_set = None
 
@@ -93,6 +96,9 @@ class ApiCall:
             res = self.get_db_query().get_statements(
                 ev_limit=self.special['ev_limit'],
                 evidence_filter=self.ev_filter,
+                page_token=self.page_token,
+                json_in_sql=JSON_IN_SQL,
+                with_count=self.with_count,
                 **params
             )
         elif result_type == 'interactions':
@@ -110,10 +116,13 @@ class ApiCall:
             res = self.get_db_query().get_agents(
                 with_hashes=self.special['with_hashes'] or self.w_cur_counts,
                 complexes_covered=self.special['complexes_covered'],
+                page_token=self.page_token,
                 **params
             )
         elif result_type == 'hashes':
-            res = self.get_db_query().get_hashes(**params)
+            res = self.get_db_query().get_hashes(page_token=self.page_token,
+                                                 with_count=self.with_count,
+                                                 **params)
         else:
             raise ValueError(f"Invalid result type: {result_type}")
         logger.info(f"Got results from query after "
@@ -160,7 +169,23 @@ class ApiCall:
     def _build_db_query(self):
         raise NotImplementedError()
 
+    def _accepts_msgpack(self):
+        if not WITH_MSGPACK:
+            return False
+        best = request.accept_mimetypes.best_match(['application/json',
+                                                    MSGPACK_MIMETYPE])
+        return best == MSGPACK_MIMETYPE
+
     def produce_response(self, result):
+        if self._accepts_msgpack():
+            content = result.to_msgpack()
+            resp = Response(content, mimetype=MSGPACK_MIMETYPE)
+            logger.info("Exiting with %d results that have %d total evidence, "
+                        "with size %f MB (msgpack) after %s seconds."
+                        % (len(result.results), result.total_evidence,
+                           len(content) / 1e6, sec_since(self.start_time)))
+            return resp
+
         res_json = result.json()
         content = json.dumps(res_json)
 
@@ -350,7 +375,7 @@ class StatementApiCall(ApiCall):
                 mimetype = 'text/html'
             else:  # Return JSON for all other values of the format argument
                 res_json.update(self.tracker.get_level_stats())
-                res_json['statements'] = stmts_json
+                res_json['statements'] = dict(stmts_json)
                 resp_content = json.dumps(res_json)
                 mimetype = 'application/json'
 
@@ -418,11 +443,13 @@ class StatementApiCall(ApiCall):
         return
 
     def _agent_query_from_web_query(self, db_query):
+        # Gather the agent parameters, along with the constraints on their
+        # positions, so that the agents can be processed all together.
+        agent_specs = []
+
         # Get the agents without specified locations (subject or object).
         for raw_ag in iter_free_agents(self.web_query):
-            ag, ns = process_agent(raw_ag)
-            db_query &= HasAgent(ag, namespace=ns)
-            self._require_agent(ag, ns)
+            agent_specs.append((raw_ag, {}, None))
 
         # Get the agents with specified roles.
         for ag_num, role in enumerate(['subject', 'object']):
@@ -432,9 +459,7 @@ class StatementApiCall(ApiCall):
             if isinstance(raw_ag, list):
                 assert len(raw_ag) == 1, f'Malformed agent for {role}: {raw_ag}'
                 raw_ag = raw_ag[0]
-            ag, ns = process_agent(raw_ag)
-            db_query &= HasAgent(ag, namespace=ns, role=role.upper())
-            self._require_agent(ag, ns, ag_num)
+            agent_specs.append((raw_ag, {'role': role.upper()}, ag_num))
 
         # Get agents with specific agent numbers.
         for key in self.web_query.copy().keys():
@@ -447,8 +472,12 @@ class StatementApiCall(ApiCall):
 
             raw_ag = self._pop(key)
             ag_num = int(ag_num_str)
-            ag, ns = process_agent(raw_ag)
-            db_query &= HasAgent(ag, namespace=ns, agent_num=ag_num)
+            agent_specs.append((raw_ag, {'agent_num': ag_num}, ag_num))
+
+        # Process the agents, grounding any that need it in one batch.
+        agents = process_agents([raw_ag for raw_ag, _, _ in agent_specs])
+        for (ag, ns), (_, kwargs, ag_num) in zip(agents, agent_specs):
+            db_query &= HasAgent(ag, namespace=ns, **kwargs)
             self._require_agent(ag, ns, ag_num)
 
         return db_query
@@ -499,8 +528,10 @@ class StatementApiCall(ApiCall):
 
         # Unpack mesh ids.
         mesh_ids = self._pop('mesh_ids', [])
+        mesh_descendants = self._pop('mesh_descendants', False, bool)
         if mesh_ids:
-            mesh_q = FromMeshIds([process_mesh_term(m) for m in mesh_ids])
+            mesh_q = FromMeshIds([process_mesh_term(m) for m in mesh_ids],
+                                 include_descendants=mesh_descendants)
             if db_query is not None:
                 db_query &= mesh_q
             if self.filter_ev:
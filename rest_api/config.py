@@ -8,6 +8,7 @@ if VUE_ROOT is not None and VUE_ROOT.endswith('/'):
     # Peal off the trailing slash.
     VUE_ROOT = VUE_ROOT[:-1]
 MAX_STMTS = int(0.5e3)
+JSON_IN_SQL = environ.get('INDRA_DB_API_JSON_IN_SQL') == '1'
 REDACT_MESSAGE = '[MISSING/INVALID CREDENTIALS: limited to 200 char for Elsevier]'
 
 TESTING = {}
@@ -7,7 +7,8 @@ from indra.assemblers.html.assembler import _format_stmt_text, \
     make_source_colors
 from indra_db.client import stmt_from_interaction, get_ro_source_info
 
-from indra_db.client.readonly.query import gilda_ground
+from indra_db.client.readonly.grounding import gilda_ground, \
+    gilda_ground_batch
 
 logger = logging.getLogger('db rest api - util')
 
@@ -54,6 +55,19 @@ def process_agent(agent_param):
     return ag, ns
 
 
+def process_agents(agent_params):
+    """Get the agent ids and namespaces from a list of input params.
+
+    Any agents with the AUTO namespace are grounded together, so that the
+    groundings are cached before the queries for each agent are made.
+    """
+    agents = [process_agent(agent_param) for agent_param in agent_params]
+    auto_texts = [ag for ag, ns in agents if ns == 'AUTO']
+    if auto_texts:
+        gilda_ground_batch(auto_texts)
+    return agents
+
+
 def process_mesh_term(mesh_term):
     """Use gilda to translate a mesh term into a MESH ID if possible."""
     if mesh_term is None:
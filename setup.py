@@ -17,7 +17,11 @@ def main():
                             'pgcopy', 'matplotlib', 'flask', 'nltk',
                             'reportlab', 'cachetools', 'termcolor'],
           extras_require={'test': ['nose', 'coverage', 'python-coveralls',
-                                   'nose-timer']},
+                                   'nose-timer'],
+                          'rest_client': ['brotli', 'msgpack'],
+                          'async': ['psycopg', 'psycopg_pool'],
+                          'bitmap': ['pyroaring'],
+                          'zstd': ['zstandard']},
           )
 
 